@@ -0,0 +1,290 @@
+# app/async_manager.py
+# GameManager поверх AsyncEngine (DB_ASYNC=1): основные операции выполняются
+# нативно через AsyncSession, без перехода в пул потоков на каждый запрос.
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.cache import game_info_cache
+from app.database import AsyncSessionLocal, async_engine
+from app.draw import DrawInfeasible
+from app.manager import (
+    JOIN_MESSAGES, AsyncGameManager, JoinOutcome, game_started, join_insert,
+    draw_mappings, join_outcome, join_statement, load_draw_constraints,
+    my_targets_query, my_targets_rows
+)
+from app.models import Game, Participant
+from app.stats import game_transition, increment_statements, new_players_statement
+from app.utils import generate_game_id
+
+logger = logging.getLogger(__name__)
+
+
+class NativeAsyncGameManager(AsyncGameManager):
+    """Горячие операции — через AsyncSession, остальные — как в AsyncGameManager."""
+
+    @staticmethod
+    async def create_game(creator_id: int, creator_name: str, game_name: str, creator_tg: str | None = None, budget: str | None = None):
+        """Создаёт новую игру и добавляет создателя как участника."""
+        async with AsyncSessionLocal() as db:
+            try:
+                game_id = generate_game_id()
+                invite_link = f"https://t.me/REPLACE_WITH_BOT_USERNAME?start=join_{game_id}"
+
+                db.add(Game(
+                    id=game_id,
+                    name=game_name,
+                    admin_id=creator_id,
+                    admin_username=creator_name,
+                    chat_id=str(creator_id),
+                    is_active=True,
+                    is_started=False,
+                    created_at=datetime.utcnow(),
+                    gift_price=budget or "Без ограничений"
+                ))
+                db.add(Participant(
+                    game_id=game_id,
+                    user_id=creator_id,
+                    username=creator_tg,
+                    full_name=creator_name
+                ))
+
+                new_players = (await db.execute(
+                    new_players_statement(async_engine.dialect.name, [creator_id])
+                )).rowcount
+                deltas = {**game_transition(None, (True, False)), "total_players": new_players}
+                for stmt in increment_statements(deltas):
+                    await db.execute(stmt)
+
+                await db.commit()
+                game_info_cache.invalidate(game_id)
+                logger.info("game_created: %s by %s", game_id, creator_id)
+
+                return {
+                    "id": game_id,
+                    "name": game_name,
+                    "creator_id": creator_id,
+                    "creator_name": creator_name,
+                    "budget": budget or "Без ограничений",
+                    "invite_link": invite_link
+                }
+
+            except Exception as e:
+                await db.rollback()
+                logger.exception("Error create_game: %s", e)
+                raise
+
+    @staticmethod
+    async def join(game_id: str, user_id: int, tg_username: str | None, full_name: str) -> str:
+        """Присоединяет пользователя к игре, возвращает JoinOutcome."""
+        async with AsyncSessionLocal() as db:
+            try:
+                dialect_name = async_engine.dialect.name
+                stmt = join_statement(dialect_name, game_id, user_id, tg_username, full_name)
+                if stmt is not None:
+                    inserted, is_started = (await db.execute(stmt)).one()
+                else:
+                    inserted = (await db.execute(
+                        join_insert(dialect_name, game_id, user_id, tg_username, full_name)
+                    )).rowcount
+                    is_started = None if inserted else (await db.execute(select(game_started(game_id)))).scalar()
+                if inserted:
+                    new_players = (await db.execute(new_players_statement(dialect_name, [user_id]))).rowcount
+                    for stmt in increment_statements({"total_players": new_players}):
+                        await db.execute(stmt)
+                await db.commit()
+
+                outcome = join_outcome(inserted, is_started)
+                if outcome == JoinOutcome.JOINED:
+                    game_info_cache.invalidate(game_id)
+                    logger.info("player_joined: game=%s user=%s", game_id, user_id)
+                return outcome
+
+            except Exception:
+                await db.rollback()
+                raise
+
+    @staticmethod
+    async def join_game(game_id: str, user_id: int, tg_username: str | None, full_name: str):
+        """Присоединяет пользователя к игре."""
+        try:
+            outcome = await NativeAsyncGameManager.join(game_id, user_id, tg_username, full_name)
+        except Exception as e:
+            logger.exception("Error join_game: %s", e)
+            return False, "❌ Ошибка при присоединении"
+        return outcome == JoinOutcome.JOINED, JOIN_MESSAGES[outcome]
+
+    @staticmethod
+    async def start_game(game_id: str, creator_id: int):
+        """Запускает жеребьёвку и сохраняет назначения в БД."""
+        async with AsyncSessionLocal() as db:
+            try:
+                # FOR UPDATE: вступающие в игру (join) ждут, пока жеребьёвка не закончится
+                game = await db.get(Game, game_id, with_for_update=True)
+                if not game:
+                    return False, "❌ Игра не найдена"
+
+                if game.admin_id != creator_id:
+                    return False, "👑 Только создатель может начать игру"
+
+                if game.is_started:
+                    return False, "⏳ Игра уже началась"
+
+                participants = (await db.execute(
+                    select(
+                        Participant.id,
+                        Participant.user_id,
+                        Participant.username,
+                        Participant.full_name
+                    ).where(Participant.game_id == game_id)
+                )).all()
+
+                if len(participants) < 2:
+                    return False, "🎁 Нужно минимум 2 участника"
+
+                exclusions, avoid = await db.run_sync(lambda s: load_draw_constraints(s, game))
+                try:
+                    mappings, assignments = draw_mappings(participants, exclusions, avoid)
+                except DrawInfeasible as e:
+                    logger.warning("draw_infeasible: game=%s %s", game_id, e)
+                    return False, "🚫 С такими исключениями жеребьёвка невозможна. Уберите часть исключений."
+
+                await db.run_sync(lambda s: s.bulk_update_mappings(Participant, mappings))
+                for stmt in increment_statements(game_transition((game.is_active, game.is_started), (game.is_active, True))):
+                    await db.execute(stmt)
+                game.is_started = True
+                game.started_at = datetime.utcnow()
+
+                await db.commit()
+                game_info_cache.invalidate(game_id)
+
+                for giver_id, receiver_id in assignments:
+                    logger.info("pair_assigned: game=%s santa=%s receiver=%s", game_id, giver_id, receiver_id)
+
+                logger.info("game_started: %s", game_id)
+                return True, "🎄 Игра началась! Тайные Санты распределены 🎅"
+
+            except Exception as e:
+                await db.rollback()
+                logger.exception("Error start_game: %s", e)
+                return False, "❌ Ошибка при старте игры"
+
+    @staticmethod
+    async def finish_game(game_id: str, user_id: int):
+        """Завершает игру."""
+        async with AsyncSessionLocal() as db:
+            try:
+                game = await db.get(Game, game_id)
+                if not game:
+                    return False, "❌ Игра не найдена"
+
+                if game.admin_id != user_id:
+                    return False, "👑 Только создатель может завершить игру"
+
+                if not game.is_started:
+                    return False, "⏳ Игра ещё не началась"
+
+                for stmt in increment_statements(game_transition((game.is_active, game.is_started), (False, False))):
+                    await db.execute(stmt)
+                game.is_active = False
+                game.is_started = False
+
+                await db.commit()
+                game_info_cache.invalidate(game_id)
+                logger.info("game_finished: %s", game_id)
+                return True, "✅ Игра завершена! Спасибо за участие 🎁"
+
+            except Exception as e:
+                await db.rollback()
+                logger.exception("Error finish_game: %s", e)
+                return False, "❌ Ошибка при завершении игры"
+
+    @staticmethod
+    async def set_wishlist(user_id: int, wishlist_text: str):
+        """Сохраняет пожелания участника."""
+        async with AsyncSessionLocal() as db:
+            try:
+                row = (await db.execute(
+                    select(Participant, Game)
+                    .outerjoin(Game, Game.id == Participant.game_id)
+                    .where(Participant.user_id == user_id)
+                    .order_by(Participant.id.desc())
+                    .limit(1)
+                )).first()
+
+                if not row:
+                    return False, "❌ Вы не участвуете в играх"
+
+                p, game = row
+                if not game or game.is_started:
+                    return False, "⏳ Нельзя менять пожелания после старта игры"
+
+                p.wishlist = wishlist_text
+                await db.commit()
+                game_info_cache.invalidate(p.game_id)
+
+                logger.info("wishlist_saved: user=%s game=%s", user_id, p.game_id)
+                return True, "📝 Пожелания сохранены!"
+
+            except Exception as e:
+                await db.rollback()
+                logger.exception("Error set_wishlist: %s", e)
+                return False, "❌ Ошибка при сохранении пожеланий"
+
+    @staticmethod
+    async def get_my_targets(user_id: int):
+        """Возвращает список целей пользователя во всех играх."""
+        async with AsyncSessionLocal() as db:
+            try:
+                return my_targets_rows((await db.execute(my_targets_query(user_id))).all())
+
+            except Exception as e:
+                logger.exception("Error get_my_targets: %s", e)
+                return []
+
+    @staticmethod
+    async def load_game_info(game_id: str):
+        """Информация об игре и участниках из БД, без кэша."""
+        async with AsyncSessionLocal() as db:
+            game = await db.get(Game, game_id)
+            if not game:
+                return None
+
+            participants = (await db.execute(
+                select(Participant).where(Participant.game_id == game_id)
+            )).scalars().all()
+
+            return {
+                "id": game.id,
+                "name": game.name,
+                "creator_id": game.admin_id,
+                "creator_name": game.admin_username,
+                "status": (
+                    "active" if game.is_started else
+                    ("waiting" if game.is_active else "finished")
+                ),
+                "budget": game.gift_price,
+                "created_at": game.created_at.isoformat() if game.created_at else None,
+                "participants": [
+                    {
+                        "user_id": p.user_id,
+                        "username": p.username,
+                        "full_name": p.full_name,
+                        "has_wishlist": bool(p.wishlist)
+                    }
+                    for p in participants
+                ]
+            }
+
+    @staticmethod
+    async def get_game_info(game_id: str):
+        """Возвращает полную информацию об игре (через кэш game_info_cache)."""
+        try:
+            return await game_info_cache.get_or_load_async(
+                game_id, lambda: NativeAsyncGameManager.load_game_info(game_id)
+            )
+        except Exception as e:
+            logger.exception("Error get_game_info: %s", e)
+            return None
@@ -0,0 +1,137 @@
+# app/broadcast.py
+# Параллельная рассылка личных сообщений с ограничением скорости:
+# общий token bucket (~30 сообщений/с на бота) и не чаще 1 сообщения/с в один чат.
+# Bucket живёт в памяти процесса: при нескольких процессах-обработчиках каждому
+# достаётся своя доля лимита (см. BROADCAST_RATE в app/worker.py).
+# 429 (RetryAfter) ставит на паузу всю рассылку на указанное Telegram время.
+
+import asyncio
+import logging
+import time
+
+from aiogram.utils.exceptions import BadRequest, RetryAfter, TelegramAPIError, Unauthorized
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (например, после 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Не чаще rate сообщений в секунду в один чат."""
+
+    def __init__(self, rate: float = 1.0, max_chats: int = 10000):
+        self.interval = 1.0 / rate
+        self.max_chats = max_chats
+        self._next: dict = {}
+
+    async def acquire(self, chat_id):
+        now = time.monotonic()
+        slot = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+
+        if len(self._next) > self.max_chats:
+            # выбрасываем чаты, которые уже могут получать сообщения
+            self._next = {c: t for c, t in self._next.items() if t > now}
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Broadcaster:
+    """Рассылает сообщения конкурентно в пределах лимитов Bot API."""
+
+    def __init__(
+        self,
+        bot,
+        global_rate: float = 30,
+        per_chat_rate: float = 1,
+        concurrency: int = 30,
+        max_retries: int = 3,
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(global_rate)
+        self.chats = ChatLimiter(per_chat_rate)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def send_many(self, messages) -> dict:
+        """Отправляет [(chat_id, text), ...] и возвращает отчёт о доставке:
+
+        {"total", "sent", "retries", "failed": [(chat_id, reason), ...], "elapsed"}
+        """
+        report = {"total": 0, "sent": 0, "retries": 0, "failed": [], "elapsed": 0.0}
+        started = time.monotonic()
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(chat_id, text):
+            async with sem:
+                await self._send(chat_id, text, report)
+
+        tasks = [one(chat_id, text) for chat_id, text in messages]
+        report["total"] = len(tasks)
+        await asyncio.gather(*tasks)
+
+        report["elapsed"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "broadcast: total=%s sent=%s failed=%s retries=%s elapsed=%.2fs",
+            report["total"], report["sent"], len(report["failed"]), report["retries"], report["elapsed"]
+        )
+        return report
+
+    async def _send(self, chat_id, text, report):
+        reason = "retries exhausted"
+        for attempt in range(self.max_retries + 1):
+            await self.chats.acquire(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                report["sent"] += 1
+                return
+            except RetryAfter as e:
+                # флуд-контроль действует на весь бот — тормозим всю рассылку
+                report["retries"] += 1
+                self.bucket.pause(e.timeout)
+                reason = str(e)
+                logger.warning("broadcast: 429 for %s, retry in %ss", chat_id, e.timeout)
+            except (Unauthorized, BadRequest) as e:
+                # бот заблокирован, чат не найден и т.п. — повтор не поможет
+                report["failed"].append((chat_id, str(e)))
+                return
+            except (TelegramAPIError, asyncio.TimeoutError, OSError) as e:
+                report["retries"] += 1
+                reason = str(e) or e.__class__.__name__
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+            except Exception as e:
+                logger.exception("Failed to send DM to %s: %s", chat_id, e)
+                report["failed"].append((chat_id, str(e)))
+                return
+
+        report["failed"].append((chat_id, reason))
@@ -0,0 +1,146 @@
+# app/bulk_import.py
+# Массовое добавление участников в игру (корпоративные игры на сотни человек).
+#
+# Список приходит в CSV (заголовок user_id,username,full_name,wishlist) или JSON
+# (массив объектов с теми же полями). parse_rows() проверяет строки и делит их на
+# годные, ошибочные и повторы внутри файла; сами вставки делает
+# GameManager.bulk_join многострочными INSERT ... ON CONFLICT DO NOTHING.
+
+import csv
+import io
+import json
+import os
+
+from app.utils import username_is_valid_for_link
+
+# Больше строк за одну загрузку не принимаем
+BULK_IMPORT_MAX_ROWS = int(os.environ.get("BULK_IMPORT_MAX_ROWS", "20000"))
+
+# Строк в одном INSERT
+BULK_IMPORT_BATCH = int(os.environ.get("BULK_IMPORT_BATCH", "1000"))
+
+# Сколько ошибочных строк и повторов перечислять в отчёте (счётчики — все)
+BULK_IMPORT_REPORT_LIMIT = int(os.environ.get("BULK_IMPORT_REPORT_LIMIT", "100"))
+
+# participants.user_id — Integer
+MAX_USER_ID = 2**31 - 1
+
+
+class ImportRejected(ValueError):
+    """Файл целиком непригоден (формат, размер)."""
+
+
+class ImportReport:
+    """Итог загрузки: годные строки и замечания по остальным."""
+
+    def __init__(self):
+        self.received = 0
+        self.rows = []        # годные строки: dict(user_id, username, full_name, wishlist)
+        self.line_of = {}     # user_id -> номер строки в файле
+        self.invalid = []     # (номер строки, причина)
+        self.duplicates = []  # (номер строки, user_id, причина)
+        self.inserted = 0
+
+    def duplicate(self, line: int, user_id: int, reason: str):
+        self.duplicates.append((line, user_id, reason))
+
+    def as_dict(self) -> dict:
+        limit = BULK_IMPORT_REPORT_LIMIT
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "invalid_count": len(self.invalid),
+            "duplicate_count": len(self.duplicates),
+            "invalid": [{"row": line, "error": error} for line, error in self.invalid[:limit]],
+            "duplicates": [
+                {"row": line, "user_id": user_id, "reason": reason}
+                for line, user_id, reason in sorted(self.duplicates)[:limit]
+            ],
+        }
+
+
+def _read_records(body: bytes, content_type: str) -> list:
+    """Записи из тела запроса: [(номер строки, dict)]."""
+    text = body.decode("utf-8-sig")
+
+    if "json" in content_type or text.lstrip().startswith(("[", "{")):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ImportRejected(f"invalid JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("participants")
+        if not isinstance(data, list):
+            raise ImportRejected("expected a list of participants")
+        return list(enumerate(data, 1))
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "user_id" not in [f.strip() for f in reader.fieldnames]:
+        raise ImportRejected("CSV header must include user_id")
+    # номер строки файла: заголовок — строка 1
+    return [(reader.line_num, record) for record in reader]
+
+
+def _clean(record: dict, field: str, max_length: int):
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    if len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value or None
+
+
+def validate(record) -> dict:
+    """Проверенная строка участника; ValueError с причиной, если строка негодна."""
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    record = {str(k).strip(): v for k, v in record.items() if k is not None}
+
+    raw_id = record.get("user_id")
+    try:
+        user_id = int(str(raw_id).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"user_id is not a number: {raw_id!r}")
+    if not 0 < user_id <= MAX_USER_ID:
+        raise ValueError(f"user_id out of range: {user_id}")
+
+    username = record.get("username")
+    if username is not None:
+        username = str(username).strip().lstrip("@") or None
+    if username is not None and not username_is_valid_for_link(username):
+        raise ValueError(f"invalid username: {username!r}")
+
+    full_name = _clean(record, "full_name", 200)
+    wishlist = _clean(record, "wishlist", 2000)
+
+    return {
+        "user_id": user_id,
+        "username": username,
+        "full_name": full_name or username or str(user_id),
+        "wishlist": wishlist,
+    }
+
+
+def parse_rows(body: bytes, content_type: str = "") -> ImportReport:
+    """Разбирает и проверяет загрузку. ImportRejected, если файл целиком негоден."""
+    records = _read_records(body, content_type or "")
+    if len(records) > BULK_IMPORT_MAX_ROWS:
+        raise ImportRejected(f"too many rows: {len(records)} > {BULK_IMPORT_MAX_ROWS}")
+
+    report = ImportReport()
+    report.received = len(records)
+    for line, record in records:
+        try:
+            row = validate(record)
+        except ValueError as e:
+            report.invalid.append((line, str(e)))
+            continue
+
+        if row["user_id"] in report.line_of:
+            report.duplicate(line, row["user_id"], f"same user as row {report.line_of[row['user_id']]}")
+            continue
+        report.line_of[row["user_id"]] = line
+        report.rows.append(row)
+
+    return report
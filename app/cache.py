@@ -0,0 +1,158 @@
+# app/cache.py
+# Read-through кэш в памяти процесса: LRU с ограничением размера и TTL.
+#
+# Запись в БД сбрасывает ключ (invalidate) после коммита. Чтобы загрузка, начатая
+# до сброса, не положила в кэш устаревшие данные, у ключей с идущей загрузкой
+# есть поколение: invalidate увеличивает его, и результат такой загрузки
+# отбрасывается.
+#
+# Кэш локален для процесса: при нескольких воркерах (CONSUMER_COUNT > 1) запись
+# в другом процессе этот кэш не сбросит — устаревание ограничено TTL.
+
+import collections
+import os
+import threading
+import time
+
+GAME_CACHE_SIZE = int(os.environ.get("GAME_CACHE_SIZE", "1000"))
+GAME_CACHE_TTL = float(os.environ.get("GAME_CACHE_TTL", "30"))
+
+# get() возвращает MISS, если значения нет (None тоже можно хранить)
+MISS = object()
+
+
+class TTLCache:
+    """LRU-кэш с TTL и сбросом по ключу; потокобезопасен."""
+
+    def __init__(self, name: str, max_size: int = GAME_CACHE_SIZE, ttl: float = GAME_CACHE_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # ключ -> (значение, момент истечения)
+        self._items = collections.OrderedDict()
+        # ключ -> [загрузок в работе, поколение]
+        self._loading: dict = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+
+    def get(self, key):
+        """Значение из кэша или MISS."""
+        if self.max_size <= 0:
+            return MISS
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+                self.expirations += 1
+            self.misses += 1
+            return MISS
+
+    def begin_load(self, key):
+        """Отмечает начало загрузки ключа из БД; вернёт токен для finish_load."""
+        with self._lock:
+            state = self._loading.setdefault(key, [0, 0])
+            state[0] += 1
+            return state[1]
+
+    def finish_load(self, key, token, value):
+        """Кладёт загруженное значение, если ключ не сбрасывали во время загрузки.
+
+        value=MISS — загрузка не удалась, кэшировать нечего.
+        """
+        with self._lock:
+            state = self._loading[key]
+            state[0] -= 1
+            fresh = state[1] == token
+            if not state[0]:
+                del self._loading[key]
+
+            if value is MISS or self.max_size <= 0:
+                return
+            if not fresh:
+                self.stale_loads += 1
+                return
+
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Read-through: значение из кэша или loader() с сохранением в кэш."""
+        value = self.get(key)
+        if value is not MISS:
+            return value
+
+        token = self.begin_load(key)
+        try:
+            value = loader()
+        except BaseException:
+            self.finish_load(key, token, MISS)
+            raise
+        self.finish_load(key, token, value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """То же для асинхронного loader(): на попадании не уходит из event loop'а."""
+        value = self.get(key)
+        if value is not MISS:
+            return value
+
+        token = self.begin_load(key)
+        try:
+            value = await loader()
+        except BaseException:
+            self.finish_load(key, token, MISS)
+            raise
+        self.finish_load(key, token, value)
+        return value
+
+    def invalidate(self, key):
+        """Сбрасывает ключ (вызывать после коммита изменения)."""
+        with self._lock:
+            self.invalidations += 1
+            self._items.pop(key, None)
+            state = self._loading.get(key)
+            if state is not None:
+                state[1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            for state in self._loading.values():
+                state[1] += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_loads": self.stale_loads,
+        }
+
+
+# Информация об игре и список участников (get_game_info) по коду игры
+game_info_cache = TTLCache("game_info")
+
+
+def cache_stats() -> dict:
+    return {game_info_cache.name: game_info_cache.stats()}
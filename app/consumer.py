@@ -0,0 +1,50 @@
+# app/consumer.py
+# Отдельный процесс-обработчик апдейтов: читает общую очередь и выполняет команды.
+#
+# По умолчанию (Procfile) webhook и обработчик работают в одном процессе
+# (WORKER_ROLE=all). Разделение включается явно, например в Procfile:
+#   web:      WORKER_ROLE=web gunicorn app.webhook_app:app --workers N ...
+#   consumer: CONSUMER_INDEX=i CONSUMER_COUNT=M python -m app.consumer
+# Общими должны быть очередь и состояние: UPDATE_QUEUE_BACKEND=postgres
+# (sqlite — только если все процессы на одной машине), SHARED_STATE=db,
+# при необходимости FSM_STORAGE=redis. С очередью memory consumer апдейтов
+# не увидит, поэтому не запускается.
+
+import os
+import logging
+
+from app.database import init_db
+from app.metrics import METRICS_PORT, serve_metrics
+from app.worker import start_worker, update_queue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("santa")
+
+
+def main():
+    bot_token = os.environ.get("BOT_TOKEN")
+    bot_username = os.environ.get("BOT_USERNAME")
+
+    if not bot_token:
+        raise RuntimeError("BOT_TOKEN is not set")
+
+    if not bot_username:
+        raise RuntimeError("BOT_USERNAME is not set")
+
+    if update_queue.backend.name == "memory":
+        raise RuntimeError("app.consumer needs a shared UPDATE_QUEUE_BACKEND (sqlite or postgres), not memory")
+
+    index = int(os.environ.get("CONSUMER_INDEX", "0"))
+    count = int(os.environ.get("CONSUMER_COUNT", "1"))
+    if not 0 <= index < count:
+        raise RuntimeError(f"CONSUMER_INDEX must be in [0, CONSUMER_COUNT), got {index}/{count}")
+
+    init_db()
+    logger.info("Starting consumer %s/%s", index, count)
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    start_worker(bot_token, bot_username, background=False)
+
+
+if __name__ == "__main__":
+    main()
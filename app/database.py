@@ -3,10 +3,17 @@
 # Полностью совместим с Railway PostgreSQL.
 
 import os
+import time
+import asyncio
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 
+from app.metrics import instrument_engine
+from app.tracing import span, trace_engine
+
 logger = logging.getLogger(__name__)
 
 # Получаем DATABASE_URL из переменных окружения
@@ -19,29 +26,157 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Размер пула соединений; по нему же считается пул потоков для запросов
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+
+# Запросы дольше этого порога (сек) логируются как медленные
+SLOW_DB_CALL = float(os.environ.get("SLOW_DB_CALL", "0.2"))
+
 # Создаём движок
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=False  # можно включить True для отладки SQL
-)
+if DATABASE_URL.startswith("sqlite"):
+    # локальный запуск и бенчмарки: у SQLite нет QueuePool-настроек
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        echo=False
+    )
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        # executemany для UPDATE тоже идёт пачками (bulk_update_mappings в start_game)
+        executemany_mode="values_plus_batch",
+        executemany_batch_page_size=500,
+        echo=False  # можно включить True для отладки SQL
+    )
+
+instrument_engine(engine)
+trace_engine(engine)
 
 # Создаём фабрику сессий
 SessionLocal = scoped_session(
     sessionmaker(bind=engine, autocommit=False, autoflush=False)
 )
 
+# DB_ASYNC=1 — обработчики работают с БД через AsyncEngine без пула потоков
+ASYNC_DB = os.environ.get("DB_ASYNC", "").lower() in ("1", "true", "yes")
+
+async_engine = None
+AsyncSessionLocal = None
+
+
+def _async_database_url(url: str) -> str:
+    """postgresql:// -> postgresql+asyncpg://, sqlite:// -> sqlite+aiosqlite://"""
+    scheme, rest = url.split("://", 1)
+    driver = "aiosqlite" if scheme.startswith("sqlite") else "asyncpg"
+    return f"{scheme.split('+', 1)[0]}+{driver}://{rest}"
+
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    if DATABASE_URL.startswith("sqlite"):
+        async_engine = create_async_engine(_async_database_url(DATABASE_URL), echo=False)
+    else:
+        async_engine = create_async_engine(
+            _async_database_url(DATABASE_URL),
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            echo=False
+        )
+
+    instrument_engine(async_engine.sync_engine)
+    trace_engine(async_engine.sync_engine)
+
+    AsyncSessionLocal = sessionmaker(
+        bind=async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+
 # Базовый класс моделей
 Base = declarative_base()
 
+# Пул потоков для синхронных запросов из event loop'а aiogram.
+# Потоков столько же, сколько соединений может выдать engine.
+db_executor = ThreadPoolExecutor(
+    max_workers=POOL_SIZE + MAX_OVERFLOW,
+    thread_name_prefix="db"
+)
+
+# name -> [вызовов, суммарное время в БД, максимум, время блокировки loop'а]
+_db_call_stats: dict[str, list] = {}
+
+
+def _record_db_call(name: str, db_time: float, loop_time: float):
+    st = _db_call_stats.get(name)
+    if st is None:
+        st = _db_call_stats.setdefault(name, [0, 0.0, 0.0, 0.0])
+    st[0] += 1
+    st[1] += db_time
+    st[2] = max(st[2], db_time)
+    st[3] += loop_time
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с БД в пуле потоков, не блокируя loop."""
+    name = getattr(func, "__qualname__", repr(func))
+    # внутри трассы апдейта: спан вызова — родитель SQL-запросов из потока пула
+    with span(f"db_call {name}"):
+        return await _run_in_pool(name, func, args, kwargs)
+
+
+async def _run_in_pool(name: str, func, args, kwargs):
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    timings = {}
+
+    def call():
+        started = time.perf_counter()
+        try:
+            return ctx.run(func, *args, **kwargs)
+        finally:
+            timings["db"] = time.perf_counter() - started
+
+    submitted = time.perf_counter()
+    future = loop.run_in_executor(db_executor, call)
+    # сколько loop был занят нашим вызовом: только постановка задачи в пул
+    loop_time = time.perf_counter() - submitted
+    try:
+        return await future
+    finally:
+        db_time = timings.get("db", 0.0)
+        _record_db_call(name, db_time, loop_time)
+        if db_time > SLOW_DB_CALL:
+            logger.warning("slow_db_call: %s %.3fs", name, db_time)
+        else:
+            logger.debug("db_call: %s db=%.4fs loop=%.6fs", name, db_time, loop_time)
+
+
+def db_call_stats() -> dict:
+    """Статистика вызовов run_db: время в БД и время блокировки event loop'а."""
+    return {
+        name: {
+            "calls": count,
+            "db_avg_ms": round(total / count * 1000, 2),
+            "db_max_ms": round(max_time * 1000, 2),
+            "loop_blocked_avg_ms": round(loop_total / count * 1000, 4),
+        }
+        for name, (count, total, max_time, loop_total) in list(_db_call_stats.items())
+        if count
+    }
+
 def init_db():
-    """Создаёт таблицы, если их нет."""
+    """Доводит схему БД до текущей версии (app/migrations.py)."""
+    from app.migrations import migrate
+
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created/checked successfully")
+        applied = migrate(engine)
+        logger.info("Database schema is up to date (applied migrations: %s)", applied or "none")
     except Exception as e:
         logger.exception("Error creating database tables: %s", e)
         raise
@@ -0,0 +1,137 @@
+# app/dedup.py
+# Отсев повторных доставок webhook'а: Telegram повторяет запрос, если не получил
+# ответ вовремя, и один и тот же апдейт (/startgame, название игры) мог попасть
+# в очередь дважды. Принятые update_id хранятся UPDATE_DEDUP_TTL секунд:
+#   - в LRU в памяти процесса (не больше UPDATE_DEDUP_SIZE id);
+#   - при UPDATE_DEDUP_BACKEND=db — ещё и в таблице seen_updates, общей для всех
+#     процессов webhook'а.
+
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UPDATE_DEDUP_TTL = float(os.environ.get("UPDATE_DEDUP_TTL", "600"))
+UPDATE_DEDUP_SIZE = int(os.environ.get("UPDATE_DEDUP_SIZE", "100000"))
+
+
+class DbSeenUpdates:
+    """Принятые update_id в таблице seen_updates основной БД."""
+
+    name = "db"
+
+    def __init__(self, ttl: float = UPDATE_DEDUP_TTL, purge_interval: float = 60.0):
+        from app.database import engine
+        from app.models import SeenUpdate
+
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.engine = engine
+        self.table = SeenUpdate.__table__
+        self.table.create(engine, checkfirst=True)
+        self._purged_at = 0.0
+
+    def add(self, update_id: int, now: float) -> bool:
+        """Отмечает update_id; False, если его уже отметил другой процесс."""
+        from sqlalchemy.exc import IntegrityError
+
+        if now - self._purged_at > self.purge_interval:
+            self._purged_at = now
+            with self.engine.begin() as conn:
+                conn.execute(self.table.delete().where(self.table.c.seen_at < now - self.ttl))
+
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert(), {"update_id": update_id, "seen_at": now})
+        except IntegrityError:
+            return False
+        return True
+
+    def discard(self, update_id: int):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.update_id == update_id))
+
+
+class UpdateDeduplicator:
+    """LRU принятых update_id с вытеснением по времени и опциональным общим хранилищем."""
+
+    def __init__(self, ttl: float = UPDATE_DEDUP_TTL, max_size: int = UPDATE_DEDUP_SIZE, shared=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.shared = shared
+        self._lock = threading.Lock()
+        # update_id -> время получения; порядок вставки совпадает с порядком времени
+        self._seen = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared_errors = 0
+
+    def _evict(self, now: float):
+        seen = self._seen
+        while seen:
+            update_id, seen_at = next(iter(seen.items()))
+            if now - seen_at < self.ttl and len(seen) <= self.max_size:
+                break
+            seen.popitem(last=False)
+
+    def check_and_add(self, update_id) -> bool:
+        """True — апдейт новый (и теперь отмечен), False — повторная доставка."""
+        if update_id is None:
+            return True
+
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if update_id in self._seen:
+                self.hits += 1
+                return False
+            self._seen[update_id] = now
+
+        if self.shared is not None:
+            try:
+                if not self.shared.add(update_id, now):
+                    with self._lock:
+                        self.hits += 1
+                    return False
+            except Exception as e:
+                # лучше обработать апдейт дважды, чем потерять его
+                logger.exception("dedup shared backend failed for %s: %s", update_id, e)
+                self.shared_errors += 1
+
+        with self._lock:
+            self.misses += 1
+        return True
+
+    def forget(self, update_id):
+        """Снимает отметку, если апдейт не удалось поставить в очередь (Telegram повторит)."""
+        if update_id is None:
+            return
+        with self._lock:
+            self._seen.pop(update_id, None)
+        if self.shared is not None:
+            try:
+                self.shared.discard(update_id)
+            except Exception as e:
+                logger.exception("dedup shared backend failed to forget %s: %s", update_id, e)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.shared.name if self.shared is not None else "memory",
+            "size": len(self._seen),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_errors": self.shared_errors,
+        }
+
+
+def create_deduplicator(name: str | None = None) -> UpdateDeduplicator:
+    """Дедупликатор по имени бэкенда или из переменной UPDATE_DEDUP_BACKEND."""
+    name = name or os.environ.get("UPDATE_DEDUP_BACKEND", "memory")
+    if name == "memory":
+        return UpdateDeduplicator()
+    if name == "db":
+        return UpdateDeduplicator(shared=DbSeenUpdates())
+    raise ValueError(f"Unknown UPDATE_DEDUP_BACKEND: {name}")
@@ -0,0 +1,117 @@
+# app/dispatcher.py
+# Параллельная обработка апдейтов с сохранением порядка для каждого пользователя.
+# Апдейты разных пользователей идут одновременно (не больше max_in_flight),
+# апдейты одного пользователя/чата — строго по очереди.
+
+import asyncio
+import collections
+import logging
+import time
+
+from app.metrics import QUEUE_WAIT, UPDATE_ERROR, UPDATE_OK
+from app.tracing import continue_trace
+
+logger = logging.getLogger(__name__)
+
+# Типы апдейтов, у которых есть from / chat
+_UPDATE_KINDS = (
+    "message",
+    "edited_message",
+    "callback_query",
+    "channel_post",
+    "edited_channel_post",
+    "inline_query",
+    "chosen_inline_result",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+def update_key(update_data: dict):
+    """Ключ упорядочивания: from_user.id, иначе chat.id, иначе update_id."""
+    for kind in _UPDATE_KINDS:
+        obj = update_data.get(kind)
+        if not obj:
+            continue
+        user = obj.get("from")
+        if user and "id" in user:
+            return user["id"]
+        chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        break
+    return update_data.get("update_id")
+
+
+class UpdateDispatcher:
+    """Раздаёт апдейты из очереди обработчику с ограничением параллелизма."""
+
+    def __init__(self, max_in_flight: int = 16, max_buffered: int | None = None):
+        self.max_in_flight = max_in_flight
+        self.max_buffered = max_buffered or max_in_flight * 4
+        # ограничивает одновременно работающие обработчики
+        self._running = asyncio.Semaphore(max_in_flight)
+        # ограничивает апдейты, взятые из очереди, но ещё не обработанные
+        self._buffered = asyncio.Semaphore(self.max_buffered)
+        # ключ -> апдейты этого ключа, ожидающие обработки (первый — в работе)
+        self._chains: dict = {}
+        self._queued = 0
+        self._active = 0
+        # задачи _drain: event loop держит на задачи только слабые ссылки
+        self._tasks = set()
+
+    async def run(self, update_queue, handler, batch_size: int = 32):
+        """Бесконечно читает очередь пачками и раздаёт апдейты обработчику.
+
+        Апдейт подтверждается в очереди (ack) только после работы обработчика.
+        """
+        while True:
+            for item in await update_queue.get_batch(batch_size):
+                await self.submit(item, handler, update_queue.ack)
+
+    async def submit(self, item, handler, on_done=None):
+        """Ставит элемент очереди в цепочку его ключа. Ждёт, если буфер переполнен."""
+        await self._buffered.acquire()
+        self._queued += 1
+
+        key = update_key(item.update)
+        chain = self._chains.get(key)
+        if chain is not None:
+            chain.append((item, on_done))
+            return
+
+        self._chains[key] = collections.deque([(item, on_done)])
+        task = asyncio.ensure_future(self._drain(key, handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key, handler):
+        chain = self._chains[key]
+        while chain:
+            item, on_done = chain[0]
+            async with self._running:
+                self._queued -= 1
+                self._active += 1
+                QUEUE_WAIT.observe(max(0.0, time.time() - item.enqueued_at))
+                try:
+                    with continue_trace(item.update, item.enqueued_at):
+                        await handler(item.update)
+                    UPDATE_OK.inc()
+                except Exception as e:
+                    UPDATE_ERROR.inc()
+                    logger.exception("Error processing update %s: %s", item.update.get("update_id"), e)
+                finally:
+                    self._active -= 1
+                    chain.popleft()
+                    self._buffered.release()
+                    if on_done is not None:
+                        on_done(item)
+        del self._chains[key]
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queued,
+            "active": self._active,
+            "max_in_flight": self.max_in_flight,
+        }
@@ -0,0 +1,214 @@
+# app/draw.py
+# Движки жеребьёвки. Результат — словарь santa_id -> receiver_id,
+# где каждый участник дарит ровно одному и получает ровно от одного.
+
+import collections
+import os
+import random
+
+
+class DrawInfeasible(Exception):
+    """Ограничения не позволяют провести жеребьёвку."""
+
+
+class CycleDrawEngine:
+    """Один перемешанный цикл без ограничений (исходный алгоритм бота)."""
+
+    def draw(self, user_ids, exclusions=(), avoid=()) -> dict:
+        order = list(user_ids)
+        if len(order) < 2:
+            raise DrawInfeasible("need at least 2 participants")
+        random.shuffle(order)
+        return {giver: order[(i + 1) % len(order)] for i, giver in enumerate(order)}
+
+
+class ConstrainedDrawEngine:
+    """Жеребьёвка с запретами.
+
+    exclusions — жёсткие запреты: пары (a, b), которые не дарят друг другу
+    ни в одну сторону (пары, одна команда).
+    avoid — мягкие запреты: пары (santa, receiver) прошлой игры; если с ними
+    жеребьёвка невозможна, они снимаются.
+
+    Сначала берётся случайный цикл и нарушения чинятся обменом получателей
+    (ограниченное число попыток). Если не вышло — точный поиск совершенного
+    паросочетания (Хопкрофт — Карп), который либо находит распределение,
+    либо доказывает, что его нет.
+    """
+
+    def __init__(self, repair_rounds: int = 8, swap_attempts: int = 32):
+        self.repair_rounds = repair_rounds
+        self.swap_attempts = swap_attempts
+
+    def draw(self, user_ids, exclusions=(), avoid=()) -> dict:
+        ids = list(dict.fromkeys(user_ids))
+        if len(ids) < 2:
+            raise DrawInfeasible("need at least 2 participants")
+
+        index = {uid: i for i, uid in enumerate(ids)}
+        hard = self._forbidden(index, exclusions, symmetric=True)
+
+        if avoid:
+            soft = self._forbidden(index, avoid, symmetric=False)
+            for i, receivers in hard.items():
+                soft.setdefault(i, set()).update(receivers)
+            try:
+                return self._solve(ids, soft)
+            except DrawInfeasible:
+                pass
+
+        return self._solve(ids, hard)
+
+    @staticmethod
+    def _forbidden(index: dict, pairs, symmetric: bool) -> dict:
+        forbidden = {}
+        for a, b in pairs:
+            ia, ib = index.get(a), index.get(b)
+            if ia is None or ib is None or ia == ib:
+                continue
+            forbidden.setdefault(ia, set()).add(ib)
+            if symmetric:
+                forbidden.setdefault(ib, set()).add(ia)
+        return forbidden
+
+    def _solve(self, ids: list, forbidden: dict) -> dict:
+        n = len(ids)
+
+        # Быстрая проверка: у каждого должен быть хоть один допустимый
+        # получатель и хоть один допустимый Санта
+        incoming = collections.Counter()
+        for receivers in forbidden.values():
+            incoming.update(receivers)
+        for i in range(n):
+            if len(forbidden.get(i, ())) >= n - 1 or incoming[i] >= n - 1:
+                raise DrawInfeasible(f"participant {ids[i]} has no allowed pairs")
+
+        targets = self._repair_cycle(n, forbidden) if forbidden else None
+        if targets is None:
+            targets = self._matching(n, forbidden) if forbidden else self._cycle(n)
+        return {ids[i]: ids[t] for i, t in enumerate(targets)}
+
+    @staticmethod
+    def _cycle(n: int) -> list:
+        order = list(range(n))
+        random.shuffle(order)
+        targets = [0] * n
+        for k, i in enumerate(order):
+            targets[i] = order[(k + 1) % n]
+        return targets
+
+    def _repair_cycle(self, n: int, forbidden: dict):
+        """Случайный цикл + локальные обмены получателей; None, если не вышло."""
+        empty = ()
+
+        def bad(i, t):
+            return i == t or t in forbidden.get(i, empty)
+
+        for _ in range(self.repair_rounds):
+            targets = self._cycle(n)
+            violations = [i for i in forbidden if bad(i, targets[i])]
+
+            for i in violations:
+                if not bad(i, targets[i]):
+                    continue
+                for _ in range(self.swap_attempts):
+                    j = random.randrange(n)
+                    ti, tj = targets[i], targets[j]
+                    if not bad(i, tj) and not bad(j, ti):
+                        targets[i], targets[j] = tj, ti
+                        break
+                else:
+                    break
+            else:
+                return targets
+        return None
+
+    @staticmethod
+    def _matching(n: int, forbidden: dict) -> list:
+        """Совершенное паросочетание Санта -> получатель (Хопкрофт — Карп)."""
+        receivers = list(range(n))
+        adj = []
+        for i in range(n):
+            random.shuffle(receivers)
+            banned = forbidden.get(i, ())
+            adj.append([t for t in receivers if t != i and t not in banned])
+
+        match_l = [-1] * n
+        match_r = [-1] * n
+
+        # жадное начальное паросочетание
+        for u in range(n):
+            for v in adj[u]:
+                if match_r[v] == -1:
+                    match_l[u] = v
+                    match_r[v] = u
+                    break
+
+        while True:
+            dist = [-1] * n
+            queue = collections.deque()
+            for u in range(n):
+                if match_l[u] == -1:
+                    dist[u] = 0
+                    queue.append(u)
+
+            found = False
+            while queue:
+                u = queue.popleft()
+                for v in adj[u]:
+                    w = match_r[v]
+                    if w == -1:
+                        found = True
+                    elif dist[w] == -1:
+                        dist[w] = dist[u] + 1
+                        queue.append(w)
+            if not found:
+                break
+
+            pos = [0] * n
+            for root in range(n):
+                if match_l[root] != -1:
+                    continue
+                stack, path = [root], []
+                while stack:
+                    u = stack[-1]
+                    pushed = False
+                    while pos[u] < len(adj[u]):
+                        v = adj[u][pos[u]]
+                        pos[u] += 1
+                        w = match_r[v]
+                        if w == -1:
+                            # увеличивающий путь найден — перекладываем пары
+                            path.append(v)
+                            for uu, vv in zip(stack, path):
+                                match_l[uu] = vv
+                                match_r[vv] = uu
+                            stack = []
+                            pushed = True
+                            break
+                        if dist[w] == dist[u] + 1:
+                            path.append(v)
+                            stack.append(w)
+                            pushed = True
+                            break
+                    if not pushed:
+                        dist[u] = -1
+                        stack.pop()
+                        if path:
+                            path.pop()
+
+        if -1 in match_l:
+            raise DrawInfeasible("constraints leave no valid assignment")
+        return match_l
+
+
+DRAW_ENGINES = {
+    "cycle": CycleDrawEngine,
+    "constrained": ConstrainedDrawEngine,
+}
+
+
+def get_draw_engine(name: str | None = None):
+    """Движок жеребьёвки по имени или из переменной DRAW_ENGINE."""
+    name = name or os.environ.get("DRAW_ENGINE", "constrained")
+    return DRAW_ENGINES[name]()
@@ -0,0 +1,190 @@
+# app/export.py
+# Потоковая выгрузка игр с участниками для /dump_games.
+#
+# Игры и участники читаются одним запросом с LEFT JOIN, упорядоченным по коду
+# игры, через серверный курсор (yield_per) — в памяти одновременно только одна
+# пачка строк, независимо от размера таблиц. Ответ отдаётся кусками: JSON
+# ({"games": [...]}, как раньше) или NDJSON (одна игра на строку).
+#
+# Фильтры для инкрементальной выгрузки: since — игры, созданные или запущенные
+# не раньше момента; game_id — только указанные игры; after + limit — постранично
+# по коду игры (следующая страница начинается после последнего кода).
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import or_, select
+
+from app.database import engine
+from app.models import Game, Participant
+
+logger = logging.getLogger(__name__)
+
+# Строк на одну выборку из серверного курсора
+EXPORT_BATCH = int(os.environ.get("EXPORT_BATCH", "1000"))
+
+# Примерный размер куска ответа (байт)
+EXPORT_CHUNK = int(os.environ.get("EXPORT_CHUNK", "65536"))
+
+games = Game.__table__
+participants = Participant.__table__
+
+
+class ExportFilter:
+    """Разобранные параметры выгрузки."""
+
+    def __init__(self, since=None, game_ids=None, after=None, limit=None):
+        self.since = since
+        self.game_ids = game_ids
+        self.after = after
+        self.limit = limit
+
+    @classmethod
+    def from_args(cls, args):
+        """Из request.args; ValueError при неверных значениях."""
+        since = args.get("since")
+        if since:
+            since = datetime.fromisoformat(since.replace("Z", "+00:00"))
+            if since.tzinfo is not None:
+                # created_at / started_at хранятся в UTC без часового пояса
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+        game_ids = [
+            gid.strip()
+            for value in args.getlist("game_id")
+            for gid in value.split(",") if gid.strip()
+        ]
+
+        limit = args.get("limit")
+        if limit is not None:
+            limit = int(limit)
+            if limit <= 0:
+                raise ValueError("limit must be positive")
+
+        return cls(since=since or None, game_ids=game_ids or None,
+                   after=args.get("after") or None, limit=limit)
+
+
+def export_query(flt: ExportFilter):
+    """Игры по фильтру с участниками: одна строка на участника (или на пустую игру)."""
+    selected = select(games).order_by(games.c.id)
+    if flt.since is not None:
+        selected = selected.where(or_(games.c.created_at >= flt.since, games.c.started_at >= flt.since))
+    if flt.game_ids:
+        selected = selected.where(games.c.id.in_(flt.game_ids))
+    if flt.after:
+        selected = selected.where(games.c.id > flt.after)
+    if flt.limit:
+        selected = selected.limit(flt.limit)
+    selected = selected.subquery("g")
+
+    return select(
+        selected.c.id,
+        selected.c.name,
+        selected.c.admin_id,
+        selected.c.admin_username,
+        selected.c.is_active,
+        selected.c.is_started,
+        selected.c.created_at,
+        selected.c.started_at,
+        participants.c.user_id,
+        participants.c.username,
+        participants.c.full_name,
+        participants.c.wishlist,
+        participants.c.target_id,
+    ).select_from(
+        selected.outerjoin(participants, participants.c.game_id == selected.c.id)
+    ).order_by(selected.c.id, participants.c.id)
+
+
+def _game(row) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "admin_id": row.admin_id,
+        "admin_username": row.admin_username,
+        "is_active": row.is_active,
+        "is_started": row.is_started,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "participants": [],
+    }
+
+
+def iter_games(flt: ExportFilter, bind=engine, batch: int = EXPORT_BATCH):
+    """Игры по одной, с участниками; строки читаются пачками по batch."""
+    with bind.connect() as conn:
+        result = conn.execution_options(yield_per=batch).execute(export_query(flt))
+        game = None
+        for rows in result.partitions():
+            for row in rows:
+                if game is None or game["id"] != row.id:
+                    if game is not None:
+                        yield game
+                    game = _game(row)
+                if row.user_id is not None:
+                    game["participants"].append({
+                        "user_id": row.user_id,
+                        "username": row.username,
+                        "full_name": row.full_name,
+                        "wishlist": row.wishlist,
+                        "target_id": row.target_id,
+                    })
+        if game is not None:
+            yield game
+
+
+def _chunked(parts, size: int = EXPORT_CHUNK):
+    """Склеивает мелкие строки в куски примерно по size байт."""
+    buf, length = [], 0
+    for part in parts:
+        buf.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buf)
+            buf, length = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def _ndjson(flt: ExportFilter):
+    try:
+        for game in iter_games(flt):
+            yield json.dumps(game, ensure_ascii=False) + "\n"
+    except Exception as e:
+        # статус 200 уже отправлен — сообщаем об обрыве последней строкой
+        logger.exception("Error dump_games: %s", e)
+        yield json.dumps({"error": "export failed"}) + "\n"
+
+
+def _json(flt: ExportFilter):
+    yield '{"games": ['
+    count, last_id = 0, None
+    for game in iter_games(flt):
+        yield ("," if count else "") + json.dumps(game, ensure_ascii=False)
+        count += 1
+        last_id = game["id"]
+    tail = "]"
+    if flt.limit and count == flt.limit:
+        tail += ', "next_after": ' + json.dumps(last_id)
+    yield tail + "}"
+
+
+def export_chunks(flt: ExportFilter, fmt: str = "json"):
+    """Куски ответа в формате fmt ("json" или "ndjson").
+
+    При ошибке в середине JSON-выгрузки документ остаётся незакрытым, и клиент
+    не примет его за полный.
+    """
+    if fmt == "ndjson":
+        return _chunked(_ndjson(flt))
+
+    def guarded():
+        try:
+            yield from _json(flt)
+        except Exception as e:
+            logger.exception("Error dump_games: %s", e)
+
+    return _chunked(guarded())
@@ -0,0 +1,131 @@
+# app/ingress.py
+# Ограничение входящего потока апдейтов (backpressure) перед очередью.
+#
+# Очередь ограничена UPDATE_QUEUE_MAX апдейтами. Когда в ней набирается
+# UPDATE_QUEUE_HIGH апдейтов, webhook начинает отбрасывать малоценные апдейты
+# (кнопки «Статус»/«Помощь», произвольный текст) и продолжает так, пока очередь
+# не опустится до UPDATE_QUEUE_LOW. При заполненной очереди webhook отвечает 503 —
+# Telegram повторит доставку позже.
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UPDATE_QUEUE_MAX = int(os.environ.get("UPDATE_QUEUE_MAX", "10000"))
+UPDATE_QUEUE_HIGH = int(os.environ.get("UPDATE_QUEUE_HIGH", str(UPDATE_QUEUE_MAX * 8 // 10)))
+UPDATE_QUEUE_LOW = int(os.environ.get("UPDATE_QUEUE_LOW", str(UPDATE_QUEUE_MAX // 2)))
+
+# Кнопки меню, ответ на которые можно не показывать при перегрузке
+LOW_PRIORITY_CALLBACKS = {"menu_status", "menu_help"}
+
+# Решения admit()
+ACCEPT = "accept"
+SHED = "shed"
+REJECT = "reject"
+
+
+def is_low_priority(update_data: dict, is_pending=None) -> bool:
+    """Апдейт, который можно потерять без вреда для игр.
+
+    is_pending(user_id) — ждёт ли бот от пользователя название игры;
+    если не передан, любой текст считается важным.
+    """
+    callback = update_data.get("callback_query")
+    if callback is not None:
+        return callback.get("data") in LOW_PRIORITY_CALLBACKS
+
+    message = update_data.get("message")
+    if message is None:
+        # edited_message, my_chat_member и пр. — бот на них не отвечает
+        return True
+
+    text = message.get("text") or ""
+    if text.startswith("/") or is_pending is None:
+        return False
+    user_id = (message.get("from") or {}).get("id")
+    return not is_pending(user_id)
+
+
+class IngressGate:
+    """Решает, принять ли апдейт в очередь, по её заполненности (с гистерезисом)."""
+
+    def __init__(
+        self,
+        update_queue,
+        max_depth: int = UPDATE_QUEUE_MAX,
+        high: int = UPDATE_QUEUE_HIGH,
+        low: int = UPDATE_QUEUE_LOW,
+        is_pending=None,
+        depth_ttl: float = 0.2,
+    ):
+        if not low < high <= max_depth:
+            raise ValueError(f"Expected low < high <= max, got {low}/{high}/{max_depth}")
+
+        self.update_queue = update_queue
+        self.max_depth = max_depth
+        self.high = high
+        self.low = low
+        self.is_pending = is_pending
+        # глубину durable-очереди (запрос в БД) кэшируем на depth_ttl секунд
+        self.depth_ttl = depth_ttl if update_queue.backend.blocking else 0.0
+
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._depth_at = 0.0
+        self.shedding = False
+        self.accepted = 0
+        self.shed = 0
+        self.rejected = 0
+        self.shed_episodes = 0
+
+    def _current_depth(self) -> int:
+        now = time.monotonic()
+        if now - self._depth_at >= self.depth_ttl:
+            self._depth = self.update_queue.qsize()
+            self._depth_at = now
+        return self._depth
+
+    def admit(self, update_data: dict) -> str:
+        """ACCEPT — ставить в очередь, SHED — отбросить (ответить 200), REJECT — ответить 503."""
+        with self._lock:
+            depth = self._current_depth()
+
+            if depth >= self.high and not self.shedding:
+                self.shedding = True
+                self.shed_episodes += 1
+                logger.warning("ingress: queue depth %s >= %s, shedding low-priority updates", depth, self.high)
+            elif depth <= self.low and self.shedding:
+                self.shedding = False
+                logger.info("ingress: queue depth %s <= %s, accepting all updates", depth, self.low)
+
+            if depth >= self.max_depth:
+                self.rejected += 1
+                return REJECT
+            shedding = self.shedding
+
+        if shedding and is_low_priority(update_data, self.is_pending):
+            with self._lock:
+                self.shed += 1
+            return SHED
+
+        with self._lock:
+            self.accepted += 1
+            # пока глубина закэширована, учитываем принятые апдейты сами
+            self._depth += 1
+        return ACCEPT
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._depth,
+            "max_depth": self.max_depth,
+            "high_watermark": self.high,
+            "low_watermark": self.low,
+            "shedding": self.shedding,
+            "accepted": self.accepted,
+            "shed": self.shed,
+            "rejected": self.rejected,
+            "shed_episodes": self.shed_episodes,
+        }
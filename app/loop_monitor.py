@@ -0,0 +1,261 @@
+# app/loop_monitor.py
+# Здоровье event loop'а воркера: задержка планирования и обработчики,
+# надолго занявшие loop (синхронный вызов БД, тяжёлый цикл без await).
+#
+# Задача-пульс на loop'е просыпается каждые LOOP_MONITOR_INTERVAL и отмечает
+# время. Сторожевой поток смотрит на эту отметку: если пульса нет дольше
+# LOOP_STALL_THRESHOLD, loop кем-то занят — поток снимает стек потока loop'а
+# (sys._current_frames) и запоминает текущую задачу. Когда пульс возобновится,
+# в лог уходит одно предупреждение: длительность, обработчик, тип апдейта
+# и самый частый из снятых стеков. Пока loop свободен, всё это — пара
+# сравнений раз в интервал; стек снимается только во время зависания.
+#
+# Обработчик и тип апдейта для задачи запоминает LoopMonitorMiddleware.
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from app.metrics import LOOP_LAG, LOOP_LAG_LAST, Counter
+
+logger = logging.getLogger(__name__)
+
+# Период пульса и проверок сторожа (сек)
+LOOP_MONITOR_INTERVAL = float(os.environ.get("LOOP_MONITOR_INTERVAL", "0.05"))
+# Сколько loop может быть занят одним вызовом без предупреждения (сек)
+LOOP_STALL_THRESHOLD = float(os.environ.get("LOOP_STALL_THRESHOLD", "0.25"))
+# Зависание дольше этого логируется сразу, не дожидаясь его конца (сек)
+LOOP_STALL_REPORT_AFTER = float(os.environ.get("LOOP_STALL_REPORT_AFTER", "5"))
+# Сколько последних зависаний хранить для /loop_health
+LOOP_STALL_HISTORY = int(os.environ.get("LOOP_STALL_HISTORY", "50"))
+# За какой период считать сводку по задержке (сек)
+LOOP_LAG_WINDOW = float(os.environ.get("LOOP_LAG_WINDOW", "60"))
+
+STACK_LIMIT = 25
+
+LOOP_STALLS = Counter(
+    "santa_event_loop_stalls_total", "Times the worker event loop was blocked longer than the threshold", ("handler",)
+)
+LOOP_STALLED = Counter(
+    "santa_event_loop_stalled_seconds_total", "Time the worker event loop spent blocked", ("handler",)
+)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+
+def _task_name(task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or task.get_name()
+
+
+class LoopMonitor:
+    """Пульс на loop'е + сторожевой поток. Один на event loop воркера."""
+
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        threshold: float = LOOP_STALL_THRESHOLD,
+        history: int = LOOP_STALL_HISTORY,
+        lag_window: float = LOOP_LAG_WINDOW,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.loop = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._task = None
+        # время последнего пульса (perf_counter); пишет только loop, читает сторож
+        self._beat = 0.0
+        # задача -> (обработчик, тип апдейта); заполняет LoopMonitorMiddleware
+        self.running = {}
+
+        self._lags = collections.deque(maxlen=max(1, int(lag_window / interval)))
+        self._stalls = collections.deque(maxlen=history)
+        self._by_handler = {}  # обработчик -> [число, сумма, максимум]
+        self._total = 0
+        self._total_seconds = 0.0
+        self._started_at = None
+
+        # текущее зависание (только в потоке сторожа)
+        self._stall = None
+
+    # -------------------- запуск --------------------
+
+    def attach(self, loop):
+        """Запускает пульс на loop и сторожевой поток; вызывается из потока loop'а."""
+        self.loop = loop
+        self._thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._started_at = datetime.utcnow().isoformat()
+        self._task = loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info("Loop monitor started (interval=%ss, threshold=%ss)", self.interval, self.threshold)
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        interval = self.interval
+        while True:
+            due = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - due)
+            self._beat = now
+            self._lags.append(lag)
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    # -------------------- сторож --------------------
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            silent = time.perf_counter() - beat - self.interval
+            stall = self._stall
+
+            if stall is not None and stall["beat"] != beat:
+                # пульс возобновился — зависание кончилось
+                self._finish(stall, beat - stall["beat"] - self.interval)
+                stall = self._stall = None
+
+            if silent < self.threshold:
+                continue
+            if stall is None:
+                stall = self._stall = self._begin(beat)
+            self._sample(stall)
+            if not stall["reported"] and silent >= LOOP_STALL_REPORT_AFTER:
+                stall["reported"] = True
+                stack, _ = stall["stacks"].most_common(1)[0]
+                logger.warning(
+                    "Event loop blocked for %.1fs so far by %s (%s), still running:\n%s",
+                    silent, stall["handler"], stall["update_type"], stack
+                )
+
+    def _begin(self, beat: float) -> dict:
+        handler, update_type = "-", "-"
+        task = asyncio.current_task(self.loop)
+        if task is not None:
+            handler, update_type = self.running.get(task) or (_task_name(task), "-")
+        return {
+            "beat": beat,
+            "at": datetime.utcnow().isoformat(),
+            "handler": handler,
+            "update_type": update_type,
+            "stacks": collections.Counter(),
+            "samples": 0,
+            "reported": False,
+        }
+
+    def _sample(self, stall: dict):
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        del frame
+        stall["stacks"][stack] += 1
+        stall["samples"] += 1
+
+    def _finish(self, stall: dict, duration: float):
+        duration = max(duration, self.threshold)
+        handler = stall["handler"]
+        stack, hits = stall["stacks"].most_common(1)[0] if stall["stacks"] else ("", 0)
+
+        self._total += 1
+        self._total_seconds += duration
+        entry = self._by_handler.setdefault(handler, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+        LOOP_STALLS.labels(handler).inc()
+        LOOP_STALLED.labels(handler).inc(duration)
+
+        self._stalls.append({
+            "at": stall["at"],
+            "duration": round(duration, 3),
+            "handler": handler,
+            "update_type": stall["update_type"],
+            "samples": stall["samples"],
+            "stack": stack.splitlines(),
+        })
+        logger.warning(
+            "Event loop blocked for %.3fs by %s (%s); stack in %d/%d samples:\n%s",
+            duration, handler, stall["update_type"], hits, stall["samples"], stack
+        )
+
+    # -------------------- сводка --------------------
+
+    def summary(self) -> dict:
+        """Сводка для /loop_health: задержка за окно, зависания по обработчикам, последние зависания."""
+        if self.loop is None:
+            return {"attached": False}
+
+        lags = sorted(self._lags)
+        stall = self._stall
+        return {
+            "attached": True,
+            "since": self._started_at,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "lag": {
+                "window_seconds": round(len(lags) * self.interval, 1),
+                "last": round(self._lags[-1], 4) if self._lags else None,
+                "p50": _percentile(lags, 0.5),
+                "p99": _percentile(lags, 0.99),
+                "max": round(lags[-1], 4) if lags else None,
+            },
+            "blocked_now": None if stall is None else {
+                "since": stall["at"],
+                "handler": stall["handler"],
+                "update_type": stall["update_type"],
+            },
+            "stalls_total": self._total,
+            "stalled_seconds_total": round(self._total_seconds, 3),
+            "by_handler": {
+                handler: {"count": count, "seconds": round(total, 3), "max": round(longest, 3)}
+                for handler, (count, total, longest) in sorted(
+                    self._by_handler.items(), key=lambda item: item[1][1], reverse=True
+                )
+            },
+            "recent": list(reversed(self._stalls)),
+        }
+
+
+class LoopMonitorMiddleware(BaseMiddleware):
+    """Middleware aiogram: какой обработчик и тип апдейта выполняет текущая задача."""
+
+    def __init__(self, monitor: LoopMonitor):
+        super().__init__()
+        self.monitor = monitor
+
+    async def trigger(self, action, args):
+        if action == "process_update" or action == "post_process_update":
+            return None
+        if action.startswith("process_"):
+            task = asyncio.current_task()
+            if task is not None:
+                handler = current_handler.get()
+                self.monitor.running[task] = (getattr(handler, "__name__", "unknown"), action[8:])
+        elif action.startswith("post_process_"):
+            task = asyncio.current_task()
+            if task is not None:
+                self.monitor.running.pop(task, None)
+        return None
+
+
+loop_monitor = LoopMonitor()
@@ -2,15 +2,233 @@
 # Логика управления играми: создание, присоединение, жеребьёвка, цели, информация
 
 import logging
-import random
+import os
 from datetime import datetime
 
-from app.database import SessionLocal
-from app.models import Game, Participant
+from sqlalchemy import Integer, String, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+
+from app.bulk_import import BULK_IMPORT_BATCH
+from app.cache import game_info_cache
+from app.database import SessionLocal, engine, run_db
+from app.draw import DrawInfeasible, get_draw_engine
+from app.models import Game, Participant, Exclusion
+from app.stats import (
+    game_transition, increment_statements, new_players_statement, read_stats,
+    reconcile, staleness
+)
 from app.utils import generate_game_id
 
 logger = logging.getLogger(__name__)
 
+# Сколько игр показывать на одной странице /mygames
+MYGAMES_PAGE_SIZE = int(os.environ.get("MYGAMES_PAGE_SIZE", "10"))
+
+
+def load_draw_constraints(db, game):
+    """Запреты для жеребьёвки: исключения игры и пары прошлой игры того же создателя."""
+    exclusions = db.query(Exclusion.user_a, Exclusion.user_b).filter(
+        Exclusion.game_id == game.id
+    ).all()
+
+    previous = db.query(Game.id).filter(
+        Game.admin_id == game.admin_id,
+        Game.id != game.id,
+        Game.started_at.isnot(None)
+    ).order_by(Game.started_at.desc()).first()
+
+    avoid = []
+    if previous:
+        avoid = db.query(Participant.user_id, Participant.target_id).filter(
+            Participant.game_id == previous[0],
+            Participant.target_id.isnot(None)
+        ).all()
+
+    return exclusions, avoid
+
+
+def my_targets_query(user_id: int):
+    """Получатели пользователя во всех начатых играх — один запрос.
+
+    Имя получателя берётся со строки дарящего (записано при жеребьёвке),
+    для игр, разыгранных до появления этих колонок, — со строки получателя.
+    """
+    target = aliased(Participant)
+    return select(
+        Participant.game_id,
+        Game.name,
+        target.user_id,
+        func.coalesce(Participant.target_full_name, target.full_name),
+        func.coalesce(Participant.target_username, target.username),
+        target.wishlist
+    ).join(
+        Game, Game.id == Participant.game_id
+    ).outerjoin(
+        target,
+        (target.game_id == Participant.game_id) & (target.user_id == Participant.target_id)
+    ).where(
+        Participant.user_id == user_id,
+        Game.is_started == True  # noqa: E712
+    )
+
+
+def user_games_query(user_id: int, page: int = 0, page_size: int = MYGAMES_PAGE_SIZE):
+    """Страница /mygames: игры пользователя с числом участников, новые сверху.
+
+    Берёт на одну строку больше page_size — по ней видно, есть ли следующая страница.
+    """
+    me = aliased(Participant)
+    return select(
+        Game.id,
+        Game.name,
+        Game.is_active,
+        Game.is_started,
+        func.count(Participant.id)
+    ).join(
+        me, me.game_id == Game.id
+    ).join(
+        Participant, Participant.game_id == Game.id
+    ).where(
+        me.user_id == user_id
+    ).group_by(
+        Game.id, Game.name, Game.is_active, Game.is_started, Game.created_at
+    ).order_by(
+        Game.created_at.desc(), Game.id
+    ).limit(page_size + 1).offset(page * page_size)
+
+
+def my_targets_rows(rows) -> list[dict]:
+    results = []
+    for game_id, game_name, target_id, full_name, username, wishlist in rows:
+        if target_id is None:
+            results.append({
+                "game_id": game_id,
+                "game_name": game_name,
+                "target_id": None
+            })
+            continue
+
+        results.append({
+            "game_id": game_id,
+            "game_name": game_name,
+            "target_id": target_id,
+            "target_username": username,
+            "target_full_name": full_name,
+            "target_wishlist": wishlist or "Пожелания не указаны"
+        })
+    return results
+
+
+def draw_mappings(participants, exclusions=(), avoid=()):
+    """Жеребьёвка выбранным движком (DRAW_ENGINE) с учётом запретов.
+
+    participants — строки с полями id, user_id, username, full_name.
+    Возвращает маппинги для bulk_update_mappings и список пар (santa, receiver).
+    Бросает DrawInfeasible, если запреты не оставляют вариантов.
+    """
+    by_user = {p.user_id: p for p in participants}
+    pairs = get_draw_engine().draw(list(by_user), exclusions, avoid)
+
+    mappings = []
+    assignments = []
+    for giver in participants:
+        receiver = by_user[pairs[giver.user_id]]
+        mappings.append({
+            "id": giver.id,
+            "target_id": receiver.user_id,
+            # имя получателя на момент жеребьёвки — для /mytargets без лишних запросов
+            "target_username": receiver.username,
+            "target_full_name": receiver.full_name
+        })
+        assignments.append((giver.user_id, receiver.user_id))
+
+    return mappings, assignments
+
+
+class JoinOutcome:
+    """Результат попытки вступить в игру."""
+    JOINED = "joined"
+    ALREADY_JOINED = "already_joined"
+    STARTED = "started"
+    NOT_FOUND = "not_found"
+
+
+JOIN_MESSAGES = {
+    JoinOutcome.JOINED: "🎉 Вы присоединились к праздничной игре!",
+    JoinOutcome.ALREADY_JOINED: "🎅 Вы уже участвуете в этой игре",
+    JoinOutcome.STARTED: "⏳ Игра уже началась",
+    JoinOutcome.NOT_FOUND: "❌ Игра не найдена",
+}
+
+
+def join_rows(game, user_id: int, username: str | None, full_name: str):
+    """Строка нового участника для INSERT ... SELECT, если игра game ещё не началась."""
+    return select(
+        game.c.id,
+        literal(user_id, Integer),
+        literal(username, String),
+        literal(full_name, String)
+    ).where(game.c.is_started.isnot(True))
+
+
+def join_insert(dialect_name: str, game_id: str, user_id: int, username: str | None, full_name: str):
+    """INSERT участника, только если игра есть и ещё не началась; повтор отсекает
+    уникальный индекс (game_id, user_id) через ON CONFLICT DO NOTHING."""
+    game = Game.__table__
+    source = join_rows(game, user_id, username, full_name).where(game.c.id == game_id)
+
+    if dialect_name == "postgresql":
+        # блокирует игру от одновременного start_game, но не от других вступающих
+        source = source.with_for_update(read=True)
+        insert = pg_insert
+    else:
+        insert = sqlite_insert
+
+    return insert(Participant).from_select(
+        ["game_id", "user_id", "username", "full_name"], source
+    ).on_conflict_do_nothing(index_elements=["game_id", "user_id"])
+
+
+def game_started(game_id: str):
+    """is_started игры: None — игры нет."""
+    return select(func.coalesce(Game.is_started, False)).where(Game.id == game_id).scalar_subquery()
+
+
+def join_statement(dialect_name: str, game_id: str, user_id: int, username: str | None, full_name: str):
+    """Вступление в игру одним запросом (PostgreSQL): строка (inserted, is_started).
+
+    На других БД возвращает None — там INSERT и проверка игры идут двумя запросами.
+    """
+    if dialect_name != "postgresql":
+        return None
+    # Строка игры под FOR SHARE. Если её держит одновременный start_game, после его
+    # коммита PostgreSQL перечитывает строку, поэтому и INSERT, и is_started в ответе
+    # видят уже начатую игру (подзапрос к games вне CTE видел бы снимок до ожидания).
+    game = select(
+        Game.id, func.coalesce(Game.is_started, False).label("is_started")
+    ).where(Game.id == game_id).with_for_update(read=True).cte("game")
+    inserted = pg_insert(Participant).from_select(
+        ["game_id", "user_id", "username", "full_name"], join_rows(game, user_id, username, full_name)
+    ).on_conflict_do_nothing(
+        index_elements=["game_id", "user_id"]
+    ).returning(Participant.id).cte("inserted")
+    return select(
+        select(func.count()).select_from(inserted).scalar_subquery(),
+        select(game.c.is_started).scalar_subquery()
+    )
+
+
+def join_outcome(inserted: int, is_started) -> str:
+    if inserted:
+        return JoinOutcome.JOINED
+    if is_started is None:
+        return JoinOutcome.NOT_FOUND
+    if is_started:
+        return JoinOutcome.STARTED
+    return JoinOutcome.ALREADY_JOINED
+
 
 class GameManager:
 
@@ -44,7 +262,15 @@ class GameManager:
             )
             db.add(participant)
 
+            new_players = db.execute(
+                new_players_statement(db.get_bind().dialect.name, [creator_id])
+            ).rowcount
+            deltas = {**game_transition(None, (True, False)), "total_players": new_players}
+            for stmt in increment_statements(deltas):
+                db.execute(stmt)
+
             db.commit()
+            game_info_cache.invalidate(game_id)
             logger.info("game_created: %s by %s", game_id, creator_id)
 
             return {
@@ -64,50 +290,127 @@ class GameManager:
             db.close()
 
     @staticmethod
-    def join_game(game_id: str, user_id: int, tg_username: str | None, full_name: str):
-        """Присоединяет пользователя к игре."""
+    def join(game_id: str, user_id: int, tg_username: str | None, full_name: str) -> str:
+        """Присоединяет пользователя к игре, возвращает JoinOutcome.
+
+        На PostgreSQL — один запрос: проверка игры и INSERT ... ON CONFLICT.
+        """
         db = SessionLocal()
         try:
-            game = db.query(Game).filter(Game.id == game_id).first()
-            if not game:
-                return False, "❌ Игра не найдена"
+            dialect_name = db.get_bind().dialect.name
+            stmt = join_statement(dialect_name, game_id, user_id, tg_username, full_name)
+            if stmt is not None:
+                inserted, is_started = db.execute(stmt).one()
+            else:
+                inserted = db.execute(
+                    join_insert(dialect_name, game_id, user_id, tg_username, full_name)
+                ).rowcount
+                is_started = None if inserted else db.execute(select(game_started(game_id))).scalar()
+            if inserted:
+                new_players = db.execute(new_players_statement(dialect_name, [user_id])).rowcount
+                for stmt in increment_statements({"total_players": new_players}):
+                    db.execute(stmt)
+            db.commit()
 
-            if game.is_started:
-                return False, "⏳ Игра уже началась"
+            outcome = join_outcome(inserted, is_started)
+            if outcome == JoinOutcome.JOINED:
+                game_info_cache.invalidate(game_id)
+                logger.info("player_joined: game=%s user=%s", game_id, user_id)
+            return outcome
 
-            exists = db.query(Participant).filter(
-                Participant.game_id == game_id,
-                Participant.user_id == user_id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def bulk_join(game_id: str, report, batch: int = BULK_IMPORT_BATCH) -> str:
+        """Добавляет в игру годные строки report (bulk_import.ImportReport) одной транзакцией.
+
+        Один скомпилированный INSERT ... ON CONFLICT DO NOTHING на пачку строк
+        (executemany; на PostgreSQL psycopg2 отправляет его многострочными VALUES).
+        Кто уже был в игре, попадает в report.duplicates. Возвращает JoinOutcome
+        (JOINED — загрузка выполнена, даже если новых участников нет).
+        """
+        db = SessionLocal()
+        try:
+            # FOR UPDATE: вступления по ссылке и start_game ждут конца загрузки,
+            # поэтому выборка уже вступивших ниже точна
+            game = db.execute(
+                select(Game.is_started).where(Game.id == game_id).with_for_update()
             ).first()
+            if game is None:
+                return JoinOutcome.NOT_FOUND
+            if game.is_started:
+                return JoinOutcome.STARTED
+
+            dialect_name = db.get_bind().dialect.name
+            if dialect_name == "postgresql":
+                insert = pg_insert
+            else:
+                insert = sqlite_insert
+                # не больше 999 параметров в запросе у старых SQLite
+                batch = min(batch, 900)
+
+            table = Participant.__table__
+            stmt = insert(table).on_conflict_do_nothing(index_elements=["game_id", "user_id"])
+
+            for start in range(0, len(report.rows), batch):
+                rows = report.rows[start:start + batch]
+                existing = set(db.execute(
+                    select(table.c.user_id).where(
+                        table.c.game_id == game_id,
+                        table.c.user_id.in_([row["user_id"] for row in rows])
+                    )
+                ).scalars())
+
+                for user_id in existing:
+                    report.duplicate(report.line_of[user_id], user_id, "already in game")
+                rows = [{"game_id": game_id, **row} for row in rows if row["user_id"] not in existing]
+                if not rows:
+                    continue
 
-            if exists:
-                return False, "🎅 Вы уже участвуете в этой игре"
+                db.execute(stmt, rows)
+                new_players = db.execute(
+                    new_players_statement(dialect_name, [row["user_id"] for row in rows])
+                ).rowcount
+                for counter in increment_statements({"total_players": new_players}):
+                    db.execute(counter)
+                report.inserted += len(rows)
 
-            participant = Participant(
-                game_id=game_id,
-                user_id=user_id,
-                username=tg_username,
-                full_name=full_name
-            )
-            db.add(participant)
             db.commit()
+            if report.inserted:
+                game_info_cache.invalidate(game_id)
+            logger.info(
+                "bulk_join: game=%s inserted=%s duplicates=%s invalid=%s",
+                game_id, report.inserted, len(report.duplicates), len(report.invalid)
+            )
+            return JoinOutcome.JOINED
 
-            logger.info("player_joined: game=%s user=%s", game_id, user_id)
-            return True, "🎉 Вы присоединились к праздничной игре!"
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
 
+    @staticmethod
+    def join_game(game_id: str, user_id: int, tg_username: str | None, full_name: str):
+        """Присоединяет пользователя к игре."""
+        try:
+            outcome = GameManager.join(game_id, user_id, tg_username, full_name)
         except Exception as e:
-            db.rollback()
             logger.exception("Error join_game: %s", e)
             return False, "❌ Ошибка при присоединении"
-        finally:
-            db.close()
+        return outcome == JoinOutcome.JOINED, JOIN_MESSAGES[outcome]
 
     @staticmethod
     def start_game(game_id: str, creator_id: int):
         """Запускает жеребьёвку и сохраняет назначения в БД."""
         db = SessionLocal()
         try:
-            game = db.query(Game).filter(Game.id == game_id).first()
+            # FOR UPDATE: вступающие в игру (join) ждут, пока жеребьёвка не закончится
+            game = db.query(Game).filter(Game.id == game_id).with_for_update().first()
             if not game:
                 return False, "❌ Игра не найдена"
 
@@ -117,57 +420,35 @@ class GameManager:
             if game.is_started:
                 return False, "⏳ Игра уже началась"
 
-            participants = db.query(Participant).filter(
+            # Один запрос за участниками; жеребьёвка считается в памяти
+            participants = db.query(
+                Participant.id,
+                Participant.user_id,
+                Participant.username,
+                Participant.full_name
+            ).filter(
                 Participant.game_id == game_id
             ).all()
 
             if len(participants) < 2:
                 return False, "🎁 Нужно минимум 2 участника"
 
-            # Собираем список user_id и перемешиваем
-            user_ids = [p.user_id for p in participants]
-            random.shuffle(user_ids)
-
-            # Назначаем круговую жеребьёвку: giver -> next user
-            assignments = []
-            for i, giver_id in enumerate(user_ids):
-                receiver_id = user_ids[(i + 1) % len(user_ids)]
-                giver_rec = db.query(Participant).filter(
-                    Participant.game_id == game_id,
-                    Participant.user_id == giver_id
-                ).first()
-
-                if not giver_rec:
-                    logger.warning("start_game: participant not found giver=%s game=%s", giver_id, game_id)
-                    continue
-
-                # Присваиваем target_id
-                giver_rec.target_id = receiver_id
-
-                # Попробуем заполнить дополнительные поля, если они есть в модели
-                receiver_part = db.query(Participant).filter(
-                    Participant.game_id == game_id,
-                    Participant.user_id == receiver_id
-                ).first()
-                if receiver_part:
-                    if hasattr(giver_rec, "target_username"):
-                        try:
-                            giver_rec.target_username = receiver_part.username
-                        except Exception:
-                            pass
-                    if hasattr(giver_rec, "target_full_name"):
-                        try:
-                            giver_rec.target_full_name = receiver_part.full_name
-                        except Exception:
-                            pass
-
-                assignments.append((giver_id, receiver_id))
-
-            # Помечаем игру как начатую
+            exclusions, avoid = load_draw_constraints(db, game)
+            try:
+                mappings, assignments = draw_mappings(participants, exclusions, avoid)
+            except DrawInfeasible as e:
+                logger.warning("draw_infeasible: game=%s %s", game_id, e)
+                return False, "🚫 С такими исключениями жеребьёвка невозможна. Уберите часть исключений."
+
+            # Назначения и флаг старта пишутся одной транзакцией
+            db.bulk_update_mappings(Participant, mappings)
+            for stmt in increment_statements(game_transition((game.is_active, game.is_started), (game.is_active, True))):
+                db.execute(stmt)
             game.is_started = True
             game.started_at = datetime.utcnow()
 
             db.commit()
+            game_info_cache.invalidate(game_id)
 
             # Логируем все пары для отладки и мониторинга
             for giver_id, receiver_id in assignments:
@@ -198,10 +479,13 @@ class GameManager:
             if not game.is_started:
                 return False, "⏳ Игра ещё не началась"
 
+            for stmt in increment_statements(game_transition((game.is_active, game.is_started), (False, False))):
+                db.execute(stmt)
             game.is_active = False
             game.is_started = False
 
             db.commit()
+            game_info_cache.invalidate(game_id)
             logger.info("game_finished: %s", game_id)
             return True, "✅ Игра завершена! Спасибо за участие 🎁"
 
@@ -231,6 +515,7 @@ class GameManager:
 
             p.wishlist = wishlist_text
             db.commit()
+            game_info_cache.invalidate(p.game_id)
 
             logger.info("wishlist_saved: user=%s game=%s", user_id, p.game_id)
             return True, "📝 Пожелания сохранены!"
@@ -247,48 +532,7 @@ class GameManager:
         """Возвращает список целей пользователя во всех играх."""
         db = SessionLocal()
         try:
-            rows = db.query(Participant).filter(
-                Participant.user_id == user_id
-            ).all()
-
-            results = []
-
-            for p in rows:
-                game = db.query(Game).filter(Game.id == p.game_id).first()
-                if not game or not game.is_started:
-                    continue
-
-                if not p.target_id:
-                    results.append({
-                        "game_id": p.game_id,
-                        "game_name": game.name,
-                        "target_id": None
-                    })
-                    continue
-
-                target = db.query(Participant).filter(
-                    Participant.game_id == p.game_id,
-                    Participant.user_id == p.target_id
-                ).first()
-
-                if not target:
-                    results.append({
-                        "game_id": p.game_id,
-                        "game_name": game.name,
-                        "target_id": None
-                    })
-                    continue
-
-                results.append({
-                    "game_id": p.game_id,
-                    "game_name": game.name,
-                    "target_id": target.user_id,
-                    "target_username": target.username,
-                    "target_full_name": target.full_name,
-                    "target_wishlist": target.wishlist or "Пожелания не указаны"
-                })
-
-            return results
+            return my_targets_rows(db.execute(my_targets_query(user_id)).all())
 
         except Exception as e:
             logger.exception("Error get_my_targets: %s", e)
@@ -298,7 +542,19 @@ class GameManager:
 
     @staticmethod
     def get_game_info(game_id: str):
-        """Возвращает полную информацию об игре."""
+        """Возвращает полную информацию об игре (через кэш game_info_cache).
+
+        Результат общий для всех вызывающих — только для чтения.
+        """
+        try:
+            return game_info_cache.get_or_load(game_id, lambda: GameManager.load_game_info(game_id))
+        except Exception as e:
+            logger.exception("Error get_game_info: %s", e)
+            return None
+
+    @staticmethod
+    def load_game_info(game_id: str):
+        """Информация об игре и участниках из БД, без кэша."""
         db = SessionLocal()
         try:
             game = db.query(Game).filter(Game.id == game_id).first()
@@ -331,9 +587,261 @@ class GameManager:
                 "created_at": game.created_at.isoformat() if game.created_at else None,
                 "participants": participants_info
             }
+        finally:
+            db.close()
+
+    @staticmethod
+    def add_exclusion(admin_id: int, first: str, second: str):
+        """Запрещает двум участникам последней незапущенной игры дарить друг другу.
+
+        Участники указываются по @username или user_id.
+        """
+        db = SessionLocal()
+        try:
+            game = db.query(Game).filter(
+                Game.admin_id == admin_id,
+                Game.is_started == False,
+                Game.is_active == True
+            ).order_by(Game.created_at.desc()).first()
+
+            if not game:
+                return False, "❌ У вас нет игр, которые можно запустить."
+
+            participants = db.query(Participant.user_id, Participant.username).filter(
+                Participant.game_id == game.id
+            ).all()
+
+            def resolve(ref: str):
+                ref = ref.strip().lstrip("@")
+                for user_id, username in participants:
+                    if str(user_id) == ref or (username and username.lower() == ref.lower()):
+                        return user_id
+                return None
+
+            user_a, user_b = resolve(first), resolve(second)
+            if user_a is None or user_b is None:
+                return False, "❌ Оба участника должны быть в игре"
+
+            if user_a == user_b:
+                return False, "❌ Укажите двух разных участников"
+
+            db.add(Exclusion(game_id=game.id, user_a=user_a, user_b=user_b))
+            db.commit()
+
+            logger.info("exclusion_added: game=%s %s<->%s", game.id, user_a, user_b)
+            return True, f"🚫 Исключение добавлено в игру «{game.name}»"
 
         except Exception as e:
-            logger.exception("Error get_game_info: %s", e)
-            return None
+            db.rollback()
+            logger.exception("Error add_exclusion: %s", e)
+            return False, "❌ Ошибка при добавлении исключения"
         finally:
             db.close()
+
+    @staticmethod
+    def has_active_games(admin_id: int) -> bool:
+        """Есть ли у пользователя активные игры, где он создатель."""
+        db = SessionLocal()
+        try:
+            return db.query(Game.id).filter(
+                Game.admin_id == admin_id,
+                Game.is_active == True
+            ).first() is not None
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_startable_game(admin_id: int):
+        """Последняя игра создателя, которую ещё можно запустить."""
+        db = SessionLocal()
+        try:
+            game = db.query(Game).filter(
+                Game.admin_id == admin_id,
+                Game.is_started == False,
+                Game.is_active == True
+            ).order_by(Game.created_at.desc()).first()
+            if not game:
+                return None
+            return {"id": game.id, "name": game.name}
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_latest_active_game(admin_id: int):
+        """Последняя активная игра создателя."""
+        db = SessionLocal()
+        try:
+            game = db.query(Game).filter(
+                Game.admin_id == admin_id,
+                Game.is_active == True
+            ).order_by(Game.created_at.desc()).first()
+            if not game:
+                return None
+            return {"id": game.id, "name": game.name}
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_participant_ids(game_id: str) -> list[int]:
+        """user_id всех участников игры."""
+        db = SessionLocal()
+        try:
+            return [
+                user_id for (user_id,) in db.query(Participant.user_id).filter(
+                    Participant.game_id == game_id
+                )
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def participant_exists(game_id: str, user_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            return db.query(Participant.id).filter(
+                Participant.game_id == game_id,
+                Participant.user_id == user_id
+            ).first() is not None
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_assignments(game_id: str):
+        """Пары Санта -> получатель игры с данными получателя для рассылки."""
+        db = SessionLocal()
+        try:
+            target = aliased(Participant)
+            rows = db.query(
+                Participant.user_id,
+                Participant.target_id,
+                target.user_id,
+                target.username,
+                target.full_name,
+                target.wishlist
+            ).outerjoin(
+                target,
+                (target.game_id == Participant.game_id) & (target.user_id == Participant.target_id)
+            ).filter(
+                Participant.game_id == game_id
+            ).all()
+
+            return [
+                {
+                    "user_id": user_id,
+                    "target_id": target_id,
+                    "target_found": target_user_id is not None,
+                    "target_username": t_username,
+                    "target_full_name": t_full_name,
+                    "target_wishlist": t_wishlist
+                }
+                for user_id, target_id, target_user_id, t_username, t_full_name, t_wishlist in rows
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_user_games(user_id: int, page: int = 0, page_size: int = MYGAMES_PAGE_SIZE):
+        """Игры пользователя со статусом и количеством участников, новые сверху.
+
+        Одна страница — один сгруппированный запрос.
+        Возвращает {"games": [...], "page": page, "has_next": bool}.
+        """
+        db = SessionLocal()
+        try:
+            rows = db.execute(user_games_query(user_id, page, page_size)).all()
+
+            return {
+                "games": [
+                    {
+                        "id": game_id,
+                        "name": name,
+                        "status": (
+                            "active" if is_started else
+                            ("waiting" if is_active else "finished")
+                        ),
+                        "count": count
+                    }
+                    for game_id, name, is_active, is_started, count in rows[:page_size]
+                ],
+                "page": page,
+                "has_next": len(rows) > page_size
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_last_game_id(user_id: int):
+        """Код последней игры, в которую вступил пользователь."""
+        db = SessionLocal()
+        try:
+            row = db.query(Participant.game_id).filter(
+                Participant.user_id == user_id
+            ).order_by(Participant.id.desc()).first()
+            return row[0] if row else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_stats(with_staleness: bool = False):
+        """Общая статистика по играм и участникам (из счётчиков bot_counters).
+
+        with_staleness — добавить "stats_staleness": когда счётчики последний раз
+        сверялись с точными COUNT и насколько тогда разошлись.
+        """
+        with engine.connect() as conn:
+            stats = read_stats(conn)
+            if with_staleness:
+                stats["stats_staleness"] = staleness(conn)
+            return stats
+
+    @staticmethod
+    def reconcile_stats() -> dict:
+        """Сверяет счётчики с точными COUNT, возвращает расхождение."""
+        with engine.begin() as conn:
+            return reconcile(conn)
+
+
+def _offloaded(method):
+    """Асинхронная обёртка: метод GameManager выполняется в пуле потоков БД."""
+    async def wrapper(*args, **kwargs):
+        return await run_db(method, *args, **kwargs)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__qualname__ = f"AsyncGameManager.{method.__name__}"
+    wrapper.__doc__ = method.__doc__
+    return staticmethod(wrapper)
+
+
+class AsyncGameManager:
+    """То же, что GameManager, но для вызова из event loop'а aiogram."""
+
+    @staticmethod
+    async def get_game_info(game_id: str):
+        """Возвращает полную информацию об игре; попадание в кэш — без пула потоков."""
+        try:
+            return await game_info_cache.get_or_load_async(
+                game_id, lambda: AsyncGameManager.load_game_info(game_id)
+            )
+        except Exception as e:
+            logger.exception("Error get_game_info: %s", e)
+            return None
+
+    create_game = _offloaded(GameManager.create_game)
+    join = _offloaded(GameManager.join)
+    join_game = _offloaded(GameManager.join_game)
+    start_game = _offloaded(GameManager.start_game)
+    finish_game = _offloaded(GameManager.finish_game)
+    set_wishlist = _offloaded(GameManager.set_wishlist)
+    get_my_targets = _offloaded(GameManager.get_my_targets)
+    load_game_info = _offloaded(GameManager.load_game_info)
+    add_exclusion = _offloaded(GameManager.add_exclusion)
+    has_active_games = _offloaded(GameManager.has_active_games)
+    get_startable_game = _offloaded(GameManager.get_startable_game)
+    get_latest_active_game = _offloaded(GameManager.get_latest_active_game)
+    get_participant_ids = _offloaded(GameManager.get_participant_ids)
+    participant_exists = _offloaded(GameManager.participant_exists)
+    get_assignments = _offloaded(GameManager.get_assignments)
+    get_user_games = _offloaded(GameManager.get_user_games)
+    get_last_game_id = _offloaded(GameManager.get_last_game_id)
+    get_stats = _offloaded(GameManager.get_stats)
+    reconcile_stats = _offloaded(GameManager.reconcile_stats)
@@ -25,6 +25,7 @@ HELP_TEXT = """
 <b>/players</b> — участники последней активной игры  
 <b>/gameinfo КОД</b> — подробная информация об игре  
 
+<b>/exclude @a @b</b> — запретить паре дарить друг другу (для создателя игры)  
 <b>/startgame</b> — запустить жеребьёвку (для создателя игры)  
 <b>/finishgame</b> — завершить игру (для создателя игры)  
 
@@ -146,7 +147,14 @@ STATUS = """
 Завершено: <b>{finished}</b>  
 
 Уникальных участников: <b>{players}</b>  
-Очередь обновлений: <b>{queue}</b>
+Очередь обновлений: <b>{queue}</b>  
+В обработке: <b>{in_flight}</b>
+"""
+
+DELIVERY_REPORT = """
+<b>📬 Рассылка завершена</b>
+
+Доставлено: <b>{sent}</b> из <b>{total}</b> за {seconds} с
 """
 
 UNKNOWN_COMMAND = """
@@ -179,6 +187,7 @@ MESSAGES = {
     "finishgame": FINISHGAME,
     "gameinfo": GAMEINFO,
     "status": STATUS,
+    "delivery_report": DELIVERY_REPORT,
     "unknown_command": UNKNOWN_COMMAND,
     "error": ERROR_MESSAGE,
 }
@@ -0,0 +1,397 @@
+# app/metrics.py
+# Метрики в текстовом формате Prometheus (/metrics).
+#
+# Запись должна быть дешёвой, чтобы метрики были включены всегда: у каждого
+# потока свой заранее выделенный массив значений (счётчики, корзины гистограмм),
+# поток пишет только в него — без блокировок и без потерь при одновременной
+# записи из loop'а aiogram, пула потоков БД и потоков Flask. Блокировка нужна
+# только при первой записи из нового потока и при сборе (/metrics).
+#
+# Значения живут в процессе: при WORKER_ROLE=web обработчики апдейтов работают
+# в процессах app.consumer, которые отдают свои метрики на METRICS_PORT.
+
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Порт отдельного HTTP-сервера метрик (для процессов без Flask, см. app/consumer.py)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUEUE_WAIT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Регистрация новых потоков и сбор значений
+_lock = threading.Lock()
+
+
+class _Sharded:
+    """Массив значений метрики, разбитый по потокам; поток пишет только в свой."""
+
+    __slots__ = ("width", "_local", "_shards", "_retired")
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._shards = {}            # поток -> его массив
+        self._retired = [0] * width  # сумма массивов завершившихся потоков
+
+    def shard(self) -> list:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0] * self.width
+            with _lock:
+                self._shards[threading.current_thread()] = values
+            return values
+
+    def totals(self) -> list:
+        with _lock:
+            total = list(self._retired)
+            for thread, values in list(self._shards.items()):
+                if not thread.is_alive():
+                    # поток больше не пишет — переносим его значения в общий итог
+                    del self._shards[thread]
+                    for i, v in enumerate(values):
+                        self._retired[i] += v
+                for i, v in enumerate(values):
+                    total[i] += v
+        return total
+
+
+class CounterChild:
+    __slots__ = ("_values",)
+
+    def __init__(self):
+        self._values = _Sharded(1)
+
+    def inc(self, amount=1):
+        self._values.shard()[0] += amount
+
+    def value(self):
+        return self._values.totals()[0]
+
+
+class HistogramChild:
+    """Корзины (не накопительные, последняя — +Inf) и сумма в одном массиве потока."""
+
+    __slots__ = ("bounds", "_values")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self._values = _Sharded(len(bounds) + 2)
+
+    def observe(self, value: float):
+        values = self._values.shard()
+        values[bisect.bisect_left(self.bounds, value)] += 1
+        values[-1] += value
+
+    def snapshot(self):
+        """(накопительные счётчики по корзинам, count, sum)."""
+        values = self._values.totals()
+        cumulative, running = [], 0
+        for count in values[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, values[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), child_factory=None):
+        # child_factory() создаёт дочернюю метрику для labels(); None — у метрики
+        # дочерних нет (Gauge отдаёт значения через func)
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.child_factory = child_factory
+        self._children = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Дочерняя метрика для значений меток; создаётся один раз, дальше — поиск в словаре.
+
+        На горячих путях дочерние метрики стоит получать заранее.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with _lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self.child_factory()
+        return child
+
+    def _label_str(self, values, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._child_lines(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames, CounterChild)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _child_lines(self, values, child):
+        return [f"{self.name}{self._label_str(values)} {_number(child.value())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, lambda: HistogramChild(self.buckets))
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _child_lines(self, values, child):
+        cumulative, count, total = child.snapshot()
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        lines = []
+        for bound, count_le in zip(bounds, cumulative):
+            le = 'le="' + bound + '"'
+            lines.append(f"{self.name}_bucket{self._label_str(values, le)} {count_le}")
+        lines.append(f"{self.name}_count{self._label_str(values)} {count}")
+        lines.append(f"{self.name}_sum{self._label_str(values)} {_number(total)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Текущее значение: set() из одного места или функция, вызываемая при сборе."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), func=None, kind: str = "gauge"):
+        # func() -> число или {значения меток (tuple): число}
+        self.func = func
+        self.kind = kind
+        self.value = 0.0
+        super().__init__(name, documentation, labelnames)
+
+    def set(self, value: float):
+        self.value = value
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.func is None:
+            lines.append(f"{self.name} {_number(self.value)}")
+            return lines
+        try:
+            result = self.func()
+        except Exception as e:
+            logger.warning("metric %s failed: %s", self.name, e)
+            return []
+        if not isinstance(result, dict):
+            result = {(): result}
+        for values, value in result.items():
+            if value is not None:
+                lines.append(f"{self.name}{self._label_str(values)} {_number(value)}")
+        return lines
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) or abs(value) >= 1e15 else str(int(value))
+    return str(value)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY: list = []
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in list(REGISTRY):
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- Метрики бота --------------------
+
+HANDLER_LATENCY = Histogram(
+    "santa_handler_duration_seconds", "Time spent in aiogram handlers", ("handler",)
+)
+UPDATES = Counter(
+    "santa_updates_total", "Updates processed by the worker", ("outcome",)
+)
+QUEUE_WAIT = Histogram(
+    "santa_queue_wait_seconds", "Time from webhook enqueue to dispatch", buckets=QUEUE_WAIT_BUCKETS
+)
+DB_QUERY = Histogram(
+    "santa_db_query_duration_seconds", "SQL statement execution time", ("statement",), buckets=DB_BUCKETS
+)
+DB_ERRORS = Counter(
+    "santa_db_errors_total", "SQL statements that raised", ("statement",)
+)
+BOT_API_LATENCY = Histogram(
+    "santa_bot_api_duration_seconds", "Telegram Bot API request latency", ("method",)
+)
+BOT_API_ERRORS = Counter(
+    "santa_bot_api_errors_total", "Failed Telegram Bot API requests", ("method", "code")
+)
+LOOP_LAG = Histogram(
+    "santa_event_loop_lag_seconds", "Extra delay of a timer on the worker event loop", buckets=LOOP_LAG_BUCKETS
+)
+LOOP_LAG_LAST = Gauge(
+    "santa_event_loop_lag_last_seconds", "Most recent event loop lag measurement"
+)
+
+UPDATE_OK = UPDATES.labels("ok")
+UPDATE_ERROR = UPDATES.labels("error")
+
+_STATEMENTS = ("select", "insert", "update", "delete", "other")
+_DB_QUERY = {kind: DB_QUERY.labels(kind) for kind in _STATEMENTS}
+_DB_ERRORS = {kind: DB_ERRORS.labels(kind) for kind in _STATEMENTS}
+
+
+def _statement_kind(statement: str) -> str:
+    # SQLAlchemy пишет ключевые слова заглавными; WITH ... — запросы с CTE (join на PostgreSQL)
+    if statement.startswith("SELECT"):
+        return "select"
+    if statement.startswith("INSERT") or statement.startswith("WITH"):
+        return "insert"
+    if statement.startswith("UPDATE"):
+        return "update"
+    if statement.startswith("DELETE"):
+        return "delete"
+    return "other"
+
+
+def instrument_engine(engine):
+    """Число и длительность SQL-запросов engine (синхронного; для AsyncEngine — его sync_engine)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            _DB_QUERY[_statement_kind(statement)].observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        statement = exception_context.statement or ""
+        _DB_ERRORS[_statement_kind(statement)].inc()
+
+
+def bot_error_code(exc: BaseException) -> str:
+    """Код ошибки Bot API по исключению aiogram (HTTP-статус ответа, если он известен)."""
+    from aiogram.utils import exceptions
+
+    if isinstance(exc, exceptions.RetryAfter):
+        return "429"
+    if isinstance(exc, (exceptions.BadRequest, exceptions.MigrateToChat)):
+        return "400"
+    if isinstance(exc, exceptions.Unauthorized):
+        return "403"
+    if isinstance(exc, exceptions.NotFound):
+        return "404"
+    if isinstance(exc, exceptions.ConflictError):
+        return "409"
+    if isinstance(exc, exceptions.NetworkError):
+        return "network"
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(exc, exceptions.TelegramAPIError):
+        return "api"
+    return "other"
+
+
+_BOT_API_LATENCY = {}
+
+
+def observe_bot_request(method: str, seconds: float, error: BaseException | None = None):
+    """Запрос к Bot API: длительность и, при ошибке, её код."""
+    child = _BOT_API_LATENCY.get(method)
+    if child is None:
+        child = _BOT_API_LATENCY[method] = BOT_API_LATENCY.labels(method)
+    child.observe(seconds)
+    if error is not None:
+        BOT_API_ERRORS.labels(method, bot_error_code(error)).inc()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Middleware aiogram: длительность каждого обработчика (по имени функции).
+
+    Подключается через dp.middleware.setup(); aiogram вызывает post_process
+    и при исключении в обработчике.
+    """
+
+    _KEY = "_metrics_handler"
+
+    def __init__(self):
+        super().__init__()
+        # функция-обработчик -> дочерняя гистограмма
+        self._children = {}
+
+    async def trigger(self, action, args):
+        # process_update охватывает весь апдейт, обработчики меряются отдельно
+        if action == "process_update" or action == "post_process_update":
+            return None
+        if action.startswith("process_"):
+            handler = current_handler.get()
+            child = self._children.get(handler)
+            if child is None:
+                child = self._children[handler] = HANDLER_LATENCY.labels(getattr(handler, "__name__", "unknown"))
+            args[-1][self._KEY] = (child, time.perf_counter())
+        elif action.startswith("post_process_"):
+            started = args[-1].pop(self._KEY, None)
+            if started is not None:
+                child, at = started
+                child.observe(time.perf_counter() - at)
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int = METRICS_PORT):
+    """HTTP-сервер /metrics в фоновом потоке (для процессов без Flask)."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Metrics served on port %s", port)
+    return server
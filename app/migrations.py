@@ -0,0 +1,161 @@
+# app/migrations.py
+# Миграции схемы БД вместо голого Base.metadata.create_all.
+#
+# Применённые версии хранятся в таблице schema_migrations. Миграция 1 — базовая
+# схема (create_all: на новой БД сразу создаёт таблицы со всеми индексами),
+# следующие доводят существующие БД до текущих моделей. Каждая миграция
+# выполняется в своей транзакции; на PostgreSQL процессы, стартующие одновременно
+# (web и consumer), ждут друг друга на advisory lock.
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from app.database import Base, engine
+from app.models import BotCounter, Game, Participant, Player, QueuedUpdate
+
+logger = logging.getLogger(__name__)
+
+# Произвольный ключ pg_advisory_xact_lock для миграций этого бота
+MIGRATION_LOCK_ID = 74201
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+def _index(model, name: str):
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+
+def _create_index(conn, model, name: str):
+    if name not in {ix["name"] for ix in inspect(conn).get_indexes(model.__tablename__)}:
+        _index(model, name).create(conn)
+
+
+def _drop_index(conn, table: str, name: str):
+    if name in {ix["name"] for ix in inspect(conn).get_indexes(table)}:
+        conn.execute(text(f"DROP INDEX {name}"))
+
+
+def baseline(conn):
+    """Таблицы по текущим моделям (только отсутствующие)."""
+    Base.metadata.create_all(bind=conn)
+
+
+def participants_unique(conn):
+    """Убирает повторные записи участника в игре и запрещает их уникальным индексом."""
+    removed = conn.execute(text(
+        "DELETE FROM participants WHERE id NOT IN ("
+        " SELECT min(id) FROM participants GROUP BY game_id, user_id)"
+    )).rowcount
+    if removed:
+        logger.warning("migration: removed %s duplicate participants", removed)
+
+    _create_index(conn, Participant, "uq_participants_game_user")
+    _create_index(conn, Participant, "ix_participants_user_id_id")
+    # одиночные индексы перекрыты составными
+    _drop_index(conn, "participants", "ix_participants_game_id")
+    _drop_index(conn, "participants", "ix_participants_user_id")
+
+
+def games_admin_indexes(conn):
+    """Индексы под выборки игр создателя."""
+    _create_index(conn, Game, "ix_games_admin_state")
+    _create_index(conn, Game, "ix_games_admin_started")
+
+
+def update_queue_shard_key(conn):
+    """Колонка shard_key в очереди апдейтов, созданной до разделения по воркерам."""
+    columns = {c["name"] for c in inspect(conn).get_columns(QueuedUpdate.__tablename__)}
+    if "shard_key" not in columns:
+        conn.execute(text("ALTER TABLE update_queue ADD COLUMN shard_key BIGINT NOT NULL DEFAULT 0"))
+
+
+def participants_target_names(conn):
+    """Имя получателя на строке дарящего (заполняется при жеребьёвке)."""
+    columns = {c["name"] for c in inspect(conn).get_columns(Participant.__tablename__)}
+    if "target_username" not in columns:
+        conn.execute(text("ALTER TABLE participants ADD COLUMN target_username VARCHAR(100)"))
+    if "target_full_name" not in columns:
+        conn.execute(text("ALTER TABLE participants ADD COLUMN target_full_name VARCHAR(200)"))
+
+
+def bot_counters(conn):
+    """Таблица счётчиков для /status и их начальные значения."""
+    from app.stats import reconcile
+
+    BotCounter.__table__.create(conn, checkfirst=True)
+    reconcile(conn)
+
+
+def players(conn):
+    """Таблица players для атомарного счёта новых игроков (total_players)."""
+    Player.__table__.create(conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT INTO players (user_id)"
+        " SELECT DISTINCT user_id FROM participants"
+        " WHERE user_id NOT IN (SELECT user_id FROM players)"
+    ))
+
+
+# (версия, функция) — только добавлять в конец, не менять применённые
+MIGRATIONS = [
+    (1, baseline),
+    (2, participants_unique),
+    (3, games_admin_indexes),
+    (4, update_queue_shard_key),
+    (5, participants_target_names),
+    (6, bot_counters),
+    (7, players),
+]
+
+
+def _lock(conn):
+    """Ждёт другие процессы, применяющие миграции (до конца транзакции conn)."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+
+def migrate(bind=engine) -> list[int]:
+    """Применяет недостающие миграции, возвращает их версии."""
+    with bind.begin() as conn:
+        # под блокировкой: иначе два процесса оба не найдут таблицу и второй упадёт на CREATE
+        _lock(conn)
+        schema_migrations.create(conn, checkfirst=True)
+    applied = []
+
+    for version, migration in MIGRATIONS:
+        with bind.begin() as conn:
+            _lock(conn)
+
+            done = conn.execute(
+                select(schema_migrations.c.version).where(schema_migrations.c.version == version)
+            ).first()
+            if done:
+                continue
+
+            migration(conn)
+            conn.execute(schema_migrations.insert(), {
+                "version": version,
+                "name": migration.__name__,
+                "applied_at": datetime.utcnow(),
+            })
+            applied.append(version)
+            logger.info("migration applied: %s %s", version, migration.__name__)
+
+    return applied
+
+
+def current_version(bind=engine) -> int:
+    with bind.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return 0
+        return conn.execute(
+            select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())
+        ).scalar() or 0
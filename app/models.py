@@ -1,8 +1,11 @@
 # app/models.py
 # SQLAlchemy модели: Game и Participant
+#
+# Индексы подобраны под горячие запросы app/manager.py; на существующей БД
+# их создают миграции из app/migrations.py.
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+    Column, Integer, BigInteger, Float, String, Boolean, DateTime, Text, ForeignKey, Index, text
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -37,14 +40,25 @@ class Game(Base):
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # has_active_games / get_startable_game / get_latest_active_game
+        Index("ix_games_admin_state", "admin_id", "is_active", "is_started", "created_at"),
+        # прошлая запущенная игра создателя (load_draw_constraints)
+        Index(
+            "ix_games_admin_started", "admin_id", "started_at",
+            postgresql_where=text("started_at IS NOT NULL"),
+            sqlite_where=text("started_at IS NOT NULL")
+        ),
+    )
+
 
 class Participant(Base):
     __tablename__ = "participants"
 
     id = Column(Integer, primary_key=True)
 
-    game_id = Column(String(50), ForeignKey("games.id"), nullable=False, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    game_id = Column(String(50), ForeignKey("games.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)
 
     username = Column(String(100), nullable=True)
     full_name = Column(String(200), nullable=True)
@@ -54,5 +68,80 @@ class Participant(Base):
     # кому этот участник дарит
     target_id = Column(Integer, nullable=True, index=True)
 
+    # имя получателя на момент жеребьёвки (чтобы /mytargets не искал его отдельно)
+    target_username = Column(String(100), nullable=True)
+    target_full_name = Column(String(200), nullable=True)
+
     # связь с игрой
     game = relationship("Game", back_populates="participants")
+
+    __table_args__ = (
+        # один пользователь — одна запись в игре; заодно индекс для поиска по game_id
+        Index("uq_participants_game_user", "game_id", "user_id", unique=True),
+        # последняя игра пользователя: WHERE user_id = ? ORDER BY id DESC
+        Index("ix_participants_user_id_id", "user_id", "id"),
+    )
+
+
+class Exclusion(Base):
+    """Пара участников, которые не должны дарить друг другу (пары, одна команда)."""
+    __tablename__ = "exclusions"
+
+    id = Column(Integer, primary_key=True)
+
+    game_id = Column(String(50), ForeignKey("games.id"), nullable=False, index=True)
+    user_a = Column(Integer, nullable=False)
+    user_b = Column(Integer, nullable=False)
+
+
+class QueuedUpdate(Base):
+    """Апдейт Telegram в очереди (UPDATE_QUEUE_BACKEND=postgres)."""
+    __tablename__ = "update_queue"
+
+    id = Column(BigInteger, primary_key=True)
+
+    payload = Column(Text, nullable=False)
+    enqueued_at = Column(Float, nullable=False)
+
+    # from_user.id / chat.id апдейта: по нему апдейты делятся между воркерами
+    shard_key = Column(BigInteger, nullable=False, default=0)
+
+    # до этого момента апдейт арендован воркером
+    locked_until = Column(Float, nullable=True)
+
+
+class PendingPrompt(Base):
+    """Пользователь, от которого бот ждёт название новой игры (SHARED_STATE=db)."""
+    __tablename__ = "pending_prompts"
+
+    user_id = Column(BigInteger, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SeenUpdate(Base):
+    """update_id, уже принятый webhook'ом (UPDATE_DEDUP_BACKEND=db)."""
+    __tablename__ = "seen_updates"
+
+    update_id = Column(BigInteger, primary_key=True)
+
+    # time.time() первого получения; по нему удаляются старые записи
+    seen_at = Column(Float, nullable=False, index=True)
+
+
+class Player(Base):
+    """Пользователь, хотя бы раз вступивший в игру. Счётчик total_players растёт
+    на число вставленных сюда строк (app/stats.py)."""
+    __tablename__ = "players"
+
+    user_id = Column(BigInteger, primary_key=True)
+
+
+class BotCounter(Base):
+    """Счётчик для /status (app/stats.py). Значение счётчика — сумма по шардам:
+    параллельные транзакции обновляют разные строки и не ждут друг друга."""
+    __tablename__ = "bot_counters"
+
+    name = Column(String(50), primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,196 @@
+# app/profiler.py
+# Профилирование работающего процесса без передеплоя (эндпоинты /profile).
+#
+# CPU: поток запроса раз в interval снимает стеки всех потоков процесса
+# (sys._current_frames) в течение seconds и возвращает их в свёрнутом виде
+# (collapsed stacks: "поток;внешний кадр;...;внутренний кадр число") — формат
+# flamegraph.pl и speedscope. Корень стека — имя потока с цифрами, заменёнными
+# на N: поток воркера — aiogram-worker, потоки gunicorn — ThreadPoolExecutor-N_N,
+# пул БД — db_N. Профиль настенный (wall clock): поток, ждущий сокета или
+# блокировки, тоже попадает в выборку, поэтому потоки, стоящие в известных
+# ожиданиях (IDLE_FRAMES), по умолчанию пропускаются.
+#
+# Память: tracemalloc запускается по запросу; снимок сравнивается с базовым
+# (снятым при запуске) и с предыдущим — видно, где растёт память между
+# запросами. Пока tracemalloc включён, выделения памяти заметно дороже.
+
+import collections
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+# Предел длительности CPU-профиля (сек); должен быть меньше таймаута gunicorn
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+# Период снятия стеков по умолчанию (сек)
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+# Глубина стека, запоминаемая tracemalloc для каждого выделения
+PROFILE_TRACE_FRAMES = int(os.environ.get("PROFILE_TRACE_FRAMES", "10"))
+
+# Самые внутренние кадры (файл, функция) потока, который просто ждёт
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),  # concurrent.futures: поток пула без задачи
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+}
+
+
+class ProfileBusy(RuntimeError):
+    """Профиль уже снимается другим запросом."""
+
+
+_cpu_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_memory = {}
+
+_PATH_PREFIXES = sorted(
+    {p for p in (sysconfig.get_paths()["purelib"], sysconfig.get_paths()["stdlib"], os.getcwd()) if p},
+    key=len,
+    reverse=True,
+)
+
+
+def _short_path(path: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if path.startswith(prefix):
+            return path[len(prefix):].lstrip(os.sep)
+    return path
+
+
+def _thread_group(name: str) -> str:
+    return re.sub(r"\d+", "N", name).replace(";", ":")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+# -------------------- CPU --------------------
+
+def sample_stacks(seconds: float, interval: float = PROFILE_INTERVAL, threads=(), include_idle: bool = False):
+    """Снимает стеки потоков в течение seconds; (Counter свёрнутых стеков, число проходов).
+
+    threads — префиксы имён потоков (пусто — все); поток, вызвавший функцию, не профилируется.
+    """
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfileBusy("profile already running")
+    try:
+        me = threading.get_ident()
+        prefixes = tuple(threads)
+        labels = {}  # code -> "функция (файл:строка)"
+        counts = collections.Counter()
+        rounds = 0
+        deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "unknown")
+                if ident == me or (prefixes and not name.startswith(prefixes)):
+                    continue
+                if not include_idle and _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = (
+                            f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+                        ).replace(";", ":")
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(_thread_group(name))
+                counts[";".join(reversed(stack))] += 1
+            rounds += 1
+            time.sleep(interval)
+        return counts, rounds
+    finally:
+        _cpu_lock.release()
+
+
+def collapsed(counts: collections.Counter) -> str:
+    """Свёрнутые стеки по строке на стек, самые частые сверху."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+# -------------------- Память --------------------
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _traced() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {"traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1)}
+
+
+def memory_start(frames: int = PROFILE_TRACE_FRAMES) -> dict:
+    """Включает tracemalloc и запоминает базовый снимок."""
+    with _memory_lock:
+        if "baseline" in _memory:
+            return {"tracing": True, "started_at": _memory["started_at"], **_traced()}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _memory["baseline"] = _memory["previous"] = _take_snapshot()
+        _memory["started_at"] = time.time()
+        return {
+            "tracing": True,
+            "started_at": _memory["started_at"],
+            "frames": tracemalloc.get_traceback_limit(),
+            **_traced(),
+        }
+
+
+def _diff(snapshot, base, key_type: str, limit: int) -> list:
+    out = []
+    for stat in snapshot.compare_to(base, key_type)[:limit]:
+        frames = [f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback]
+        out.append({
+            "where": frames if key_type == "traceback" else frames[0],
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        })
+    return out
+
+
+def memory_snapshot(limit: int = 25, group_by: str = "lineno") -> dict:
+    """Рост памяти по месту выделения: с момента memory_start() и с прошлого снимка.
+
+    group_by: lineno, filename или traceback (стек выделения, внешний кадр первым).
+    """
+    with _memory_lock:
+        if "baseline" not in _memory:
+            raise RuntimeError("tracemalloc is not running, start it first")
+        snapshot = _take_snapshot()
+        previous, _memory["previous"] = _memory["previous"], snapshot
+        return {
+            "tracing": True,
+            "started_at": _memory["started_at"],
+            **_traced(),
+            "since_start": _diff(snapshot, _memory["baseline"], group_by, limit),
+            "since_previous": _diff(snapshot, previous, group_by, limit),
+        }
+
+
+def memory_stop() -> dict:
+    with _memory_lock:
+        _memory.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {"tracing": False}
@@ -0,0 +1,186 @@
+# app/rendering.py
+# Тексты и клавиатуры бота, готовые к отправке.
+#
+# Подставляемые в шаблоны MESSAGES значения экранируются для parse_mode=HTML
+# (готовый HTML передаётся как Safe).
+# Постоянные клавиатуры собираются и сериализуются в JSON один раз: строку
+# reply_markup aiogram передаёт в Bot API как есть.
+
+import functools
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.payload import prepare_arg
+
+from app.messages import MESSAGES
+from app.utils import username_is_valid_for_link
+
+NO_WISHLIST = "Пожелания не указаны"
+
+GAME_STATUS = {
+    "waiting": "Ожидание игроков",
+    "active": "Игра началась",
+    "finished": "Игра завершена"
+}
+
+MYGAMES_STATUS = {
+    "active": "Игра началась",
+    "waiting": "Ожидание",
+    "finished": "Завершена"
+}
+
+
+class Safe(str):
+    """Готовый HTML: подставляется в шаблон без экранирования."""
+
+
+def escape(value) -> str:
+    """Экранирование для parse_mode=HTML; строки без <, >, & возвращаются как есть."""
+    if type(value) is not str:
+        if isinstance(value, Safe):
+            return value
+        value = str(value)
+    if "<" in value or ">" in value or "&" in value:
+        return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return value
+
+
+def render(key: str, **values) -> str:
+    """MESSAGES[key] с подставленными (экранированными) values."""
+    return MESSAGES[key].format(**{name: escape(value) for name, value in values.items()})
+
+
+# -------------------- Клавиатуры --------------------
+
+def _markup(*rows) -> str:
+    """InlineKeyboardMarkup из строк кнопок (текст, callback_data), сериализованный как в aiogram."""
+    kb = InlineKeyboardMarkup(row_width=2)
+    for row in rows:
+        kb.row(*(InlineKeyboardButton(text, callback_data=data) for text, data in row))
+    return prepare_arg(kb)
+
+
+_MENU_ROWS = (
+    (("🆕 Создать игру", "menu_newgame"), ("🎯 Мои получатели", "menu_mytargets")),
+    (("📋 Мои игры", "menu_mygames"), ("👥 Участники", "menu_players")),
+    (("ℹ️ Статус", "menu_status"), ("❓ Помощь", "menu_help")),
+)
+
+MAIN_MENU = _markup(*_MENU_ROWS)
+MAIN_MENU_ADMIN = _markup(
+    *_MENU_ROWS,
+    (("🎲 Запустить жеребьёвку", "menu_startgame"), ("🏁 Завершить игру", "menu_finishgame")),
+)
+
+
+def main_menu_keyboard(is_admin: bool = False) -> str:
+    return MAIN_MENU_ADMIN if is_admin else MAIN_MENU
+
+
+@functools.lru_cache(maxsize=256)
+def mygames_keyboard(page: int, has_next: bool):
+    """Кнопки листания /mygames; None, если страница одна."""
+    buttons = []
+    if page > 0:
+        buttons.append(("◀️ Назад", f"mygames_page:{page - 1}"))
+    if has_next:
+        buttons.append(("Дальше ▶️", f"mygames_page:{page + 1}"))
+    return _markup(buttons) if buttons else None
+
+
+# -------------------- Тексты --------------------
+
+def user_link(username: str | None, label) -> str:
+    """label (экранируется) — ссылкой на профиль, если username годится для t.me."""
+    label = escape(label)
+    if username_is_valid_for_link(username):
+        return f"<a href=\"https://t.me/{username}\">{label}</a>"
+    return label
+
+
+def _player_name(p: dict) -> str:
+    return p["username"] or p["full_name"] or str(p["user_id"])
+
+
+def players_text(info: dict) -> str:
+    """/players: нумерованный список участников с отметками создателя и пожеланий."""
+    creator_id = info["creator_id"]
+    lines = [
+        f"{i}. {user_link(p['username'], _player_name(p))}"
+        f"{' 👑' if p['user_id'] == creator_id else ''}"
+        f"{' 📝' if p['has_wishlist'] else ' ❔'}"
+        for i, p in enumerate(info["participants"], 1)
+    ]
+    return render("participants_header", name=info["name"]) + "\n" + "\n".join(lines)
+
+
+def gameinfo_text(info: dict) -> str:
+    extra = "\n".join(
+        f"- {user_link(p['username'], _player_name(p))} {'📝' if p['has_wishlist'] else '❔'}"
+        for p in info["participants"]
+    )
+    return render(
+        "gameinfo",
+        name=info["name"],
+        code=info["id"],
+        creator=info["creator_name"],
+        status=GAME_STATUS.get(info["status"], info["status"]),
+        budget=info["budget"],
+        created=info["created_at"][:10] if info["created_at"] else "",
+        count=len(info["participants"]),
+        extra=Safe(extra),
+    )
+
+
+def my_targets_text(results: list) -> str:
+    blocks = []
+    for r in results:
+        if not r.get("target_id"):
+            blocks.append(f"<b>Игра:</b> {escape(r['game_name'])} — получатель: ❌ не назначен")
+            continue
+
+        display = r.get("target_username") or r.get("target_full_name") or str(r["target_id"])
+        blocks.append(
+            f"<b>Игра:</b> {escape(r['game_name'])}\n"
+            f"<b>Получатель:</b> {user_link(r.get('target_username'), display)}\n"
+            f"<b>Пожелания:</b> {escape(r.get('target_wishlist') or NO_WISHLIST)}"
+        )
+    return "\n\n".join(blocks)
+
+
+def assignment_text(game_name: str, a: dict) -> str:
+    """Личное сообщение санте после жеребьёвки."""
+    return render(
+        "startgame_notify",
+        game_name=game_name,
+        display=a["target_username"] or a["target_full_name"] or str(a["target_id"]),
+        wishlist=a["target_wishlist"] or NO_WISHLIST,
+    )
+
+
+def user_games_text(user_games: list, page: int, paged: bool) -> str:
+    header = f"<b>📋 Ваши игры (стр. {page + 1}):</b>" if paged else "<b>📋 Ваши игры:</b>"
+    return header + "\n\n" + "\n\n".join(
+        f"• <b>{escape(g['name'])}</b>\n"
+        f"  Код: <code>{g['id']}</code>\n"
+        f"  Статус: {MYGAMES_STATUS[g['status']]}\n"
+        f"  Участников: {g['count']}"
+        for g in user_games
+    )
+
+
+def delivery_report_text(report: dict, failed: list) -> str:
+    """Итог рассылки для создателя; failed — недоставленные (user_id, причина)."""
+    text = render(
+        "delivery_report",
+        sent=report["sent"],
+        total=report["total"] + len(failed),
+        seconds=report["elapsed"]
+    )
+    failed = failed + report["failed"]
+    if not failed:
+        return text
+    return "\n".join([
+        text,
+        "<b>⚠️ Некоторым участникам не удалось отправить личные сообщения:</b>",
+        *(f"- {uid}: {escape(reason)}" for uid, reason in failed)
+    ])
@@ -0,0 +1,122 @@
+# app/shared_state.py
+# Состояние, которое должно быть общим для всех процессов бота:
+# ожидание названия новой игры (/newgame) и FSM-хранилище aiogram.
+#
+# SHARED_STATE=memory — в памяти процесса (один воркер, по умолчанию)
+# SHARED_STATE=db     — таблица pending_prompts в основной БД
+# FSM_STORAGE=redis   — RedisStorage2 по REDIS_URL (нужен пакет redis)
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from sqlalchemy import func, select
+
+from app.database import engine, run_db
+from app.models import PendingPrompt
+
+# Сколько секунд бот ждёт название игры после /newgame
+PENDING_PROMPT_TTL = int(os.environ.get("PENDING_PROMPT_TTL", "3600"))
+
+
+class MemoryPendingStore:
+    """Ожидающие ввода пользователи в памяти процесса."""
+
+    def __init__(self, ttl: int = PENDING_PROMPT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users: dict[int, float] = {}
+
+    async def add(self, user_id: int):
+        with self._lock:
+            self._users[user_id] = time.monotonic()
+
+    async def pop(self, user_id: int) -> bool:
+        """Снимает ожидание; True, если пользователь действительно его ждал."""
+        with self._lock:
+            added = self._users.pop(user_id, None)
+        return added is not None and time.monotonic() - added < self.ttl
+
+    def contains(self, user_id: int) -> bool:
+        added = self._users.get(user_id)
+        return added is not None and time.monotonic() - added < self.ttl
+
+    def __len__(self):
+        return len(self._users)
+
+
+class DbPendingStore:
+    """Ожидающие ввода пользователи в таблице pending_prompts (видны всем процессам)."""
+
+    def __init__(self, ttl: int = PENDING_PROMPT_TTL):
+        self.ttl = ttl
+        self.engine = engine
+        self.table = PendingPrompt.__table__
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def _add(self, user_id: int):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(
+                (self.table.c.user_id == user_id) | (self.table.c.created_at < self._cutoff())
+            ))
+            conn.execute(self.table.insert(), {"user_id": user_id, "created_at": datetime.utcnow()})
+
+    def _pop(self, user_id: int) -> bool:
+        with self.engine.begin() as conn:
+            # сначала выбрасываем просроченные ожидания, затем снимаем своё
+            conn.execute(self.table.delete().where(self.table.c.created_at < self._cutoff()))
+            deleted = conn.execute(self.table.delete().where(
+                self.table.c.user_id == user_id
+            )).rowcount
+        return deleted > 0
+
+    async def add(self, user_id: int):
+        await run_db(self._add, user_id)
+
+    async def pop(self, user_id: int) -> bool:
+        return await run_db(self._pop, user_id)
+
+    def contains(self, user_id: int) -> bool:
+        with self.engine.connect() as conn:
+            return conn.execute(select(self.table.c.user_id).where(
+                self.table.c.user_id == user_id,
+                self.table.c.created_at >= self._cutoff()
+            )).first() is not None
+
+    def __len__(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar()
+
+
+def create_pending_store(name: str | None = None):
+    """Хранилище ожиданий по имени или из переменной SHARED_STATE."""
+    name = name or os.environ.get("SHARED_STATE", "memory")
+    if name == "memory":
+        return MemoryPendingStore()
+    if name == "db":
+        return DbPendingStore()
+    raise ValueError(f"Unknown SHARED_STATE: {name}")
+
+
+def create_fsm_storage(name: str | None = None):
+    """FSM-хранилище aiogram по имени или из переменной FSM_STORAGE."""
+    name = name or os.environ.get("FSM_STORAGE", "memory")
+    if name == "memory":
+        from aiogram.contrib.fsm_storage.memory import MemoryStorage
+        return MemoryStorage()
+    if name == "redis":
+        from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+        url = urlparse(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisStorage2(
+            host=url.hostname or "localhost",
+            port=url.port or 6379,
+            db=int(url.path.lstrip("/") or 0),
+            password=url.password,
+            ssl=url.scheme == "rediss",
+        )
+    raise ValueError(f"Unknown FSM_STORAGE: {name}")
@@ -0,0 +1,184 @@
+# app/stats.py
+# Счётчики для /status без COUNT по всем таблицам.
+#
+# GameManager обновляет таблицу bot_counters в той же транзакции, что и сами
+# изменения (создание, вступление, старт, завершение игры), поэтому чтение
+# статистики — это SUM по нескольким строкам. Каждый счётчик разбит на
+# STATS_COUNTER_SHARDS строк, чтобы одновременные вступления не упирались
+# в блокировку одной строки.
+#
+# total_players растёт на число новых строк таблицы players (INSERT ... ON CONFLICT
+# DO NOTHING по user_id): из одновременных первых вступлений одного пользователя
+# в разные игры строку вставит только одно, и игрок не посчитается дважды.
+#
+# reconcile() сверяет счётчики с точными COUNT (при миграции и периодически из
+# одного воркера, раз в STATS_RECONCILE_INTERVAL секунд), исправляет и запоминает
+# расхождение.
+
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import BotCounter, Game, Participant, Player
+
+logger = logging.getLogger(__name__)
+
+STATS_COUNTER_SHARDS = int(os.environ.get("STATS_COUNTER_SHARDS", "8"))
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", "3600"))
+
+COUNTERS = ("total_games", "active_games", "waiting_games", "finished_games", "total_players")
+
+# Служебные строки: время последней сверки (unix-время) и найденное расхождение
+RECONCILED_AT = "reconciled_at"
+RECONCILE_DRIFT = "reconcile_drift"
+
+counters = BotCounter.__table__
+players = Player.__table__
+
+
+def game_counters(state) -> set:
+    """Счётчики, в которые попадает игра в состоянии (is_active, is_started); None — игры нет.
+
+    Условия те же, что в точных COUNT из count_stats().
+    """
+    if state is None:
+        return set()
+    is_active, is_started = state
+    names = {"total_games"}
+    if is_started is True:
+        names.add("active_games")
+    if is_started is False and is_active is True:
+        names.add("waiting_games")
+    if is_active is False:
+        names.add("finished_games")
+    return names
+
+
+def game_transition(before, after) -> dict:
+    """Изменения счётчиков при переходе игры из состояния before в after."""
+    was, now = game_counters(before), game_counters(after)
+    deltas = {name: 1 for name in now - was}
+    deltas.update({name: -1 for name in was - now})
+    return deltas
+
+
+def increment_statements(deltas: dict) -> list:
+    """UPDATE счётчиков на deltas в случайном шарде — выполнить в транзакции изменения."""
+    shard = random.randrange(STATS_COUNTER_SHARDS)
+    return [
+        update(counters).where(
+            counters.c.name == name, counters.c.shard == shard
+        ).values(value=counters.c.value + delta)
+        for name, delta in deltas.items() if delta
+    ]
+
+
+def new_players_statement(dialect_name: str, user_ids):
+    """INSERT пользователей в players; rowcount — сколько из них новые игроки.
+
+    Выполняется в транзакции вступления, затем total_players увеличивается
+    на rowcount через increment_statements().
+    """
+    insert = pg_insert if dialect_name == "postgresql" else sqlite_insert
+    return insert(players).values(
+        [{"user_id": user_id} for user_id in user_ids]
+    ).on_conflict_do_nothing(index_elements=["user_id"])
+
+
+def _exact_columns() -> list:
+    """Точные значения счётчиков — скалярные подзапросы (COUNT по таблицам)."""
+    games = Game.__table__
+    count = select(func.count()).select_from(games)
+    return [
+        count.scalar_subquery().label("total_games"),
+        count.where(games.c.is_started == True).scalar_subquery().label("active_games"),  # noqa: E712
+        count.where(
+            games.c.is_started == False, games.c.is_active == True  # noqa: E712
+        ).scalar_subquery().label("waiting_games"),
+        count.where(games.c.is_active == False).scalar_subquery().label("finished_games"),  # noqa: E712
+        select(
+            func.count(func.distinct(Participant.__table__.c.user_id))
+        ).scalar_subquery().label("total_players"),
+    ]
+
+
+def count_stats(conn) -> dict:
+    """Точные значения счётчиков (для сверки)."""
+    row = conn.execute(select(*_exact_columns())).mappings().one()
+    return {name: int(row[name]) for name in COUNTERS}
+
+
+def read_counters(conn) -> dict:
+    """Текущие значения счётчиков и служебных строк."""
+    rows = conn.execute(
+        select(counters.c.name, func.sum(counters.c.value)).group_by(counters.c.name)
+    ).all()
+    return {name: int(value or 0) for name, value in rows}
+
+
+def read_stats(conn) -> dict:
+    values = read_counters(conn)
+    return {name: values.get(name, 0) for name in COUNTERS}
+
+
+def staleness(conn) -> dict:
+    """Насколько можно доверять счётчикам: возраст последней сверки и найденное тогда расхождение."""
+    values = read_counters(conn)
+    reconciled_at = values.get(RECONCILED_AT)
+    return {
+        "reconciled_at": reconciled_at,
+        "age_seconds": round(time.time() - reconciled_at) if reconciled_at else None,
+        "last_drift": values.get(RECONCILE_DRIFT),
+    }
+
+
+def _ensure_rows(conn):
+    """Строки счётчиков, которых ещё нет (новая таблица, выросло STATS_COUNTER_SHARDS)."""
+    existing = set(conn.execute(select(counters.c.name, counters.c.shard)).all())
+    keys = [(name, shard) for name in COUNTERS for shard in range(STATS_COUNTER_SHARDS)]
+    keys += [(RECONCILED_AT, 0), (RECONCILE_DRIFT, 0)]
+    missing = [
+        {"name": name, "shard": shard, "value": 0}
+        for name, shard in keys if (name, shard) not in existing
+    ]
+    if missing:
+        conn.execute(counters.insert(), missing)
+
+
+def reconcile(conn) -> dict:
+    """Сверяет счётчики с точными COUNT в транзакции conn и исправляет расхождение.
+
+    Точные значения и суммы счётчиков читаются одним запросом, то есть из одного
+    снимка: транзакции, закоммиченные позже, меняют и данные, и счётчики, поэтому
+    на расхождение не влияют. Оно прибавляется к шарду 0 без блокировки таблицы —
+    вступления и создание игр не ждут, пока идут COUNT.
+    """
+    sums = [
+        select(func.coalesce(func.sum(counters.c.value), 0)).where(
+            counters.c.name == name
+        ).scalar_subquery().label(f"counter_{name}")
+        for name in COUNTERS
+    ]
+    row = conn.execute(select(*_exact_columns(), *sums)).mappings().one()
+    drift = {
+        name: int(row[name]) - int(row[f"counter_{name}"])
+        for name in COUNTERS if int(row[name]) != int(row[f"counter_{name}"])
+    }
+
+    _ensure_rows(conn)
+    values = {name: counters.c.value + delta for name, delta in drift.items()}
+    values[RECONCILED_AT] = int(time.time())
+    values[RECONCILE_DRIFT] = sum(abs(d) for d in drift.values())
+    for name, value in values.items():
+        conn.execute(
+            update(counters).where(counters.c.name == name, counters.c.shard == 0).values(value=value)
+        )
+
+    if drift:
+        logger.warning("stats reconcile: counters drifted %s", drift)
+    return drift
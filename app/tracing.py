@@ -0,0 +1,320 @@
+# app/tracing.py
+# Трассировка апдейтов: дерево спанов на каждый update_id от webhook до ответа.
+#
+#   webhook                 поток Flask: разбор, дедупликация, постановка в очередь
+#   ├── queue.wait          от постановки в очередь до начала обработки
+#   └── dispatch            обработка в воркере (атрибут handler — обработчик aiogram)
+#       ├── db_call <метод> вызов GameManager через run_db (включая ожидание пула)
+#       │   └── db <тип>    каждый SQL-запрос
+#       └── bot.<метод>     каждый запрос к Bot API
+#
+# Решение о записи трассы принимает webhook (TRACE_SAMPLE_RATE, по умолчанию
+# трассировка выключена). Контекст трассы едет вместе с апдейтом в очереди —
+# ключ TRACE_KEY в payload в формате W3C traceparent, — поэтому переживает
+# переход из потока Flask в поток воркера и в процессы app.consumer при любом
+# бэкенде очереди. Внутри процесса текущий спан хранится в contextvar:
+# задачи asyncio и run_db (copy_context) наследуют его сами.
+#
+# Завершённые спаны копятся в памяти и раз в TRACE_FLUSH_INTERVAL дописываются
+# в TRACE_FILE строками OTLP/JSON (ExportTraceServiceRequest на строку) —
+# формат файлового экспортера OpenTelemetry Collector. Самые медленные трассы
+# показывает python -m tools.slowest_traces.
+
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Доля апдейтов, для которых пишется трасса (0 — выключено, 1 — все)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+# Файл со спанами в OTLP/JSON (по строке на пачку)
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.otlp.jsonl")
+# Как часто сбрасывать спаны в файл (сек)
+TRACE_FLUSH_INTERVAL = float(os.environ.get("TRACE_FLUSH_INTERVAL", "1"))
+# Сколько спанов держать в памяти до сброса; лишние отбрасываются
+TRACE_BUFFER_LIMIT = int(os.environ.get("TRACE_BUFFER_LIMIT", "50000"))
+
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "secret-santa-bot")
+
+# Ключ payload'а апдейта с контекстом трассы; воркер убирает его до обработки
+TRACE_KEY = "_traceparent"
+
+# SpanKind из OTLP
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+
+STATEMENT_LIMIT = 300
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+# вне трассы: пустой контекст без генератора (nullcontext переиспользуем)
+_NO_SPAN = contextlib.nullcontext()
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+class Span:
+    """Один спан; заканчивается end(), после чего уходит в экспорт."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None = None, kind: int = INTERNAL,
+                 start_ns: int | None = None, attributes: dict | None = None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def child(self, name: str, kind: int = INTERNAL, start_ns: int | None = None, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, start_ns, attributes)
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def fail(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self, end_ns: int | None = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            exporter.add(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(span: Span | None):
+    """Делает span текущим внутри блока и завершает его на выходе; None — ничего не делает."""
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """Дочерний спан текущего; вне трассы — пустой контекст без затрат на спан."""
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    return activate(parent.child(name, kind, **attributes))
+
+
+def start_trace(name: str, kind: int = SERVER, sample_rate: float | None = None, **attributes):
+    """Корневой спан новой трассы с вероятностью sample_rate (по умолчанию TRACE_SAMPLE_RATE)."""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        return _NO_SPAN
+    return activate(Span(name, _new_id(16), kind=kind, attributes=attributes))
+
+
+def inject(update_data: dict):
+    """Кладёт контекст текущей трассы в апдейт перед постановкой в очередь."""
+    current = _current.get()
+    if current is not None:
+        update_data[TRACE_KEY] = current.traceparent
+
+
+def _parse_traceparent(value) -> tuple[str, str] | None:
+    parts = value.split("-") if isinstance(value, str) else ()
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def continue_trace(update_data: dict, enqueued_at: float):
+    """Продолжение трассы апдейта в воркере: спан queue.wait и текущий спан dispatch.
+
+    Убирает TRACE_KEY из update_data; апдейты без него обрабатываются без трассы.
+    """
+    parsed = _parse_traceparent(update_data.pop(TRACE_KEY, None))
+    if parsed is None:
+        return _NO_SPAN
+
+    trace_id, parent_id = parsed
+    now = time.time_ns()
+    wait = Span("queue.wait", trace_id, parent_id, CONSUMER, start_ns=min(int(enqueued_at * 1e9), now))
+    wait.end(now)
+    return activate(Span("dispatch", trace_id, parent_id, CONSUMER, start_ns=now, attributes={
+        "update_id": update_data.get("update_id"),
+    }))
+
+
+def update_type(update_data: dict) -> str | None:
+    return next((key for key in update_data if key != "update_id" and key != TRACE_KEY), None)
+
+
+# -------------------- Точки подключения --------------------
+
+def trace_engine(engine):
+    """Спан на каждый SQL-запрос engine внутри трассы."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is not None and context is not None:
+            verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "sql"
+            context._trace_span = parent.child(
+                f"db {verb}", CLIENT, **{"db.statement": statement[:STATEMENT_LIMIT], "db.executemany": executemany}
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        current = getattr(context, "_trace_span", None)
+        if current is not None:
+            context._trace_span = None
+            current.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        current = getattr(exception_context.execution_context, "_trace_span", None)
+        if current is not None:
+            exception_context.execution_context._trace_span = None
+            current.fail(exception_context.original_exception)
+            current.end()
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Middleware aiogram: имя обработчика и тип апдейта в спане dispatch."""
+
+    async def trigger(self, action, args):
+        if action == "process_update" or action == "post_process_update" or not action.startswith("process_"):
+            return None
+        current = _current.get()
+        if current is not None:
+            current.set("handler", getattr(current_handler.get(), "__name__", "unknown"))
+            current.set("update.type", action[8:])
+        return None
+
+
+# -------------------- Экспорт в OTLP/JSON --------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: Span) -> dict:
+    out = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": s.kind,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)} for key, value in s.attributes.items() if value is not None
+        ],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+    }
+    if s.parent_id:
+        out["parentSpanId"] = s.parent_id
+    return out
+
+
+def otlp_request(spans: list) -> dict:
+    """ExportTraceServiceRequest со спанами spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [_otlp_span(s) for s in spans],
+            }],
+        }]
+    }
+
+
+class FileExporter:
+    """Буфер завершённых спанов и фоновый поток, дописывающий их в файл."""
+
+    def __init__(self, path: str = TRACE_FILE, interval: float = TRACE_FLUSH_INTERVAL,
+                 limit: int = TRACE_BUFFER_LIMIT):
+        self.path = path
+        self.interval = interval
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._spans = []
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0
+
+    def add(self, s: Span):
+        with self._lock:
+            if len(self._spans) >= self.limit:
+                self.dropped += 1
+                return
+            self._spans.append(s)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        line = json.dumps(otlp_request(spans), ensure_ascii=False, separators=(",", ":"))
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.exported += len(spans)
+        except OSError as e:
+            self.dropped += len(spans)
+            logger.warning("trace export to %s failed: %s", self.path, e)
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": TRACE_SAMPLE_RATE,
+            "file": self.path,
+            "buffered": len(self._spans),
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
+
+
+exporter = FileExporter()
+atexit.register(exporter.flush)
@@ -0,0 +1,451 @@
+# app/update_queue.py
+# Очередь апдейтов между webhook (поток Flask) и event loop'ом aiogram.
+# Flask сохраняет апдейт в бэкенд и будит воркер через loop.call_soon_threadsafe;
+# воркер забирает апдейты пачками и подтверждает (ack) только после обработки.
+#
+# Бэкенды (UPDATE_QUEUE_BACKEND):
+#   memory   — в памяти процесса, теряется при рестарте (по умолчанию)
+#   sqlite   — локальный файл в режиме WAL (UPDATE_QUEUE_PATH)
+#   postgres — таблица update_queue, выборка через SELECT ... FOR UPDATE SKIP LOCKED
+# В sqlite/postgres взятые апдейты арендуются на UPDATE_QUEUE_LEASE секунд:
+# если воркер умер до ack, апдейт снова станет доступен. Пока апдейт не
+# подтверждён (ждёт в цепочке пользователя или долго обрабатывается — например,
+# рассылка /startgame), воркер продлевает аренду каждые lease / 3 секунд.
+#
+# Несколько процессов-воркеров (CONSUMER_COUNT) делят очередь по shard_key —
+# from_user.id апдейта: воркер CONSUMER_INDEX берёт только свои ключи,
+# поэтому апдейты одного пользователя всегда обрабатывает один процесс по порядку.
+#
+# Когда webhook в другом процессе (app.consumer), разбудить воркер через
+# call_soon_threadsafe нельзя. Postgres после вставки шлёт NOTIFY, процесс-обработчик
+# слушает канал (LISTEN) в отдельном потоке. SQLite уведомлений не умеет: там
+# обработчик опрашивает очередь раз в UPDATE_QUEUE_REMOTE_POLL_INTERVAL.
+
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import os
+import select
+import sqlite3
+import threading
+import time
+
+from app.dispatcher import update_key
+
+logger = logging.getLogger(__name__)
+
+QueueItem = collections.namedtuple("QueueItem", "id update enqueued_at")
+
+# Как часто воркер сам проверяет бэкенд (апдейты от других процессов, истёкшие аренды)
+POLL_INTERVAL = float(os.environ.get("UPDATE_QUEUE_POLL_INTERVAL", "1"))
+# То же для app.consumer на бэкенде без уведомлений (sqlite)
+REMOTE_POLL_INTERVAL = float(os.environ.get("UPDATE_QUEUE_REMOTE_POLL_INTERVAL", "0.05"))
+
+# Канал LISTEN/NOTIFY очереди в PostgreSQL
+NOTIFY_CHANNEL = "update_queue"
+
+
+class MemoryQueueBackend:
+    """Очередь в памяти процесса."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = collections.deque()
+        self._ids = itertools.count(1)
+
+    def put(self, update_data: dict):
+        with self._lock:
+            self._items.append(QueueItem(next(self._ids), update_data, time.time()))
+
+    def take(self, limit: int) -> list:
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(limit, len(self._items)))]
+
+    def ack(self, ids: list):
+        # взятые апдейты уже удалены из очереди
+        pass
+
+    def renew(self, ids: list):
+        pass
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def oldest_age(self):
+        try:
+            return time.time() - self._items[0].enqueued_at
+        except IndexError:
+            return None
+
+
+def shard_key(update_data: dict) -> int:
+    key = update_key(update_data)
+    return abs(key) if isinstance(key, int) else 0
+
+
+class SQLiteQueueBackend:
+    """Очередь в локальном SQLite-файле (WAL), переживает рестарт процесса."""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, lease: float = 120.0, shard: tuple[int, int] = (0, 1)):
+        self.path = path
+        self.lease = lease
+        self.shard_index, self.shard_count = shard
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS update_queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " locked_until REAL,"
+            " shard_key INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, update_data: dict):
+        self._conn().execute(
+            "INSERT INTO update_queue (payload, enqueued_at, shard_key) VALUES (?, ?, ?)",
+            (json.dumps(update_data), time.time(), shard_key(update_data))
+        )
+
+    def take(self, limit: int) -> list:
+        conn = self._conn()
+        now = time.time()
+        # частый опрос пустой очереди не должен брать блокировку записи
+        available = conn.execute(
+            "SELECT 1 FROM update_queue"
+            " WHERE (locked_until IS NULL OR locked_until < ?)"
+            " AND shard_key % ? = ? LIMIT 1",
+            (now, self.shard_count, self.shard_index)
+        ).fetchone()
+        if available is None:
+            return []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, payload, enqueued_at FROM update_queue"
+                " WHERE (locked_until IS NULL OR locked_until < ?)"
+                " AND shard_key % ? = ?"
+                " ORDER BY id LIMIT ?",
+                (now, self.shard_count, self.shard_index, limit)
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE update_queue SET locked_until = ?"
+                    f" WHERE id IN ({','.join('?' * len(rows))})",
+                    (now + self.lease, *(r[0] for r in rows))
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [QueueItem(r[0], json.loads(r[1]), r[2]) for r in rows]
+
+    def ack(self, ids: list):
+        self._conn().execute(
+            f"DELETE FROM update_queue WHERE id IN ({','.join('?' * len(ids))})",
+            tuple(ids)
+        )
+
+    def renew(self, ids: list):
+        self._conn().execute(
+            f"UPDATE update_queue SET locked_until = ? WHERE id IN ({','.join('?' * len(ids))})",
+            (time.time() + self.lease, *ids)
+        )
+
+    def depth(self) -> int:
+        return self._conn().execute("SELECT count(*) FROM update_queue").fetchone()[0]
+
+    def oldest_age(self):
+        oldest = self._conn().execute("SELECT min(enqueued_at) FROM update_queue").fetchone()[0]
+        return time.time() - oldest if oldest is not None else None
+
+
+class PostgresQueueBackend:
+    """Очередь в таблице update_queue основной БД (несколько воркеров через SKIP LOCKED)."""
+
+    name = "postgres"
+    blocking = True
+
+    def __init__(self, lease: float = 120.0, shard: tuple[int, int] = (0, 1)):
+        from app.database import engine
+        from app.models import QueuedUpdate
+
+        self.lease = lease
+        self.shard_index, self.shard_count = shard
+        self.engine = engine
+        self.table = QueuedUpdate.__table__
+        self.table.create(engine, checkfirst=True)
+
+    def put(self, update_data: dict):
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                self.table.insert(),
+                {
+                    "payload": json.dumps(update_data),
+                    "enqueued_at": time.time(),
+                    "shard_key": shard_key(update_data),
+                }
+            )
+            # уходит слушателям при коммите
+            conn.execute(text(f"NOTIFY {NOTIFY_CHANNEL}"))
+
+    def listen(self, callback):
+        """Вызывает callback (из фонового потока) на каждый NOTIFY о новых апдейтах."""
+        threading.Thread(target=self._listen, args=(callback,), name="update-queue-listen", daemon=True).start()
+
+    def _listen(self, callback):
+        raw = None
+        while True:
+            try:
+                # отдельное соединение вне пула: оно занято LISTEN всё время работы
+                raw = self.engine.raw_connection()
+                raw.detach()
+                conn = raw.connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # пока слушателя не было, уведомления могли потеряться
+                callback()
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        callback()
+            except Exception as e:
+                logger.warning("update_queue LISTEN failed, reconnecting: %s", e)
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+                    raw = None
+                time.sleep(5)
+
+    def take(self, limit: int) -> list:
+        from sqlalchemy import text
+
+        now = time.time()
+        with self.engine.begin() as conn:
+            rows = conn.execute(text(
+                "UPDATE update_queue SET locked_until = :until"
+                " WHERE id IN ("
+                "  SELECT id FROM update_queue"
+                "  WHERE (locked_until IS NULL OR locked_until < :now)"
+                "  AND shard_key % :count = :index"
+                "  ORDER BY id LIMIT :limit"
+                "  FOR UPDATE SKIP LOCKED)"
+                " RETURNING id, payload, enqueued_at"
+            ), {
+                "until": now + self.lease,
+                "now": now,
+                "count": self.shard_count,
+                "index": self.shard_index,
+                "limit": limit,
+            }).fetchall()
+        rows.sort(key=lambda r: r[0])
+        return [QueueItem(r[0], json.loads(r[1]), r[2]) for r in rows]
+
+    def ack(self, ids: list):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.id.in_(ids)))
+
+    def renew(self, ids: list):
+        with self.engine.begin() as conn:
+            conn.execute(
+                self.table.update()
+                .where(self.table.c.id.in_(ids))
+                .values(locked_until=time.time() + self.lease)
+            )
+
+    def depth(self) -> int:
+        from sqlalchemy import func, select
+
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar()
+
+    def oldest_age(self):
+        from sqlalchemy import func, select
+
+        with self.engine.connect() as conn:
+            oldest = conn.execute(select(func.min(self.table.c.enqueued_at))).scalar()
+        return time.time() - oldest if oldest is not None else None
+
+
+def create_backend(name: str | None = None):
+    """Бэкенд очереди по имени или из переменной UPDATE_QUEUE_BACKEND."""
+    name = name or os.environ.get("UPDATE_QUEUE_BACKEND", "memory")
+    lease = float(os.environ.get("UPDATE_QUEUE_LEASE", "120"))
+    shard = (
+        int(os.environ.get("CONSUMER_INDEX", "0")),
+        int(os.environ.get("CONSUMER_COUNT", "1")),
+    )
+
+    if name == "memory":
+        return MemoryQueueBackend()
+    if name == "sqlite":
+        return SQLiteQueueBackend(os.environ.get("UPDATE_QUEUE_PATH", "update_queue.db"), lease=lease, shard=shard)
+    if name == "postgres":
+        return PostgresQueueBackend(lease=lease, shard=shard)
+    raise ValueError(f"Unknown UPDATE_QUEUE_BACKEND: {name}")
+
+
+class UpdateQueue:
+    """put() из любого потока, await get_batch() и ack() в event loop'е воркера."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryQueueBackend()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._pending_acks = []
+        self._flushing = False
+        # задачи _flush_acks: event loop держит на задачи только слабые ссылки
+        self._tasks = set()
+        self._in_flight = 0
+        # id взятых, но ещё не подтверждённых апдейтов (их аренда продлевается)
+        self._held = set()
+        self._renewing = False
+        self.poll_interval = POLL_INTERVAL
+
+    def bind(self, loop: asyncio.AbstractEventLoop, remote_producers: bool = False):
+        """Привязывает очередь к event loop воркера (вызывается из потока воркера).
+
+        remote_producers — апдейты кладёт webhook другого процесса (app.consumer):
+        воркер будят уведомления бэкенда, а без них — частый опрос.
+        """
+        self._wakeup = asyncio.Event()
+        self._loop = loop
+        if remote_producers:
+            if hasattr(self.backend, "listen"):
+                self.backend.listen(lambda: loop.call_soon_threadsafe(self._wakeup.set))
+            else:
+                self.poll_interval = min(self.poll_interval, REMOTE_POLL_INTERVAL)
+
+    def put(self, update_data: dict):
+        """Сохраняет апдейт в бэкенд и будит воркер. Для sqlite/postgres — пишет на диск/в БД."""
+        self.backend.put(update_data)
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _call(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        return func(*args)
+
+    async def get_batch(self, limit: int) -> list:
+        """Ждёт и возвращает до limit апдейтов, не блокируя event loop."""
+        while True:
+            self._wakeup.clear()
+            try:
+                items = await self._call(self.backend.take, limit)
+            except Exception as e:
+                logger.exception("update_queue take failed: %s", e)
+                items = []
+
+            # апдейт, который воркер уже держит (аренда истекла, пока он ждал
+            # в цепочке), второй раз не берём — иначе он обработается дважды
+            items = [item for item in items if item.id not in self._held]
+            if items:
+                self._in_flight += len(items)
+                self._held.update(item.id for item in items)
+                if self.backend.blocking and not self._renewing:
+                    self._renewing = True
+                    self._spawn(self._renew_leases())
+                return items
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def ack(self, item: QueueItem):
+        """Подтверждает обработку апдейта. Подтверждения пишутся в бэкенд пачками."""
+        self._in_flight -= 1
+        self._held.discard(item.id)
+        self._pending_acks.append(item.id)
+        if not self._flushing:
+            self._flushing = True
+            self._spawn(self._flush_acks())
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_acks(self):
+        try:
+            while self._pending_acks:
+                ids, self._pending_acks = self._pending_acks, []
+                try:
+                    await self._call(self.backend.ack, ids)
+                except Exception as e:
+                    # апдейты вернутся в очередь после истечения аренды
+                    logger.exception("update_queue ack failed for %s items: %s", len(ids), e)
+        finally:
+            self._flushing = False
+
+    async def _renew_leases(self):
+        """Продлевает аренду апдейтов, взятых воркером и ещё не подтверждённых."""
+        interval = self.backend.lease / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not self._held:
+                continue
+            ids = list(self._held)
+            try:
+                await self._call(self.backend.renew, ids)
+            except Exception as e:
+                # не продлённые апдейты после истечения аренды вернутся в очередь
+                logger.exception("update_queue lease renewal failed for %s items: %s", len(ids), e)
+
+    async def flush(self):
+        """Дожидается записи всех подтверждений (при остановке воркера)."""
+        while self._flushing or self._pending_acks:
+            await asyncio.sleep(0.01)
+
+    def qsize(self) -> int:
+        """Количество апдейтов в бэкенде.
+
+        memory удаляет апдейт при взятии, поэтому считает только ожидающие;
+        sqlite/postgres считают и взятые (арендованные) строки, пока ack их не удалит.
+        Для sqlite/postgres — блокирующий запрос; из event loop'а вызывать depth().
+        """
+        return self.backend.depth()
+
+    async def depth(self) -> int:
+        """qsize() без блокировки event loop'а."""
+        return await self._call(self.backend.depth)
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько апдейтов взято и ещё не подтверждено (без обращения к бэкенду)."""
+        return self._in_flight
+
+    def stats(self) -> dict:
+        oldest = self.backend.oldest_age()
+        return {
+            "backend": self.backend.name,
+            "depth": self.backend.depth(),
+            "in_flight": self._in_flight,
+            "oldest_age_seconds": round(oldest, 3) if oldest is not None else None,
+        }
@@ -5,6 +5,8 @@ import random
 import string
 import re
 
+USERNAME_RE = re.compile(r'^[A-Za-z0-9_]{5,32}$')
+
 
 def generate_game_id(length: int = 8) -> str:
     """Генерирует код игры: 8 символов A-Z + 0-9."""
@@ -24,4 +26,4 @@ def username_is_valid_for_link(username: str | None) -> bool:
     """Проверяет, можно ли сделать кликабельную ссылку на username."""
     if not username:
         return False
-    return bool(re.match(r'^[A-Za-z0-9_]{5,32}$', username))
+    return bool(USERNAME_RE.match(username))
@@ -3,11 +3,21 @@
 
 import os
 import logging
-from flask import Flask, request, jsonify
-
-from app.worker import start_worker
-from app.database import init_db, SessionLocal
-from app.models import Game, Participant
+from flask import Flask, Response, request, jsonify
+
+from app.worker import start_worker, update_queue, update_dispatcher, create_bot, pending_new_game
+from app.database import init_db, db_call_stats
+from app.bulk_import import ImportRejected, parse_rows
+from app.cache import cache_stats
+from app.dedup import create_deduplicator
+from app.export import ExportFilter, export_chunks
+from app.ingress import IngressGate, SHED, REJECT
+from app.loop_monitor import loop_monitor
+from app.metrics import CONTENT_TYPE, Gauge, render as render_metrics
+from app import profiler
+from app import tracing
+from app.shared_state import MemoryPendingStore
+from app.manager import GameManager, JoinOutcome
 
 # ---------------------------------------------------------
 # ЛОГИ
@@ -22,7 +32,7 @@ logger = logging.getLogger("santa")
 
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 BOT_USERNAME = os.environ.get("BOT_USERNAME")
-ADMIN_ID = os.environ.get("ADMIN_ID")  # для /dump_games
+ADMIN_ID = os.environ.get("ADMIN_ID")  # для /dump_games, /loop_health, /profile и импорта участников
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set")
@@ -38,9 +48,43 @@ if not WEBHOOK_HOST:
 if not WEBHOOK_HOST.startswith("http"):
     WEBHOOK_HOST = "https://" + WEBHOOK_HOST
 
+# all — webhook и обработчик апдейтов в одном процессе (по умолчанию, как в Procfile)
+# web — только webhook; апдейты обрабатывают процессы app.consumer (см. app/consumer.py)
+WORKER_ROLE = os.environ.get("WORKER_ROLE", "all")
+
+# Встроенный воркер берёт все апдейты очереди (шард 0 из 1): рядом с ним не должно
+# быть других обработчиков, иначе апдейты одного пользователя пойдут параллельно.
+# С очередью memory у каждого процесса gunicorn своя очередь и своё состояние.
+if WORKER_ROLE == "all":
+    if int(os.environ.get("CONSUMER_COUNT", "1")) > 1:
+        raise RuntimeError("WORKER_ROLE=all cannot be combined with CONSUMER_COUNT>1, use WORKER_ROLE=web")
+    if int(os.environ.get("WEB_WORKERS", "1")) > 1:
+        raise RuntimeError("WORKER_ROLE=all needs WEB_WORKERS=1, use WORKER_ROLE=web with app.consumer")
+elif WORKER_ROLE == "web" and update_queue.backend.name == "memory":
+    raise RuntimeError("WORKER_ROLE=web needs a shared UPDATE_QUEUE_BACKEND (sqlite or postgres), not memory")
+
 WEBHOOK_PATH = f"/webhook/{BOT_TOKEN}"
 WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 
+# Отсев повторных доставок одного и того же update_id
+update_dedup = create_deduplicator()
+
+# Ограничение очереди: при перегрузке отбрасываем малоценные апдейты.
+# Ожидание названия игры видно webhook'у, только если воркер в этом же процессе
+# или состояние общее (SHARED_STATE=db); иначе любой текст считаем важным.
+ingress = IngressGate(
+    update_queue,
+    is_pending=None if WORKER_ROLE != "all" and isinstance(pending_new_game, MemoryPendingStore)
+    else pending_new_game.contains
+)
+
+Gauge("santa_ingress_updates_total", "Webhook updates by ingress decision", ("decision",), kind="counter",
+      func=lambda: {(decision,): ingress.stats()[decision] for decision in ("accepted", "shed", "rejected")})
+Gauge("santa_ingress_shedding", "1 while low-priority updates are being shed",
+      func=lambda: int(ingress.stats()["shedding"]))
+Gauge("santa_dedup_duplicates_total", "Repeated webhook deliveries dropped", kind="counter",
+      func=lambda: update_dedup.stats()["hits"])
+
 # ---------------------------------------------------------
 # FLASK
 # ---------------------------------------------------------
@@ -62,7 +106,10 @@ init_db()
 # ЗАПУСК AIROGRAM WORKER
 # ---------------------------------------------------------
 
-update_queue = start_worker(BOT_TOKEN, BOT_USERNAME)
+if WORKER_ROLE == "all":
+    start_worker(BOT_TOKEN, BOT_USERNAME)
+else:
+    logger.info("WORKER_ROLE=%s: updates are processed by app.consumer", WORKER_ROLE)
 
 # ---------------------------------------------------------
 # WEBHOOK
@@ -70,11 +117,39 @@ update_queue = start_worker(BOT_TOKEN, BOT_USERNAME)
 
 @app.route(WEBHOOK_PATH, methods=["POST"])
 def webhook():
+    # корневой спан трассы апдейта (для доли TRACE_SAMPLE_RATE апдейтов)
+    with tracing.start_trace("webhook") as root:
+        return _webhook(root)
+
+def _webhook(root):
     try:
         update_data = request.get_json()
         update_id = update_data.get("update_id", "unknown")
-
-        update_queue.put(update_data)
+        if root is not None:
+            root.set("update_id", update_id)
+            root.set("update.type", tracing.update_type(update_data))
+
+        if not update_dedup.check_and_add(update_data.get("update_id")):
+            logger.info("♻️ Duplicate update dropped: %s", update_id)
+            return jsonify({"status": "duplicate", "update_id": update_id})
+
+        decision = ingress.admit(update_data)
+        if decision == SHED:
+            logger.info("🪫 Update shed under load: %s", update_id)
+            return jsonify({"status": "shed", "update_id": update_id})
+        if decision == REJECT:
+            # очередь заполнена — Telegram повторит доставку
+            update_dedup.forget(update_data.get("update_id"))
+            logger.info("⛔ Queue full, update rejected: %s", update_id)
+            return jsonify({"status": "busy", "update_id": update_id}), 503
+
+        try:
+            tracing.inject(update_data)
+            update_queue.put(update_data)
+        except Exception:
+            # Telegram повторит доставку — она не должна считаться дубликатом
+            update_dedup.forget(update_data.get("update_id"))
+            raise
         logger.info("📥 Update queued: %s", update_id)
 
         return jsonify({"status": "queued", "update_id": update_id})
@@ -100,14 +175,13 @@ def index():
 
 @app.route("/set_webhook")
 def set_webhook():
-    from aiogram import Bot
     import asyncio
 
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-        bot = Bot(token=BOT_TOKEN)
+        bot = create_bot(BOT_TOKEN)
         loop.run_until_complete(bot.set_webhook(WEBHOOK_URL))
         loop.run_until_complete(bot.session.close())
 
@@ -119,14 +193,13 @@ def set_webhook():
 
 @app.route("/delete_webhook")
 def delete_webhook():
-    from aiogram import Bot
     import asyncio
 
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-        bot = Bot(token=BOT_TOKEN)
+        bot = create_bot(BOT_TOKEN)
         loop.run_until_complete(bot.delete_webhook())
         loop.run_until_complete(bot.session.close())
 
@@ -138,67 +211,159 @@ def delete_webhook():
 
 @app.route("/status")
 def status():
-    db = SessionLocal()
-    try:
-        total_games = db.query(Game).count()
-        active_games = db.query(Game).filter(Game.is_started == True).count()
-        waiting_games = db.query(Game).filter(Game.is_started == False, Game.is_active == True).count()
-        finished_games = db.query(Game).filter(Game.is_active == False).count()
-        total_players = db.query(Participant).distinct(Participant.user_id).count()
-
-        return jsonify({
-            "service": "Secret Santa Bot",
-            "status": "online",
-            "webhook_url": WEBHOOK_URL,
-            "background_worker": True,
-            "queue_size": update_queue.qsize(),
-            "total_games": total_games,
-            "active_games": active_games,
-            "waiting_games": waiting_games,
-            "finished_games": finished_games,
-            "total_players": total_players
-        })
-
-    finally:
-        db.close()
+    stats = GameManager.get_stats(with_staleness=True)
+
+    return jsonify({
+        "service": "Secret Santa Bot",
+        "status": "online",
+        "webhook_url": WEBHOOK_URL,
+        "background_worker": WORKER_ROLE == "all",
+        "queue_size": update_queue.qsize(),
+        "queue": update_queue.stats(),
+        # при WORKER_ROLE=web апдейты обрабатывают процессы app.consumer, не этот
+        "dispatcher": update_dispatcher.stats() if WORKER_ROLE == "all" else None,
+        "dedup": update_dedup.stats(),
+        "ingress": ingress.stats(),
+        "db_calls": db_call_stats(),
+        "caches": cache_stats(),
+        "tracing": tracing.exporter.stats(),
+        **stats
+    })
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.route("/loop_health")
+def loop_health():
+    """Задержка event loop'а воркера и обработчики, надолго его занимавшие."""
+    caller = request.args.get("admin_id")
+
+    # стеки и имена обработчиков — только при заданном ADMIN_ID
+    if not ADMIN_ID or str(caller) != str(ADMIN_ID):
+        return jsonify({"error": "forbidden"}), 403
+
+    return jsonify(loop_monitor.summary())
 
 @app.route("/dump_games")
 def dump_games():
+    """Выгрузка игр потоком: ?format=ndjson, ?since=ISO, ?game_id=A,B, ?after=<код>&limit=N."""
     caller = request.args.get("admin_id")
 
     if ADMIN_ID and str(caller) != str(ADMIN_ID):
         return jsonify({"error": "forbidden"}), 403
 
-    db = SessionLocal()
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "ndjson"):
+        return jsonify({"error": "format must be json or ndjson"}), 400
+
+    try:
+        flt = ExportFilter.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(export_chunks(flt, fmt), mimetype=mimetype)
+
+@app.route("/profile")
+def profile():
+    """CPU-профиль живого процесса: ?seconds=10&interval=0.005&threads=aiogram-worker,ThreadPool&idle=1.
+
+    Возвращает свёрнутые стеки (flamegraph.pl, speedscope).
+    """
+    caller = request.args.get("admin_id")
+
+    if not ADMIN_ID or str(caller) != str(ADMIN_ID):
+        return jsonify({"error": "forbidden"}), 403
+
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+        interval = float(request.args.get("interval", str(profiler.PROFILE_INTERVAL)))
+    except ValueError:
+        return jsonify({"error": "seconds and interval must be numbers"}), 400
+    if not 0 < seconds <= profiler.PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({"error": f"seconds must be in (0, {profiler.PROFILE_MAX_SECONDS}], interval in [0.001, 1]"}), 400
+
+    threads = [t for t in request.args.get("threads", "").split(",") if t]
+    try:
+        counts, rounds = profiler.sample_stacks(seconds, interval, threads, request.args.get("idle") == "1")
+    except profiler.ProfileBusy as e:
+        return jsonify({"error": str(e)}), 409
+
+    return Response(profiler.collapsed(counts), mimetype="text/plain", headers={
+        "Content-Disposition": "attachment; filename=profile.collapsed",
+        "X-Profile-Rounds": str(rounds),
+    })
+
+@app.route("/profile/memory")
+def profile_memory():
+    """Рост памяти через tracemalloc: ?action=start|snapshot|stop, для snapshot — &group_by=lineno&limit=25."""
+    caller = request.args.get("admin_id")
+
+    if not ADMIN_ID or str(caller) != str(ADMIN_ID):
+        return jsonify({"error": "forbidden"}), 403
+
+    action = request.args.get("action", "snapshot")
+    if action == "start":
+        return jsonify(profiler.memory_start())
+    if action == "stop":
+        return jsonify(profiler.memory_stop())
+    if action != "snapshot":
+        return jsonify({"error": "action must be start, snapshot or stop"}), 400
+
+    group_by = request.args.get("group_by", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        return jsonify({"error": "group_by must be lineno, filename or traceback"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", "25")), 1), 200)
+        result = profiler.memory_snapshot(limit, group_by)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+
+    # размеры структур, которые растут вместе с нагрузкой
+    result["sizes"] = {
+        "pending_new_game": len(pending_new_game) if isinstance(pending_new_game, MemoryPendingStore) else None,
+        "update_queue": update_queue.qsize(),
+        "dedup": update_dedup.stats()["size"],
+        "caches": {name: st["size"] for name, st in cache_stats().items()},
+        "trace_buffer": tracing.exporter.stats()["buffered"],
+    }
+    return jsonify(result)
+
+@app.route("/games/<game_id>/participants", methods=["POST"])
+def import_participants(game_id):
+    """Массовое добавление участников: CSV или JSON в теле запроса либо файлом (поле file)."""
+    caller = request.args.get("admin_id")
+
+    # запись — только при заданном ADMIN_ID
+    if not ADMIN_ID or str(caller) != str(ADMIN_ID):
+        return jsonify({"error": "forbidden"}), 403
+
+    upload = request.files.get("file")
+    if upload is not None:
+        body, content_type = upload.read(), upload.content_type or upload.filename or ""
+    else:
+        body, content_type = request.get_data(), request.content_type or ""
+
     try:
-        games = []
-        for g in db.query(Game).all():
-            participants = []
-            for p in db.query(Participant).filter(Participant.game_id == g.id).all():
-                participants.append({
-                    "user_id": p.user_id,
-                    "username": p.username,
-                    "full_name": p.full_name,
-                    "wishlist": p.wishlist,
-                    "target_id": p.target_id
-                })
-
-            games.append({
-                "id": g.id,
-                "name": g.name,
-                "admin_id": g.admin_id,
-                "admin_username": g.admin_username,
-                "is_active": g.is_active,
-                "is_started": g.is_started,
-                "created_at": g.created_at.isoformat() if g.created_at else None,
-                "started_at": g.started_at.isoformat() if g.started_at else None,
-                "participants": participants
-            })
-
-        return jsonify({"games": games})
-
-    finally:
-        db.close()
+        report = parse_rows(body, content_type)
+    except (ImportRejected, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        outcome = GameManager.bulk_join(game_id, report)
+    except Exception as e:
+        logger.exception("Error import_participants: %s", e)
+        return jsonify({"error": "import failed"}), 500
+
+    if outcome == JoinOutcome.NOT_FOUND:
+        return jsonify({"error": "game not found"}), 404
+    if outcome == JoinOutcome.STARTED:
+        return jsonify({"error": "game already started"}), 409
+
+    return jsonify({"game_id": game_id, **report.as_dict()})
 
 # ---------------------------------------------------------
 # ЗАПУСК (локально)
@@ -5,28 +5,97 @@
 
 import asyncio
 import logging
-import queue
+import os
 import threading
+import time
 from datetime import datetime as _dt
 from typing import Optional
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.utils.exceptions import MessageNotModified
 
-from app.manager import GameManager
+from app.database import ASYNC_DB
 from app.messages import MESSAGES
-from app.utils import username_is_valid_for_link
-from app.database import SessionLocal
-from app.models import Game, Participant
+from app.rendering import (
+    assignment_text, delivery_report_text, escape, gameinfo_text, main_menu_keyboard, my_targets_text,
+    mygames_keyboard, players_text, render, user_games_text
+)
+from app.update_queue import UpdateQueue, create_backend
+from app.dispatcher import UpdateDispatcher
+from app.broadcast import Broadcaster
+from app.cache import cache_stats
+from app.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from app.metrics import Gauge, HandlerMetricsMiddleware, observe_bot_request
+from app.shared_state import create_fsm_storage, create_pending_store
+from app.tracing import CLIENT, TracingMiddleware, span
+from app.stats import STATS_RECONCILE_INTERVAL
+
+if ASYNC_DB:
+    from app.async_manager import NativeAsyncGameManager as games
+else:
+    from app.manager import AsyncGameManager as games
 
 logger = logging.getLogger(__name__)
 
-# Очередь апдейтов, куда webhook кладёт данные
-update_queue = queue.Queue()
+# Очередь апдейтов, куда webhook кладёт данные (бэкенд — UPDATE_QUEUE_BACKEND)
+update_queue = UpdateQueue(create_backend())
 
-# Пользователи, ожидающие ввода названия игры
-pending_new_game = set()
+# Сколько апдейтов воркер забирает из очереди за раз
+UPDATE_QUEUE_BATCH = int(os.environ.get("UPDATE_QUEUE_BATCH", "32"))
+
+# Сколько апдейтов разных пользователей обрабатывается одновременно
+MAX_INFLIGHT_UPDATES = int(os.environ.get("MAX_INFLIGHT_UPDATES", "16"))
+
+# Раздаёт апдейты из очереди обработчикам aiogram
+update_dispatcher = UpdateDispatcher(max_in_flight=MAX_INFLIGHT_UPDATES)
+
+# Лимиты рассылки личных сообщений (сообщений в секунду). BROADCAST_RATE — лимит
+# на бота; процессы app.consumer (CONSUMER_COUNT) делят его поровну, каждый со
+# своим token bucket'ом.
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "30")) / int(os.environ.get("CONSUMER_COUNT", "1"))
+BROADCAST_PER_CHAT_RATE = float(os.environ.get("BROADCAST_PER_CHAT_RATE", "1"))
+
+# Адрес Bot API; можно указать локальный сервер (например, фейковый для тестов)
+TELEGRAM_API_SERVER = os.environ.get("TELEGRAM_API_SERVER")
+
+# Пользователи, ожидающие ввода названия игры (общие для процессов при SHARED_STATE=db)
+pending_new_game = create_pending_store()
+
+
+Gauge("santa_update_queue_depth", "Updates waiting in the queue", func=update_queue.qsize)
+Gauge("santa_update_queue_in_flight", "Updates taken from the queue and not yet acked",
+      func=lambda: update_queue.in_flight)
+Gauge("santa_dispatcher_active", "Updates being handled right now",
+      func=lambda: update_dispatcher.stats()["active"])
+Gauge("santa_cache_requests_total", "Cache lookups", ("cache", "result"), kind="counter", func=lambda: {
+    (name, result): stats[result] for name, stats in cache_stats().items() for result in ("hits", "misses")
+})
+Gauge("santa_cache_evictions_total", "Entries evicted by size limit", ("cache",), kind="counter", func=lambda: {
+    (name,): stats["evictions"] for name, stats in cache_stats().items()
+})
+
+
+class InstrumentedBot(Bot):
+    """Bot с метриками запросов к Bot API (длительность, коды ошибок) и спанами трассировки."""
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span(f"bot.{method}", CLIENT):
+                result = await super().request(method, data, files, **kwargs)
+        except BaseException as e:
+            observe_bot_request(method, time.perf_counter() - started, e)
+            raise
+        observe_bot_request(method, time.perf_counter() - started)
+        return result
+
+
+def create_bot(bot_token: str, **kwargs) -> Bot:
+    """Создаёт Bot, при необходимости направленный на TELEGRAM_API_SERVER."""
+    if TELEGRAM_API_SERVER:
+        kwargs["server"] = TelegramAPIServer.from_base(TELEGRAM_API_SERVER)
+    return InstrumentedBot(token=bot_token, **kwargs)
 
 
 def _safe_message_date_to_int(msg_date) -> int:
@@ -41,49 +110,50 @@ def _safe_message_date_to_int(msg_date) -> int:
         return int(_dt.utcnow().timestamp())
 
 
-def start_worker(bot_token: str, bot_username: str):
-    """Запускает aiogram worker в отдельном потоке."""
+def command_from_callback(callback_query: types.CallbackQuery, text: str) -> types.Message:
+    """Команда text от имени нажавшего кнопку — чтобы кнопки меню вызывали обработчики команд.
+
+    Отправителя aiogram принимает только под именем поля "from" (from_user=... игнорируется).
+    """
+    return types.Message(**{
+        "message_id": callback_query.message.message_id,
+        "date": _safe_message_date_to_int(callback_query.message.date),
+        "chat": callback_query.message.chat,
+        "from": callback_query.from_user,
+        "text": text,
+    })
+
+
+def start_worker(bot_token: str, bot_username: str, background: bool = True):
+    """Запускает aiogram worker в отдельном потоке.
+
+    С background=False воркер работает в текущем потоке и не возвращает управление
+    (отдельный процесс-обработчик, см. app/consumer.py).
+    """
 
     def worker():
-        bot = Bot(token=bot_token, parse_mode="HTML")
-        dp = Dispatcher(bot, storage=MemoryStorage())
+        bot = create_bot(bot_token, parse_mode="HTML")
+        dp = Dispatcher(bot, storage=create_fsm_storage())
+        dp.middleware.setup(HandlerMetricsMiddleware())
+        dp.middleware.setup(LoopMonitorMiddleware(loop_monitor))
+        dp.middleware.setup(TracingMiddleware())
+        broadcaster = Broadcaster(
+            bot,
+            global_rate=BROADCAST_RATE,
+            per_chat_rate=BROADCAST_PER_CHAT_RATE
+        )
 
         # -------------------- Вспомогательные функции --------------------
 
-        def main_menu_keyboard(is_admin: bool = False):
-            kb = InlineKeyboardMarkup(row_width=2)
-            kb.add(
-                InlineKeyboardButton("🆕 Создать игру", callback_data="menu_newgame"),
-                InlineKeyboardButton("🎯 Мои получатели", callback_data="menu_mytargets"),
-            )
-            kb.add(
-                InlineKeyboardButton("📋 Мои игры", callback_data="menu_mygames"),
-                InlineKeyboardButton("👥 Участники", callback_data="menu_players"),
-            )
-            kb.add(
-                InlineKeyboardButton("ℹ️ Статус", callback_data="menu_status"),
-                InlineKeyboardButton("❓ Помощь", callback_data="menu_help"),
-            )
-            if is_admin:
-                kb.add(
-                    InlineKeyboardButton("🎲 Запустить жеребьёвку", callback_data="menu_startgame"),
-                    InlineKeyboardButton("🏁 Завершить игру", callback_data="menu_finishgame"),
-                )
-            return kb
+        async def send_delivery_report(chat_id, report: dict, failed: list):
+            """Сообщает создателю, скольким участникам дошла рассылка."""
+            await bot.send_message(chat_id, delivery_report_text(report, failed))
 
         # -------------------- Команды --------------------
 
         @dp.message_handler(commands=['start'])
         async def cmd_start(message: types.Message):
-            is_admin = False
-            db = SessionLocal()
-            try:
-                is_admin = db.query(Game).filter(
-                    Game.admin_id == message.from_user.id,
-                    Game.is_active == True
-                ).count() > 0
-            finally:
-                db.close()
+            is_admin = await games.has_active_games(message.from_user.id)
 
             args = message.get_args()
             if args and args.startswith("join_"):
@@ -91,7 +161,7 @@ def start_worker(bot_token: str, bot_username: str):
                 tg_username = (message.from_user.username or "").strip() or None
                 full_name = " ".join(filter(None, [message.from_user.first_name, message.from_user.last_name])).strip() or tg_username or str(message.from_user.id)
 
-                ok, res = GameManager.join_game(
+                ok, res = await games.join_game(
                     code,
                     message.from_user.id,
                     tg_username,
@@ -120,7 +190,7 @@ def start_worker(bot_token: str, bot_username: str):
         @dp.message_handler(commands=['newgame'])
         async def cmd_newgame(message: types.Message):
             uid = message.from_user.id
-            pending_new_game.add(uid)
+            await pending_new_game.add(uid)
             await bot.send_message(message.chat.id, MESSAGES["newgame_prompt"])
 
         @dp.message_handler(commands=['join'])
@@ -134,7 +204,7 @@ def start_worker(bot_token: str, bot_username: str):
             tg_username = (message.from_user.username or "").strip() or None
             full_name = " ".join(filter(None, [message.from_user.first_name, message.from_user.last_name])).strip() or tg_username or str(message.from_user.id)
 
-            ok, res = GameManager.join_game(
+            ok, res = await games.join_game(
                 code,
                 message.from_user.id,
                 tg_username,
@@ -144,120 +214,70 @@ def start_worker(bot_token: str, bot_username: str):
 
         @dp.message_handler(commands=['startgame'])
         async def cmd_startgame(message: types.Message):
-            db = SessionLocal()
-            try:
-                game = db.query(Game).filter(
-                    Game.admin_id == message.from_user.id,
-                    Game.is_started == False,
-                    Game.is_active == True
-                ).order_by(Game.created_at.desc()).first()
-
-                if not game:
-                    await bot.send_message(message.chat.id, "❌ У вас нет игр, которые можно запустить.")
-                    return
+            game = await games.get_startable_game(message.from_user.id)
 
-                # Сохраняем простые значения, чтобы не обращаться к detached-объекту позже
-                game_id = game.id
-                game_name = game.name
+            if not game:
+                await bot.send_message(message.chat.id, "❌ У вас нет игр, которые можно запустить.")
+                return
 
-                ok, res = GameManager.start_game(game_id, message.from_user.id)
-                await bot.send_message(message.chat.id, res)
+            game_id = game["id"]
+            game_name = game["name"]
 
-                if ok:
-                    await bot.send_message(message.chat.id, MESSAGES["game_started"])
-
-                    # Открываем новую сессию для рассылки — не используем старый объект game
-                    db2 = SessionLocal()
-                    failed = []
-                    try:
-                        participants = db2.query(Participant).filter(
-                            Participant.game_id == game_id
-                        ).all()
-
-                        for p in participants:
-                            # проверяем, что user_id — int
-                            try:
-                                uid = int(p.user_id)
-                            except Exception:
-                                logger.warning("Invalid user_id type for participant id=%s user_id=%s", getattr(p, "id", None), p.user_id)
-                                failed.append((p.user_id, "invalid user_id"))
-                                continue
-
-                            if not p.target_id:
-                                # если нет target_id — пропускаем
-                                failed.append((uid, "no target assigned"))
-                                continue
-
-                            target = db2.query(Participant).filter(
-                                Participant.game_id == game_id,
-                                Participant.user_id == p.target_id
-                            ).first()
-
-                            if not target:
-                                failed.append((uid, "target not found"))
-                                continue
-
-                            wishlist = target.wishlist or "Пожелания не указаны"
-                            display = target.username or target.full_name or str(target.user_id)
-
-                            try:
-                                await bot.send_message(
-                                    uid,
-                                    MESSAGES["startgame_notify"].format(
-                                        game_name=game_name,
-                                        display=display,
-                                        wishlist=wishlist
-                                    )
-                                )
-                                logger.info("notify_sent: game=%s to=%s receiver=%s", game_id, uid, target.user_id)
-                            except Exception as e:
-                                logger.exception("Failed to send DM to %s: %s", uid, e)
-                                failed.append((uid, str(e)))
-                    finally:
-                        db2.close()
-
-                    # Если были неудачные отправки — уведомляем создателя в чате
-                    if failed:
-                        text_lines = ["<b>⚠️ Некоторым участникам не удалось отправить личные сообщения:</b>"]
-                        for uid, reason in failed:
-                            text_lines.append(f"- {uid}: {reason}")
-                        await bot.send_message(message.chat.id, "\n".join(text_lines))
+            ok, res = await games.start_game(game_id, message.from_user.id)
+            await bot.send_message(message.chat.id, res)
 
-            finally:
-                db.close()
+            if not ok:
+                return
+
+            await bot.send_message(message.chat.id, MESSAGES["game_started"])
+
+            failed = []
+            outgoing = []
+            for a in await games.get_assignments(game_id):
+                uid = a["user_id"]
+
+                if not a["target_id"]:
+                    # если нет target_id — пропускаем
+                    failed.append((uid, "no target assigned"))
+                    continue
+
+                if not a["target_found"]:
+                    failed.append((uid, "target not found"))
+                    continue
+
+                outgoing.append((uid, assignment_text(game_name, a)))
+
+            report = await broadcaster.send_many(outgoing)
+            logger.info("notify_done: game=%s sent=%s failed=%s", game_id, report["sent"], len(report["failed"]) + len(failed))
+            await send_delivery_report(message.chat.id, report, failed)
+
+        @dp.message_handler(commands=['exclude'])
+        async def cmd_exclude(message: types.Message):
+            parts = message.text.strip().split()
+            if len(parts) < 3:
+                await bot.send_message(message.chat.id, "❌ Укажите двух участников: <b>/exclude @anna @boris</b>")
+                return
+
+            ok, res = await games.add_exclusion(message.from_user.id, parts[1], parts[2])
+            await bot.send_message(message.chat.id, res)
 
         @dp.message_handler(commands=['finishgame'])
         async def cmd_finishgame(message: types.Message):
-            db = SessionLocal()
-            try:
-                game = db.query(Game).filter(
-                    Game.admin_id == message.from_user.id,
-                    Game.is_active == True
-                ).order_by(Game.created_at.desc()).first()
+            game = await games.get_latest_active_game(message.from_user.id)
 
-                if not game:
-                    await bot.send_message(message.chat.id, "❌ У вас нет активных игр.")
-                    return
-
-                ok, res = GameManager.finish_game(game.id, message.from_user.id)
-                await bot.send_message(message.chat.id, res)
+            if not game:
+                await bot.send_message(message.chat.id, "❌ У вас нет активных игр.")
+                return
 
-                if ok:
-                    participants = db.query(Participant).filter(
-                        Participant.game_id == game.id
-                    ).all()
-
-                    for p in participants:
-                        try:
-                            await bot.send_message(
-                                p.user_id,
-                                MESSAGES["finishgame"].format(name=game.name)
-                            )
-                        except Exception:
-                            pass
+            ok, res = await games.finish_game(game["id"], message.from_user.id)
+            await bot.send_message(message.chat.id, res)
 
-            finally:
-                db.close()
+            if ok:
+                text = render("finishgame", name=game["name"])
+                report = await broadcaster.send_many(
+                    (user_id, text) for user_id in await games.get_participant_ids(game["id"])
+                )
+                await send_delivery_report(message.chat.id, report, [])
 
         @dp.message_handler(commands=['wish'])
         async def cmd_wish(message: types.Message):
@@ -268,83 +288,53 @@ def start_worker(bot_token: str, bot_username: str):
                 await bot.send_message(message.chat.id, "📝 Укажите пожелания: <b>/wish Хочу книгу</b>")
                 return
 
-            ok, res = GameManager.set_wishlist(message.from_user.id, wishlist)
+            ok, res = await games.set_wishlist(message.from_user.id, wishlist)
             await bot.send_message(message.chat.id, res)
 
         @dp.message_handler(commands=['mytargets', 'mytarget'])
         async def cmd_mytargets(message: types.Message):
-            results = GameManager.get_my_targets(message.from_user.id)
+            results = await games.get_my_targets(message.from_user.id)
 
             if not results:
                 await bot.send_message(message.chat.id, "📭 У вас пока нет активных назначений.")
                 return
 
-            lines = []
-            for r in results:
-                if not r.get("target_id"):
-                    lines.append(
-                        f"<b>Игра:</b> {r['game_name']} — получатель: ❌ не назначен"
-                    )
-                    continue
+            await bot.send_message(message.chat.id, my_targets_text(results))
 
-                display = r.get("target_username") or r.get("target_full_name") or str(r["target_id"])
-                wishlist = r.get("target_wishlist") or "Пожелания не указаны"
+        async def render_mygames(user_id: int, page: int = 0):
+            """Текст и кнопки листания для страницы /mygames."""
+            result = await games.get_user_games(user_id, page=page)
+            user_games = result["games"]
 
-                if username_is_valid_for_link(r.get("target_username")):
-                    lines.append(
-                        f"<b>Игра:</b> {r['game_name']}\n"
-                        f"<b>Получатель:</b> <a href=\"https://t.me/{r['target_username']}\">{display}</a>\n"
-                        f"<b>Пожелания:</b> {wishlist}"
-                    )
-                else:
-                    lines.append(
-                        f"<b>Игра:</b> {r['game_name']}\n"
-                        f"<b>Получатель:</b> {display}\n"
-                        f"<b>Пожелания:</b> {wishlist}"
-                    )
+            if not user_games and page == 0:
+                return "📭 У вас пока нет игр.", None
 
-            await bot.send_message(message.chat.id, "\n\n".join(lines))
+            paged = page > 0 or result["has_next"]
+            kb = mygames_keyboard(page, result["has_next"]) if paged else None
+            return user_games_text(user_games, page, paged), kb
 
         @dp.message_handler(commands=['mygames'])
         async def cmd_mygames(message: types.Message):
-            db = SessionLocal()
-            try:
-                parts = db.query(Participant).filter(
-                    Participant.user_id == message.from_user.id
-                ).all()
-
-                game_ids = {p.game_id for p in parts}
-
-                if not game_ids:
-                    await bot.send_message(message.chat.id, "📭 У вас пока нет игр.")
-                    return
-
-                lines = []
-                for gid in game_ids:
-                    g = db.query(Game).filter(Game.id == gid).first()
-                    if not g:
-                        continue
-
-                    count = db.query(Participant).filter(
-                        Participant.game_id == gid
-                    ).count()
-
-                    status = (
-                        "Игра началась" if g.is_started else
-                        ("Ожидание" if g.is_active else "Завершена")
-                    )
-
-                    lines.append(
-                        f"• <b>{g.name}</b>\n"
-                        f"  Код: <code>{g.id}</code>\n"
-                        f"  Статус: {status}\n"
-                        f"  Участников: {count}"
-                    )
-
-                await bot.send_message(message.chat.id, "<b>📋 Ваши игры:</b>\n\n" + "\n\n".join(lines))
+            text, kb = await render_mygames(message.from_user.id)
+            await bot.send_message(message.chat.id, text, reply_markup=kb)
 
+        @dp.callback_query_handler(lambda c: c.data and c.data.startswith("mygames_page:"))
+        async def mygames_page(callback_query: types.CallbackQuery):
+            page = max(0, int(callback_query.data.split(":", 1)[1]))
+            try:
+                text, kb = await render_mygames(callback_query.from_user.id, page)
+                await bot.edit_message_text(
+                    text,
+                    callback_query.message.chat.id,
+                    callback_query.message.message_id,
+                    reply_markup=kb
+                )
+            except MessageNotModified:
+                # повторное нажатие на кнопку уже открытой страницы
+                pass
             finally:
-                db.close()
+                # иначе у пользователя крутится индикатор загрузки до таймаута Telegram
+                await bot.answer_callback_query(callback_query.id)
 
         @dp.message_handler(commands=['gameinfo'])
         async def cmd_gameinfo(message: types.Message):
@@ -354,112 +344,46 @@ def start_worker(bot_token: str, bot_username: str):
                 return
 
             code = parts[1].upper()
-            info = GameManager.get_game_info(code)
+            info = await games.get_game_info(code)
 
             if not info:
-                await bot.send_message(message.chat.id, f"❌ Игра с кодом <code>{code}</code> не найдена")
+                await bot.send_message(message.chat.id, f"❌ Игра с кодом <code>{escape(code)}</code> не найдена")
                 return
 
-            status_map = {
-                "waiting": "Ожидание игроков",
-                "active": "Игра началась",
-                "finished": "Игра завершена"
-            }
-
-            extra = ""
-            if info["participants"]:
-                extra_lines = []
-                for p in info["participants"]:
-                    uname = p.get("username") or p.get("full_name") or str(p.get("user_id"))
-                    mark = "📝" if p.get("has_wishlist") else "❔"
-
-                    if username_is_valid_for_link(p.get("username")):
-                        extra_lines.append(f"- <a href=\"https://t.me/{p.get('username')}\">{uname}</a> {mark}")
-                    else:
-                        extra_lines.append(f"- {uname} {mark}")
-
-                extra = "\n".join(extra_lines)
-
-            await bot.send_message(
-                message.chat.id,
-                MESSAGES["gameinfo"].format(
-                    name=info["name"],
-                    code=info["id"],
-                    creator=info["creator_name"],
-                    status=status_map.get(info["status"], info["status"]),
-                    budget=info["budget"],
-                    created=info["created_at"][:10] if info["created_at"] else "",
-                    count=len(info["participants"]),
-                    extra=extra,
-                    bot=bot_username,
-                )
-            )
+            await bot.send_message(message.chat.id, gameinfo_text(info))
 
         @dp.message_handler(commands=['players'])
         async def cmd_players(message: types.Message):
-            db = SessionLocal()
-            try:
-                p = db.query(Participant).filter(
-                    Participant.user_id == message.from_user.id
-                ).order_by(Participant.id.desc()).first()
-
-                if not p:
-                    await bot.send_message(message.chat.id, "❌ Вы не участвуете в игре.")
-                    return
+            game_id = await games.get_last_game_id(message.from_user.id)
 
-                g = db.query(Game).filter(Game.id == p.game_id).first()
-                if not g:
-                    await bot.send_message(message.chat.id, "❌ Игра не найдена.")
-                    return
-
-                participants = db.query(Participant).filter(
-                    Participant.game_id == g.id
-                ).all()
-
-                lines = []
-                for i, part in enumerate(participants, 1):
-                    uname = part.username or part.full_name or str(part.user_id)
-                    if username_is_valid_for_link(part.username):
-                        link = f"<a href=\"https://t.me/{part.username}\">{uname}</a>"
-                    else:
-                        link = uname
-
-                    creator_mark = " 👑" if part.user_id == g.admin_id else ""
-                    wishlist_mark = " 📝" if part.wishlist else " ❔"
-
-                    lines.append(f"{i}. {link}{creator_mark}{wishlist_mark}")
+            if not game_id:
+                await bot.send_message(message.chat.id, "❌ Вы не участвуете в игре.")
+                return
 
-                await bot.send_message(
-                    message.chat.id,
-                    MESSAGES["participants_header"].format(name=g.name) + "\n" + "\n".join(lines)
-                )
+            info = await games.get_game_info(game_id)
+            if not info:
+                await bot.send_message(message.chat.id, "❌ Игра не найдена.")
+                return
 
-            finally:
-                db.close()
+            await bot.send_message(message.chat.id, players_text(info))
 
         @dp.message_handler(commands=['status'])
         async def cmd_status(message: types.Message):
-            db = SessionLocal()
-            try:
-                total_games = db.query(Game).count()
-                active_games = db.query(Game).filter(Game.is_started == True).count()
-                waiting_games = db.query(Game).filter(Game.is_started == False, Game.is_active == True).count()
-                finished_games = db.query(Game).filter(Game.is_active == False).count()
-                total_players = db.query(Participant).distinct(Participant.user_id).count()
+            stats = await games.get_stats()
 
-                await bot.send_message(
-                    message.chat.id,
-                    MESSAGES["status"].format(
-                        total=total_games,
-                        active=active_games,
-                        waiting=waiting_games,
-                        finished=finished_games,
-                        players=total_players,
-                        queue=update_queue.qsize()
-                    )
+            await bot.send_message(
+                message.chat.id,
+                render(
+                    "status",
+                    total=stats["total_games"],
+                    active=stats["active_games"],
+                    waiting=stats["waiting_games"],
+                    finished=stats["finished_games"],
+                    players=stats["total_players"],
+                    queue=await update_queue.depth(),
+                    in_flight=update_dispatcher.stats()["active"]
                 )
-            finally:
-                db.close()
+            )
 
         # -------------------- Callback-кнопки меню --------------------
 
@@ -468,74 +392,31 @@ def start_worker(bot_token: str, bot_username: str):
             data = callback_query.data
             uid = callback_query.from_user.id
             chat_id = callback_query.message.chat.id
-            msg_date_int = _safe_message_date_to_int(callback_query.message.date)
 
             if data == "menu_help":
                 await bot.send_message(chat_id, MESSAGES["help"])
 
             elif data == "menu_newgame":
-                pending_new_game.add(uid)
+                await pending_new_game.add(uid)
                 await bot.send_message(chat_id, MESSAGES["newgame_prompt"])
 
             elif data == "menu_mytargets":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/mytargets"
-                )
-                await cmd_mytargets(fake_msg)
+                await cmd_mytargets(command_from_callback(callback_query, "/mytargets"))
 
             elif data == "menu_mygames":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/mygames"
-                )
-                await cmd_mygames(fake_msg)
+                await cmd_mygames(command_from_callback(callback_query, "/mygames"))
 
             elif data == "menu_players":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/players"
-                )
-                await cmd_players(fake_msg)
+                await cmd_players(command_from_callback(callback_query, "/players"))
 
             elif data == "menu_status":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/status"
-                )
-                await cmd_status(fake_msg)
+                await cmd_status(command_from_callback(callback_query, "/status"))
 
             elif data == "menu_startgame":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/startgame"
-                )
-                await cmd_startgame(fake_msg)
+                await cmd_startgame(command_from_callback(callback_query, "/startgame"))
 
             elif data == "menu_finishgame":
-                fake_msg = types.Message(
-                    message_id=callback_query.message.message_id,
-                    date=msg_date_int,
-                    chat=callback_query.message.chat,
-                    from_user=callback_query.from_user,
-                    text="/finishgame"
-                )
-                await cmd_finishgame(fake_msg)
+                await cmd_finishgame(command_from_callback(callback_query, "/finishgame"))
 
             await bot.answer_callback_query(callback_query.id)
 
@@ -546,9 +427,7 @@ def start_worker(bot_token: str, bot_username: str):
             uid = message.from_user.id
             text = (message.text or "").strip()
 
-            if uid in pending_new_game:
-                pending_new_game.remove(uid)
-
+            if await pending_new_game.pop(uid):
                 game_name = text[:200].strip()
                 if not game_name:
                     await bot.send_message(message.chat.id, "❌ Название не может быть пустым.")
@@ -558,21 +437,17 @@ def start_worker(bot_token: str, bot_username: str):
                 creator_full = " ".join(filter(None, [message.from_user.first_name, message.from_user.last_name])).strip() or creator_tg or str(uid)
 
                 try:
-                    g = GameManager.create_game(uid, creator_full, game_name, creator_tg)
+                    g = await games.create_game(uid, creator_full, game_name, creator_tg)
                     # проверка, что участник создан
-                    db = SessionLocal()
-                    try:
-                        exists = db.query(Participant).filter(Participant.game_id == g["id"], Participant.user_id == uid).first()
-                        if not exists:
-                            logger.warning("After create_game participant missing for game=%s user=%s", g["id"], uid)
-                        else:
-                            logger.info("Participant created OK for game=%s user=%s", g["id"], uid)
-                    finally:
-                        db.close()
+                    if not await games.participant_exists(g["id"], uid):
+                        logger.warning("After create_game participant missing for game=%s user=%s", g["id"], uid)
+                    else:
+                        logger.info("Participant created OK for game=%s user=%s", g["id"], uid)
 
                     await bot.send_message(
                         message.chat.id,
-                        MESSAGES["game_created"].format(
+                        render(
+                            "game_created",
                             name=g["name"],
                             code=g["id"],
                             bot=bot_username
@@ -597,33 +472,37 @@ def start_worker(bot_token: str, bot_username: str):
 
         # -------------------- Очередь апдейтов --------------------
 
+        async def process_update(update_data: dict):
+            update = types.Update(**update_data)
+            await dp.process_update(update)
+
         async def process_queue():
-            logger.info("Aiogram worker started")
-            while True:
-                try:
-                    update_data = update_queue.get(timeout=1)
-                except queue.Empty:
-                    await asyncio.sleep(0.1)
-                    continue
+            logger.info("Aiogram worker started (max_in_flight=%s)", MAX_INFLIGHT_UPDATES)
+            await update_dispatcher.run(update_queue, process_update, batch_size=UPDATE_QUEUE_BATCH)
 
+        async def reconcile_stats():
+            # счётчики /status обновляются инкрементально; периодически сверяем их с точными COUNT
+            while True:
                 try:
-                    update = types.Update(**update_data)
-                    await dp.process_update(update)
+                    await games.reconcile_stats()
                 except Exception as e:
-                    logger.exception("Error processing update: %s", e)
-                finally:
-                    try:
-                        update_queue.task_done()
-                    except Exception:
-                        pass
+                    logger.exception("Stats reconcile failed: %s", e)
+                await asyncio.sleep(STATS_RECONCILE_INTERVAL)
 
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
+        # в отдельном процессе-обработчике апдейты кладёт webhook другого процесса
+        update_queue.bind(loop, remote_producers=not background)
         loop.create_task(process_queue())
+        loop_monitor.attach(loop)
+        # сверка нужна одна на всю базу: из процессов app.consumer её делает только первый
+        if STATS_RECONCILE_INTERVAL > 0 and int(os.environ.get("CONSUMER_INDEX", "0")) == 0:
+            loop.create_task(reconcile_stats())
 
         try:
             loop.run_forever()
         finally:
+            loop_monitor.stop()
             # корректное закрытие сессии бота
             try:
                 loop.run_until_complete(bot.get_session())
@@ -634,8 +513,13 @@ def start_worker(bot_token: str, bot_username: str):
             except Exception:
                 pass
 
+    if not background:
+        logger.info("Worker started in foreground")
+        worker()
+        return update_queue
+
     # Запускаем воркер в отдельном потоке
-    thread = threading.Thread(target=worker, daemon=True)
+    thread = threading.Thread(target=worker, name="aiogram-worker", daemon=True)
     thread.start()
 
     logger.info("Background worker thread started")
@@ -0,0 +1,73 @@
+# tools/bench_db_modes.py
+# Сравнение пропускной способности: синхронный engine через пул потоков
+# (AsyncGameManager) против AsyncEngine (NativeAsyncGameManager, DB_ASYNC=1).
+#
+# Запуск: DATABASE_URL=postgresql://... python -m tools.bench_db_modes [--requests 2000]
+# Без DATABASE_URL используется временный SQLite-файл.
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_modes.db")
+os.environ["DB_ASYNC"] = "1"
+
+from app.database import init_db, async_engine  # noqa: E402
+from app.manager import AsyncGameManager, GameManager  # noqa: E402
+from app.async_manager import NativeAsyncGameManager  # noqa: E402
+
+
+def _seed(players: int) -> str:
+    game = GameManager.create_game(1, "Bench", "bench game")
+    for uid in range(2, players + 2):
+        GameManager.join_game(game["id"], uid, f"user{uid}", f"User {uid}")
+    return game["id"]
+
+
+async def _workload(manager, game_id: str, players: int, requests: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        uid = random.randint(2, players + 1)
+        async with sem:
+            kind = i % 3
+            if kind == 0:
+                await manager.get_game_info(game_id)
+            elif kind == 1:
+                await manager.get_my_targets(uid)
+            else:
+                await manager.join_game(game_id, uid, None, "again")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def _run(args):
+    game_id = _seed(args.players)
+    for name, manager in (
+        ("sync engine + thread pool", AsyncGameManager),
+        ("AsyncEngine", NativeAsyncGameManager),
+    ):
+        await _workload(manager, game_id, args.players, min(200, args.requests), args.concurrency)
+        rps = await _workload(manager, game_id, args.players, args.requests, args.concurrency)
+        print(f"{name:<28} {rps:10,.0f} req/s")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    init_db()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# tools/bench_draw.py
+# Время жеребьёвки ConstrainedDrawEngine в зависимости от числа участников
+# и плотности запретов (доля запрещённых пар у каждого участника).
+#
+# Запуск: python -m tools.bench_draw [--sizes 10 100 1000 10000 50000] [--densities 0 0.001 0.01 0.1 0.4]
+
+import argparse
+import random
+import time
+
+from app.draw import ConstrainedDrawEngine, DrawInfeasible
+
+# больше запрещённых пар не генерируем — упрёмся в память, а не в алгоритм
+MAX_PAIRS = 2_000_000
+
+
+def _constraints(ids: list, density: float) -> list:
+    per_user = int(len(ids) * density)
+    pairs = []
+    for uid in ids:
+        for other in random.sample(ids, per_user):
+            if other != uid:
+                pairs.append((uid, other))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--densities", type=float, nargs="+", default=[0, 0.001, 0.01, 0.1, 0.4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = ConstrainedDrawEngine()
+    print(f"{'n':>7} {'density':>8} {'pairs':>10} {'best ms':>10}")
+    for size in args.sizes:
+        ids = list(range(1, size + 1))
+        for density in args.densities:
+            if size * size * density / 2 > MAX_PAIRS:
+                print(f"{size:>7} {density:>8} {'skipped':>10}")
+                continue
+
+            exclusions = _constraints(ids, density / 2)
+            avoid = _constraints(ids, density / 2)
+
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                try:
+                    engine.draw(ids, exclusions, avoid)
+                    result = ""
+                except DrawInfeasible:
+                    result = "infeasible"
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            pairs = len(exclusions) + len(avoid)
+            print(f"{size:>7} {density:>8} {pairs:>10} {best * 1000:>10.2f} {result}")
+
+    # Заведомо невыполнимый набор: один участник исключён со всеми
+    ids = list(range(1, 1001))
+    exclusions = [(1, other) for other in ids[1:]]
+    started = time.perf_counter()
+    try:
+        engine.draw(ids, exclusions)
+    except DrawInfeasible:
+        pass
+    print(f"infeasible n=1000 detected in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# tools/bench_dump.py
+# /dump_games: прежняя выгрузка (все игры в память, запрос участников на каждую,
+# jsonify целиком) против потоковой app.export. Печатает время, число запросов
+# и пик памяти (tracemalloc) на БД разного размера, проверяет совпадение данных.
+#
+# Запуск: DATABASE_URL=postgresql://... python -m tools.bench_dump [--games 1000 5000 20000]
+# Без DATABASE_URL используется временный SQLite-файл.
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_dump.db")
+
+from sqlalchemy import event, func  # noqa: E402
+
+from app.database import SessionLocal, engine, init_db  # noqa: E402
+from app.export import ExportFilter, export_chunks  # noqa: E402
+from app.models import Game, Participant  # noqa: E402
+
+GAME_SIZE = 10
+
+
+def legacy_dump() -> str:
+    """Прежняя реализация /dump_games (без Flask: json.dumps вместо jsonify)."""
+    db = SessionLocal()
+    try:
+        games = []
+        for g in db.query(Game).all():
+            participants = []
+            for p in db.query(Participant).filter(Participant.game_id == g.id).all():
+                participants.append({
+                    "user_id": p.user_id,
+                    "username": p.username,
+                    "full_name": p.full_name,
+                    "wishlist": p.wishlist,
+                    "target_id": p.target_id
+                })
+
+            games.append({
+                "id": g.id,
+                "name": g.name,
+                "admin_id": g.admin_id,
+                "admin_username": g.admin_username,
+                "is_active": g.is_active,
+                "is_started": g.is_started,
+                "created_at": g.created_at.isoformat() if g.created_at else None,
+                "started_at": g.started_at.isoformat() if g.started_at else None,
+                "participants": participants
+            })
+
+        return json.dumps({"games": games}, ensure_ascii=False)
+    finally:
+        db.close()
+        SessionLocal.remove()
+
+
+def streamed_dump(sink: list = None) -> int:
+    """Потоковая выгрузка; куски не накапливаются (кроме sink для проверки)."""
+    size = 0
+    for chunk in export_chunks(ExportFilter()):
+        size += len(chunk)
+        if sink is not None:
+            sink.append(chunk)
+    return size
+
+
+def seed(total_games: int):
+    with engine.connect() as conn:
+        have = conn.execute(func.count(Game.__table__.c.id)).scalar()
+    if have >= total_games:
+        return
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(have, total_games, 1000):
+            ids = range(start, min(start + 1000, total_games))
+            conn.execute(Game.__table__.insert(), [
+                {
+                    "id": f"D{i:07d}",
+                    "name": f"Dump game {i}",
+                    "admin_id": 100 + i,
+                    "admin_username": f"admin{i}",
+                    "is_active": i % 3 != 0,
+                    "is_started": i % 2 == 0,
+                    "created_at": now - timedelta(minutes=i),
+                }
+                for i in ids
+            ])
+            conn.execute(Participant.__table__.insert(), [
+                {
+                    "game_id": f"D{i:07d}",
+                    "user_id": 1000 + i * GAME_SIZE + k,
+                    "username": f"user{i}_{k}",
+                    "full_name": f"User {i} {k}",
+                    "wishlist": "книга, носки, шоколад " * 3,
+                }
+                for i in ids for k in range(GAME_SIZE)
+            ])
+    print(f"seeded {total_games} games")
+
+
+def measure(name: str, func, counter: list):
+    counter[0] = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(size, str):
+        size = len(size)
+    print(
+        f"  {name:<10} {elapsed * 1000:9.1f}ms  queries={counter[0]:<6} "
+        f"peak={peak / 2**20:7.1f}MiB  body={size / 2**20:6.1f}MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    init_db()
+    counter = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: counter.__setitem__(0, counter[0] + 1))
+
+    for total in sorted(args.games):
+        seed(total)
+        print(f"-- {total} games, {total * GAME_SIZE} participants")
+        measure("legacy", legacy_dump, counter)
+        measure("streamed", streamed_dump, counter)
+
+        chunks = []
+        streamed_dump(chunks)
+        assert json.loads("".join(chunks)) == json.loads(legacy_dump()), "export differs from legacy"
+
+
+if __name__ == "__main__":
+    main()
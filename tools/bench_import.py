@@ -0,0 +1,85 @@
+# tools/bench_import.py
+# Массовая загрузка участников: разбор CSV и GameManager.bulk_join на 10k строк
+# против вступления по одному (GameManager.join_game, как по ссылке-приглашению).
+# Повторная загрузка того же файла проверяет отчёт о повторах, в конце —
+# сверка счётчиков /status с точными COUNT.
+#
+# Запуск: DATABASE_URL=postgresql://localhost/santa python -m tools.bench_import [--rows 10000]
+# Цель — 10k строк меньше чем за секунду на локальном PostgreSQL.
+# Без DATABASE_URL используется временный SQLite-файл.
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_import.db")
+
+from app.bulk_import import parse_rows  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.manager import GameManager  # noqa: E402
+
+
+def make_csv(rows: int, first_user: int, bad_every: int = 0) -> bytes:
+    lines = ["user_id,username,full_name,wishlist"]
+    for i in range(rows):
+        uid = first_user + i
+        if bad_every and i % bad_every == 0:
+            lines.append(f"x{uid},,Broken row,")
+            continue
+        lines.append(f"{uid},@employee{uid},Сотрудник {uid},\"книга, носки\"")
+    return "\n".join(lines).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--one-by-one", type=int, default=500, help="rows to join one by one for comparison")
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.ERROR)
+    init_db()
+    first_user = int(time.time()) % 1_000_000 * 1000
+
+    game = GameManager.create_game(1, "Bench admin", "Corporate import")
+    body = make_csv(args.rows, first_user, bad_every=1000)
+
+    started = time.perf_counter()
+    report = parse_rows(body, "text/csv")
+    parsed = time.perf_counter()
+    GameManager.bulk_join(game["id"], report)
+    done = time.perf_counter()
+    print(
+        f"bulk import {args.rows} rows: parse {1000 * (parsed - started):.0f}ms, "
+        f"insert {1000 * (done - parsed):.0f}ms, total {1000 * (done - started):.0f}ms "
+        f"({args.rows / (done - started):,.0f} rows/s)"
+    )
+    print(f"  inserted={report.inserted} invalid={len(report.invalid)} duplicates={len(report.duplicates)}")
+
+    again = parse_rows(body, "text/csv")
+    started = time.perf_counter()
+    GameManager.bulk_join(game["id"], again)
+    print(
+        f"same file again: {1000 * (time.perf_counter() - started):.0f}ms, "
+        f"inserted={again.inserted} duplicates={len(again.duplicates)}"
+    )
+
+    other = GameManager.create_game(2, "Bench admin", "One by one")
+    n = args.one_by_one
+    started = time.perf_counter()
+    for i in range(n):
+        uid = first_user + args.rows + i
+        GameManager.join_game(other["id"], uid, f"employee{uid}", f"Сотрудник {uid}")
+    elapsed = time.perf_counter() - started
+    print(
+        f"join_game one by one, {n} rows: {1000 * elapsed:.0f}ms "
+        f"(~{1000 * elapsed * args.rows / n:.0f}ms for {args.rows})"
+    )
+
+    drift = GameManager.reconcile_stats()
+    print("counters drift:", drift or "none")
+
+
+if __name__ == "__main__":
+    main()
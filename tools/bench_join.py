@@ -0,0 +1,99 @@
+# tools/bench_join.py
+# Пропускная способность вступления в игру: много участников одновременно
+# переходят по одной ссылке-приглашению, часть из них жмёт кнопку дважды.
+# Сравнивается прежний путь (SELECT игры, SELECT участника, INSERT) и
+# GameManager.join (INSERT ... ON CONFLICT; на PostgreSQL — один запрос).
+#
+# Запуск: DATABASE_URL=postgresql://... python -m tools.bench_join [--joiners 2000]
+# Без DATABASE_URL используется временный SQLite-файл.
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_join.db")
+
+from sqlalchemy import func  # noqa: E402
+from sqlalchemy.exc import IntegrityError  # noqa: E402
+
+from app.database import SessionLocal, init_db, run_db  # noqa: E402
+from app.manager import GameManager, JoinOutcome  # noqa: E402
+from app.models import Game, Participant  # noqa: E402
+
+
+def legacy_join(game_id: str, user_id: int, tg_username, full_name) -> str:
+    """Вступление в три запроса, как было до ON CONFLICT."""
+    db = SessionLocal()
+    try:
+        game = db.query(Game).filter(Game.id == game_id).first()
+        if not game:
+            return JoinOutcome.NOT_FOUND
+        if game.is_started:
+            return JoinOutcome.STARTED
+        exists = db.query(Participant.id).filter(
+            Participant.game_id == game_id,
+            Participant.user_id == user_id
+        ).first()
+        if exists:
+            return JoinOutcome.ALREADY_JOINED
+        db.add(Participant(game_id=game_id, user_id=user_id, username=tg_username, full_name=full_name))
+        try:
+            db.commit()
+        except IntegrityError:
+            # гонка двойного нажатия: между SELECT и INSERT успел другой запрос
+            db.rollback()
+            return "race_lost"
+        return JoinOutcome.JOINED
+    finally:
+        db.close()
+
+
+def _participants(game_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.count(Participant.id)).filter(Participant.game_id == game_id).scalar()
+    finally:
+        db.close()
+
+
+async def _run(join, joiners: int, double_tap: float, concurrency: int):
+    game_id = GameManager.create_game(1, "Bench", "bench join")["id"]
+    users = list(range(2, joiners + 2))
+    calls = users + random.sample(users, int(joiners * double_tap))
+    random.shuffle(calls)
+
+    sem = asyncio.Semaphore(concurrency)
+    outcomes = Counter()
+
+    async def one(uid: int):
+        async with sem:
+            outcomes[await run_db(join, game_id, uid, f"user{uid}", f"User {uid}")] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(uid) for uid in calls))
+    elapsed = time.perf_counter() - started
+    return len(calls) / elapsed, outcomes, _participants(game_id) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--joiners", type=int, default=2000)
+    parser.add_argument("--double-tap", type=float, default=0.2, help="доля повторных нажатий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    init_db()
+    # медленные вызовы под SQLite ожидаемы — не засоряем вывод
+    logging.getLogger("app").setLevel(logging.ERROR)
+    for name, join in (("select + insert", legacy_join), ("insert on conflict", GameManager.join)):
+        rps, outcomes, joined = asyncio.run(_run(join, args.joiners, args.double_tap, args.concurrency))
+        print(f"{name:<20} {rps:8,.0f} joins/s  participants={joined}/{args.joiners}  {dict(outcomes)}")
+
+
+if __name__ == "__main__":
+    main()
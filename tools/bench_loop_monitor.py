@@ -0,0 +1,75 @@
+# tools/bench_loop_monitor.py
+# Цена LoopMonitor: пропускная способность loop'а (задачи, отдающие управление
+# через asyncio.sleep(0)) без монитора и с ним, затем — обнаружение
+# синхронной блокировки на 0.5 с и сводка как в /loop_health.
+#
+# Запуск: python -m tools.bench_loop_monitor [--tasks 100 --switches 2000]
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from app.loop_monitor import LoopMonitor
+
+
+async def churn(tasks: int, switches: int) -> float:
+    async def one():
+        for _ in range(switches):
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(tasks)))
+    return time.perf_counter() - started
+
+
+def run(tasks: int, switches: int, monitor: LoopMonitor | None) -> float:
+    loop = asyncio.new_event_loop()
+    try:
+        if monitor is not None:
+            monitor.attach(loop)
+        return loop.run_until_complete(churn(tasks, switches))
+    finally:
+        if monitor is not None:
+            monitor.stop()
+            loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+
+
+async def blocking_handler():
+    await asyncio.sleep(0.2)
+    time.sleep(0.5)
+    await asyncio.sleep(0.3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--switches", type=int, default=2000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    total = args.tasks * args.switches
+    bare = min(run(args.tasks, args.switches, None) for _ in range(3))
+    monitored = min(run(args.tasks, args.switches, LoopMonitor()) for _ in range(3))
+    print(f"{total} task switches: bare {total / bare:,.0f}/s, monitored {total / monitored:,.0f}/s "
+          f"({100 * (monitored - bare) / bare:+.1f}%)")
+
+    monitor = LoopMonitor()
+    loop = asyncio.new_event_loop()
+    monitor.attach(loop)
+    loop.run_until_complete(blocking_handler())
+    time.sleep(2 * monitor.interval)
+    monitor.stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+    summary = monitor.summary()
+    for stall in summary["recent"]:
+        stall["stack"] = stall["stack"][-2:]
+    print(json.dumps(summary, indent=1, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
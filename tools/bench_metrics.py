@@ -0,0 +1,76 @@
+# tools/bench_metrics.py
+# Стоимость записи метрик app.metrics и отсутствие потерь при записи из
+# нескольких потоков (для сравнения — наивный общий счётчик без блокировки
+# и счётчик под threading.Lock).
+#
+# Запуск: python -m tools.bench_metrics [--threads 8 --per-thread 200000]
+
+import argparse
+import sys
+import threading
+import timeit
+
+from app.metrics import Counter, Histogram, render
+
+
+def per_call_ns(stmt, number: int = 1_000_000) -> float:
+    return timeit.timeit(stmt, number=number) / number * 1e9
+
+
+def run_threads(threads: int, target):
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--per-thread", type=int, default=200_000)
+    args = parser.parse_args()
+
+    counter = Counter("bench_counter_total", "bench").labels()
+    histogram = Histogram("bench_seconds", "bench").labels()
+    lock = threading.Lock()
+    locked = [0]
+
+    def locked_inc():
+        with lock:
+            locked[0] += 1
+
+    print("-- per call, one thread")
+    print(f"  Counter.inc()          {per_call_ns(counter.inc):6.0f}ns")
+    print(f"  Histogram.observe()    {per_call_ns(lambda: histogram.observe(0.042)):6.0f}ns")
+    print(f"  counter under Lock     {per_call_ns(locked_inc):6.0f}ns")
+
+    # частые переключения потоков, чтобы гонки проявились
+    sys.setswitchinterval(1e-6)
+    expected = args.threads * args.per_thread
+    naive = [0]
+
+    def naive_writer():
+        for _ in range(args.per_thread):
+            naive[0] += 1
+
+    def sharded_writer():
+        for _ in range(args.per_thread):
+            counter.inc()
+            histogram.observe(0.001)
+
+    run_threads(args.threads, naive_writer)
+    before = counter.value()
+    _, hist_before, _ = histogram.snapshot()
+    run_threads(args.threads, sharded_writer)
+    _, hist_after, _ = histogram.snapshot()
+
+    print(f"-- {args.threads} threads x {args.per_thread} increments (expected {expected})")
+    print(f"  shared int, no lock    {naive[0]} (lost {expected - naive[0]})")
+    print(f"  app.metrics Counter    {counter.value() - before} (lost {expected - (counter.value() - before)})")
+    print(f"  app.metrics Histogram  {hist_after - hist_before} (lost {expected - (hist_after - hist_before)})")
+    print(f"  /metrics render        {timeit.timeit(render, number=100) * 10:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
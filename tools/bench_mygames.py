@@ -0,0 +1,140 @@
+# tools/bench_mygames.py
+# /mygames на заполненной БД (~100k участников): прежняя реализация
+# (2N+1 запросов на пользователя в N играх) против одного сгруппированного
+# запроса GameManager.get_user_games с постраничной выдачей.
+#
+# Запуск: DATABASE_URL=postgresql://... python -m tools.bench_mygames [--participants 100000]
+# Без DATABASE_URL используется временный SQLite-файл (заполняется один раз).
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_mygames.db")
+
+from sqlalchemy import event, func  # noqa: E402
+
+from app.database import SessionLocal, engine, init_db  # noqa: E402
+from app.manager import GameManager  # noqa: E402
+from app.models import Game, Participant  # noqa: E402
+
+GAME_SIZE = 20
+POWER_USERS = range(1, 21)
+POWER_USER_GAMES = 60
+
+
+def legacy_user_games(user_id: int):
+    """Прежняя реализация: список игр, затем по запросу Game и COUNT на каждую."""
+    db = SessionLocal()
+    try:
+        game_ids = {
+            gid for (gid,) in db.query(Participant.game_id).filter(Participant.user_id == user_id)
+        }
+        results = []
+        for gid in game_ids:
+            g = db.query(Game).filter(Game.id == gid).first()
+            if not g:
+                continue
+            count = db.query(Participant).filter(Participant.game_id == gid).count()
+            results.append({"id": g.id, "name": g.name, "count": count})
+        return results
+    finally:
+        db.close()
+
+
+def seed(participants: int, users: int):
+    db = SessionLocal()
+    try:
+        have = db.query(func.count(Participant.id)).scalar()
+    finally:
+        db.close()
+    if have >= participants:
+        return
+
+    games = participants // GAME_SIZE
+    now = datetime.utcnow()
+    game_rows = [
+        {
+            "id": f"B{i:07d}",
+            "name": f"Bench game {i}",
+            "admin_id": 100 + i % users,
+            "is_active": i % 3 != 0,
+            "is_started": i % 2 == 0,
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(games)
+    ]
+
+    player_rows = []
+    power_games = {uid: set(random.sample(range(games), POWER_USER_GAMES)) for uid in POWER_USERS}
+    for i in range(games):
+        members = set(random.sample(range(100, 100 + users), GAME_SIZE))
+        members.update(uid for uid, gs in power_games.items() if i in gs)
+        player_rows.extend(
+            {"game_id": f"B{i:07d}", "user_id": uid, "full_name": f"User {uid}"} for uid in members
+        )
+
+    with engine.begin() as conn:
+        conn.execute(Game.__table__.insert(), game_rows)
+        conn.execute(Participant.__table__.insert(), player_rows)
+    print(f"seeded {games} games, {len(player_rows)} participants")
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(name: str, func, user_ids, counter: QueryCounter):
+    timings = []
+    counter.count = 0
+    for uid in user_ids:
+        started = time.perf_counter()
+        func(uid)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(
+        f"{name:<34} avg={statistics.mean(timings):7.2f}ms "
+        f"p95={timings[int(len(timings) * 0.95)]:7.2f}ms "
+        f"queries/call={counter.count / len(user_ids):6.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    init_db()
+    seed(args.participants, args.users)
+    counter = QueryCounter()
+
+    regular = [random.randint(100, 100 + args.users - 1) for _ in range(args.calls)]
+    power = [random.choice(POWER_USERS) for _ in range(args.calls // 4)]
+
+    for label, users in (("regular users", regular), (f"power users ({POWER_USER_GAMES} games)", power)):
+        print(f"-- {label}")
+        measure("legacy 2N+1", legacy_user_games, users, counter)
+        measure("grouped query, first page", GameManager.get_user_games, users, counter)
+
+    pages = -(-POWER_USER_GAMES // 10)
+    measure(
+        f"power users, all {pages} pages",
+        lambda uid: [GameManager.get_user_games(uid, page=p, page_size=10) for p in range(pages)],
+        power,
+        counter,
+    )
+
+
+if __name__ == "__main__":
+    main()
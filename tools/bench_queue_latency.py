@@ -0,0 +1,122 @@
+# tools/bench_queue_latency.py
+# Микробенчмарк задержки enqueue -> handler: простой (по одному апдейту)
+# и под нагрузкой (пачка апдейтов из потока Flask). Параллельно меряется
+# максимальная задержка event loop'а — насколько очередь его блокирует.
+#
+# Запуск: python -m tools.bench_queue_latency [--idle 200] [--burst 20000]
+
+import argparse
+import asyncio
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+
+from app.update_queue import SQLiteQueueBackend, UpdateQueue
+
+
+def _report(title: str, result: tuple[list[float], float]):
+    samples, max_lag = result
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+    print(
+        f"{title:<32} n={len(samples):<6} "
+        f"p50={p(0.50):9.1f}us p95={p(0.95):9.1f}us p99={p(0.99):9.1f}us "
+        f"mean={statistics.mean(samples) * 1e6:9.1f}us max_loop_lag={max_lag * 1e3:7.1f}ms"
+    )
+
+
+async def _consume_new(q: UpdateQueue, n: int, out: list):
+    while len(out) < n:
+        for item in await q.get_batch(64):
+            out.append(time.perf_counter() - item.update["t"])
+            q.ack(item)
+
+
+async def _consume_legacy(q: queue.Queue, n: int, out: list):
+    # старый цикл process_queue: блокирующий get(timeout=1) + sleep(0.1)
+    got = 0
+    while got < n:
+        try:
+            item = q.get(timeout=1)
+        except queue.Empty:
+            await asyncio.sleep(0.1)
+            continue
+        out.append(time.perf_counter() - item["t"])
+        got += 1
+
+
+_TICK = 0.001
+
+
+async def _heartbeat(lag: list):
+    while True:
+        lag[1] = time.perf_counter()
+        await asyncio.sleep(_TICK)
+        lag[0] = max(lag[0], time.perf_counter() - lag[1] - _TICK)
+
+
+async def _measure(consume, q, n: int, out: list, lag: list):
+    hb = asyncio.ensure_future(_heartbeat(lag))
+    await asyncio.sleep(0)
+    await consume(q, n, out)
+    if isinstance(q, UpdateQueue):
+        await q.flush()
+    # если consumer ни разу не отдал управление, heartbeat простоял всё время
+    lag[0] = max(lag[0], time.perf_counter() - lag[1] - _TICK)
+    hb.cancel()
+
+
+def _run(make_queue, consume, producer_gap: float, n: int) -> tuple[list[float], float]:
+    q = make_queue()
+    out = []
+    lag = [0.0, time.perf_counter()]
+    loop = asyncio.new_event_loop()
+    if isinstance(q, UpdateQueue):
+        q.bind(loop)
+
+    def producer():
+        for i in range(n):
+            q.put({"update_id": i, "t": time.perf_counter()})
+            if producer_gap:
+                time.sleep(producer_gap)
+
+    t = threading.Thread(target=producer)
+    t.start()
+    loop.run_until_complete(_measure(consume, q, n, out, lag))
+    t.join()
+    loop.close()
+    return out, lag[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--idle", type=int, default=200, help="апдейтов в простое")
+    parser.add_argument("--burst", type=int, default=20000, help="апдейтов под нагрузкой")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_queue.db")
+
+    def sqlite_queue():
+        return UpdateQueue(SQLiteQueueBackend(path))
+
+    _report("idle / UpdateQueue", _run(UpdateQueue, _consume_new, 0.005, args.idle))
+    _report("idle / UpdateQueue(sqlite)", _run(sqlite_queue, _consume_new, 0.005, args.idle))
+    _report("idle / legacy queue.Queue", _run(queue.Queue, _consume_legacy, 0.005, args.idle))
+
+    for title, make_queue, consume in (
+        ("saturated / UpdateQueue", UpdateQueue, _consume_new),
+        ("saturated / UpdateQueue(sqlite)", sqlite_queue, _consume_new),
+        ("saturated / legacy", queue.Queue, _consume_legacy),
+    ):
+        started = time.perf_counter()
+        result = _run(make_queue, consume, 0, args.burst)
+        elapsed = time.perf_counter() - started
+        _report(title, result)
+        print(f"{'':<32} throughput={args.burst / elapsed:,.0f} updates/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# tools/bench_render.py
+# Стоимость подготовки сообщений: прежний код обработчиков (str.format по
+# MESSAGES, список строк, новая InlineKeyboardMarkup на каждый /start и её
+# сериализация в aiogram) против app.rendering. Игры на 10 и 1000 участников.
+# Заодно проверяет, что на данных без HTML-символов тексты совпадают.
+# Прежний код значения не экранировал, поэтому тексты с подстановками в новом
+# коде дороже на стоимость escape(); выигрыш — в готовых клавиатурах.
+#
+# Запуск: python -m tools.bench_render [--sizes 10 1000]
+
+import argparse
+import timeit
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.payload import prepare_arg
+
+from app.messages import MESSAGES
+from app.rendering import (
+    assignment_text, gameinfo_text, main_menu_keyboard, my_targets_text, players_text, render
+)
+from app.utils import username_is_valid_for_link
+
+
+# -------------------- прежний код из app/worker.py --------------------
+
+def legacy_main_menu_keyboard(is_admin: bool = False):
+    kb = InlineKeyboardMarkup(row_width=2)
+    kb.add(
+        InlineKeyboardButton("🆕 Создать игру", callback_data="menu_newgame"),
+        InlineKeyboardButton("🎯 Мои получатели", callback_data="menu_mytargets"),
+    )
+    kb.add(
+        InlineKeyboardButton("📋 Мои игры", callback_data="menu_mygames"),
+        InlineKeyboardButton("👥 Участники", callback_data="menu_players"),
+    )
+    kb.add(
+        InlineKeyboardButton("ℹ️ Статус", callback_data="menu_status"),
+        InlineKeyboardButton("❓ Помощь", callback_data="menu_help"),
+    )
+    if is_admin:
+        kb.add(
+            InlineKeyboardButton("🎲 Запустить жеребьёвку", callback_data="menu_startgame"),
+            InlineKeyboardButton("🏁 Завершить игру", callback_data="menu_finishgame"),
+        )
+    return kb
+
+
+def legacy_players(info):
+    lines = []
+    for i, part in enumerate(info["participants"], 1):
+        uname = part["username"] or part["full_name"] or str(part["user_id"])
+        if username_is_valid_for_link(part["username"]):
+            link = f"<a href=\"https://t.me/{part['username']}\">{uname}</a>"
+        else:
+            link = uname
+
+        creator_mark = " 👑" if part["user_id"] == info["creator_id"] else ""
+        wishlist_mark = " 📝" if part["has_wishlist"] else " ❔"
+
+        lines.append(f"{i}. {link}{creator_mark}{wishlist_mark}")
+
+    return MESSAGES["participants_header"].format(name=info["name"]) + "\n" + "\n".join(lines)
+
+
+def legacy_gameinfo(info):
+    status_map = {
+        "waiting": "Ожидание игроков",
+        "active": "Игра началась",
+        "finished": "Игра завершена"
+    }
+
+    extra = ""
+    if info["participants"]:
+        extra_lines = []
+        for p in info["participants"]:
+            uname = p.get("username") or p.get("full_name") or str(p.get("user_id"))
+            mark = "📝" if p.get("has_wishlist") else "❔"
+
+            if username_is_valid_for_link(p.get("username")):
+                extra_lines.append(f"- <a href=\"https://t.me/{p.get('username')}\">{uname}</a> {mark}")
+            else:
+                extra_lines.append(f"- {uname} {mark}")
+
+        extra = "\n".join(extra_lines)
+
+    return MESSAGES["gameinfo"].format(
+        name=info["name"],
+        code=info["id"],
+        creator=info["creator_name"],
+        status=status_map.get(info["status"], info["status"]),
+        budget=info["budget"],
+        created=info["created_at"][:10] if info["created_at"] else "",
+        count=len(info["participants"]),
+        extra=extra,
+    )
+
+
+def legacy_my_targets(results):
+    lines = []
+    for r in results:
+        if not r.get("target_id"):
+            lines.append(f"<b>Игра:</b> {r['game_name']} — получатель: ❌ не назначен")
+            continue
+
+        display = r.get("target_username") or r.get("target_full_name") or str(r["target_id"])
+        wishlist = r.get("target_wishlist") or "Пожелания не указаны"
+
+        if username_is_valid_for_link(r.get("target_username")):
+            lines.append(
+                f"<b>Игра:</b> {r['game_name']}\n"
+                f"<b>Получатель:</b> <a href=\"https://t.me/{r['target_username']}\">{display}</a>\n"
+                f"<b>Пожелания:</b> {wishlist}"
+            )
+        else:
+            lines.append(
+                f"<b>Игра:</b> {r['game_name']}\n"
+                f"<b>Получатель:</b> {display}\n"
+                f"<b>Пожелания:</b> {wishlist}"
+            )
+    return "\n\n".join(lines)
+
+
+def legacy_assignments(game_name, assignments):
+    return [
+        MESSAGES["startgame_notify"].format(
+            game_name=game_name,
+            display=a["target_username"] or a["target_full_name"] or str(a["target_id"]),
+            wishlist=a["target_wishlist"] or "Пожелания не указаны"
+        )
+        for a in assignments
+    ]
+
+
+# -------------------- данные --------------------
+
+def game_info(size: int) -> dict:
+    return {
+        "id": "ABCD1234",
+        "name": "Новый год в офисе",
+        "creator_id": 1,
+        "creator_name": "Организатор",
+        "status": "waiting",
+        "budget": "1500 ₽",
+        "created_at": "2026-12-01T10:00:00",
+        "participants": [
+            {
+                "user_id": i,
+                "username": f"employee_{i}" if i % 3 else None,
+                "full_name": f"Сотрудник Номер {i}",
+                "has_wishlist": i % 2 == 0,
+            }
+            for i in range(1, size + 1)
+        ],
+    }
+
+
+def assignments(size: int) -> list:
+    return [
+        {
+            "user_id": i,
+            "target_id": i % size + 1,
+            "target_username": f"employee_{i}" if i % 3 else None,
+            "target_full_name": f"Сотрудник Номер {i}",
+            "target_wishlist": "книга, носки" if i % 2 else None,
+        }
+        for i in range(1, size + 1)
+    ]
+
+
+def targets() -> list:
+    return [
+        {
+            "game_id": f"G{i}",
+            "game_name": f"Игра {i}",
+            "target_id": 100 + i,
+            "target_username": f"friend_{i}" if i % 2 else None,
+            "target_full_name": f"Друг {i}",
+            "target_wishlist": "шоколад",
+        }
+        for i in range(5)
+    ]
+
+
+def bench(label: str, legacy, new, number: int):
+    assert legacy() == new(), f"{label}: output differs"
+    old_us = timeit.timeit(legacy, number=number) / number * 1e6
+    new_us = timeit.timeit(new, number=number) / number * 1e6
+    print(f"  {label:<34} legacy={old_us:9.1f}us  new={new_us:9.1f}us  x{old_us / new_us:5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000])
+    args = parser.parse_args()
+
+    print("-- per message")
+    bench(
+        "/start menu (build + serialize)",
+        lambda: prepare_arg(legacy_main_menu_keyboard(is_admin=True)),
+        lambda: main_menu_keyboard(is_admin=True),
+        5000,
+    )
+    stats = dict(total=10, active=3, waiting=5, finished=2, players=40, queue=0, in_flight=1)
+    bench("/status", lambda: MESSAGES["status"].format(**stats), lambda: render("status", **stats), 20000)
+    rows = targets()
+    bench("/mytargets (5 games)", lambda: legacy_my_targets(rows), lambda: my_targets_text(rows), 20000)
+
+    for size in args.sizes:
+        info = game_info(size)
+        number = max(20, 20000 // size)
+        print(f"-- game with {size} participants")
+        bench("/players", lambda: legacy_players(info), lambda: players_text(info), number)
+        bench("/gameinfo", lambda: legacy_gameinfo(info), lambda: gameinfo_text(info), number)
+        pairs = assignments(size)
+        bench(
+            "startgame DMs (all participants)",
+            lambda: legacy_assignments(info["name"], pairs),
+            lambda: [assignment_text(info["name"], a) for a in pairs],
+            number,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# tools/bench_start_game.py
+# Время GameManager.start_game для игр на 10 / 1 000 / 50 000 участников
+# в сравнении с прежней реализацией (2N+2 запроса).
+#
+# Запуск: DATABASE_URL=postgresql://... python -m tools.bench_start_game [--sizes 10 1000 50000]
+# Без DATABASE_URL используется временный SQLite-файл.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/santa_bench_start.db")
+
+from app.database import SessionLocal, engine, init_db  # noqa: E402
+from app.manager import GameManager  # noqa: E402
+from app.models import Game, Participant  # noqa: E402
+from app.utils import generate_game_id  # noqa: E402
+
+
+def _seed(size: int) -> str:
+    game_id = generate_game_id()
+    with engine.begin() as conn:
+        conn.execute(Game.__table__.insert(), {
+            "id": game_id, "name": f"bench {size}", "admin_id": 1,
+            "is_active": True, "is_started": False, "created_at": datetime.utcnow(),
+        })
+        rows = [
+            {"game_id": game_id, "user_id": uid, "username": f"user{uid}", "full_name": f"User {uid}"}
+            for uid in range(1, size + 1)
+        ]
+        for i in range(0, len(rows), 5000):
+            conn.execute(Participant.__table__.insert(), rows[i:i + 5000])
+    return game_id
+
+
+def _legacy_start_game(game_id: str):
+    """Прежний алгоритм: два SELECT на каждого участника."""
+    db = SessionLocal()
+    try:
+        game = db.query(Game).filter(Game.id == game_id).first()
+        participants = db.query(Participant).filter(Participant.game_id == game_id).all()
+        user_ids = [p.user_id for p in participants]
+        random.shuffle(user_ids)
+        for i, giver_id in enumerate(user_ids):
+            receiver_id = user_ids[(i + 1) % len(user_ids)]
+            giver = db.query(Participant).filter(
+                Participant.game_id == game_id, Participant.user_id == giver_id
+            ).first()
+            giver.target_id = receiver_id
+            db.query(Participant).filter(
+                Participant.game_id == game_id, Participant.user_id == receiver_id
+            ).first()
+        game.is_started = True
+        db.commit()
+    finally:
+        db.close()
+
+
+def _count_queries():
+    from sqlalchemy import event
+
+    counter = [0]
+
+    def before(*_):
+        counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before)
+    return counter, lambda: event.remove(engine, "before_cursor_execute", before)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--legacy-max", type=int, default=1000, help="старый алгоритм только до этого размера")
+    args = parser.parse_args()
+
+    init_db()
+    for size in args.sizes:
+        variants = [("bulk", lambda gid: GameManager.start_game(gid, 1))]
+        if size <= args.legacy_max:
+            variants.append(("legacy", _legacy_start_game))
+
+        for name, run in variants:
+            game_id = _seed(size)
+            counter, stop = _count_queries()
+            started = time.perf_counter()
+            run(game_id)
+            elapsed = time.perf_counter() - started
+            stop()
+            print(f"n={size:<7} {name:<7} {elapsed * 1000:10.1f} ms  queries={counter[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# tools/check_query_plans.py
+# Регрессионная проверка планов горячих запросов app/manager.py: каждый запрос
+# прогоняется через EXPLAIN на текущей БД (DATABASE_URL), и если хоть один
+# читает таблицу полным перебором, скрипт завершается с кодом 1.
+#
+# PostgreSQL: на маленьких таблицах планировщик и так выберет Seq Scan, поэтому
+# проверка идёт с enable_seqscan = off — Seq Scan останется только там, где
+# подходящего индекса нет вовсе.
+# SQLite: ищем строки плана вида "SCAN <таблица>" без индекса.
+#
+# Запуск: python -m tools.check_query_plans
+
+import os
+import re
+import sys
+
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/check_query_plans.db")
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.orm import aliased  # noqa: E402
+
+from app.database import engine, init_db  # noqa: E402
+from app.manager import my_targets_query, user_games_query  # noqa: E402
+from app.models import Exclusion, Game, Participant  # noqa: E402
+
+GAME_ID = "ABCD1234"
+USER_ID = 42
+
+
+def hot_queries() -> dict:
+    """Запросы той же формы, что в GameManager."""
+    target = aliased(Participant)
+    return {
+        "participant by game and user (join_game, participant_exists)": select(Participant.id).where(
+            Participant.game_id == GAME_ID, Participant.user_id == USER_ID
+        ).limit(1),
+        "participants of game (start_game, get_game_info)": select(Participant.id, Participant.user_id).where(
+            Participant.game_id == GAME_ID
+        ),
+        "latest participation (set_wishlist, get_last_game_id)": select(Participant.game_id).where(
+            Participant.user_id == USER_ID
+        ).order_by(Participant.id.desc()).limit(1),
+        "admin has active games (has_active_games)": select(Game.id).where(
+            Game.admin_id == USER_ID, Game.is_active == True  # noqa: E712
+        ).limit(1),
+        "startable game (get_startable_game)": select(Game.id).where(
+            Game.admin_id == USER_ID, Game.is_started == False, Game.is_active == True  # noqa: E712
+        ).order_by(Game.created_at.desc()).limit(1),
+        "previous started game (load_draw_constraints)": select(Game.id).where(
+            Game.admin_id == USER_ID, Game.id != GAME_ID, Game.started_at.isnot(None)
+        ).order_by(Game.started_at.desc()).limit(1),
+        "exclusions of game (load_draw_constraints)": select(Exclusion.user_a, Exclusion.user_b).where(
+            Exclusion.game_id == GAME_ID
+        ),
+        "santa -> target pairs (get_assignments)": select(Participant.user_id, target.username).outerjoin(
+            target,
+            (target.game_id == Participant.game_id) & (target.user_id == Participant.target_id)
+        ).where(Participant.game_id == GAME_ID),
+        "games of user with player counts (get_user_games)": user_games_query(USER_ID),
+        "targets of user with names (get_my_targets)": my_targets_query(USER_ID),
+    }
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(conn, stmt) -> tuple[list[str], list[str]]:
+    """(строки плана, найденные полные сканы таблиц)"""
+    if conn.dialect.name == "postgresql":
+        plan = [row[0] for row in conn.execute(text("EXPLAIN " + _sql(stmt)))]
+        return plan, [line.strip() for line in plan if "Seq Scan" in line]
+
+    plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + _sql(stmt)))]
+    scans = [line for line in plan if re.match(r"SCAN \w+( AS \w+)?$", line.strip())]
+    return plan, scans
+
+
+def main() -> int:
+    init_db()
+    failed = 0
+
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET enable_seqscan = off"))
+
+        for name, stmt in hot_queries().items():
+            plan, scans = explain(conn, stmt)
+            status = "FAIL" if scans else "ok"
+            print(f"[{status}] {name}")
+            if scans:
+                failed += 1
+                for line in plan:
+                    print(f"       {line}")
+
+    print(f"{failed} of {len(hot_queries())} hot queries use a sequential scan")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# tools/fake_bot_api.py
+# Локальная замена Telegram Bot API для нагрузочных тестов (aiohttp).
+# Бот направляется на неё через TELEGRAM_API_SERVER=http://127.0.0.1:<port>.
+#
+# Отвечает на sendMessage, editMessageText, answerCallbackQuery, setWebhook,
+# deleteWebhook, getWebhookInfo и getMe; на прочие методы — true. Задержка
+# ответа, доля ответов 429 с retry_after и доля ошибок 500 настраиваются при
+# запуске и на лету: POST /_config {"latency": 0.05, "p429": 0.01}.
+# GET /_stats — число вызовов по методам и внесённых сбоев.
+#
+# В одном процессе с генератором нагрузки (tools.load_e2e) wait_for() даёт
+# future, который завершится, когда бот отправит сообщение в нужный чат, —
+# так меряется время от webhook до ответа пользователю.
+#
+# Запуск отдельно: python -m tools.fake_bot_api [--port 8081 --latency-ms 30 --p429 0.01]
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+# Методы, ответ на которые — отправленное сообщение
+_MESSAGE_METHODS = {"sendmessage", "editmessagetext"}
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: ответы, внесённые сбои и ожидание сообщений в чаты."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, p429: float = 0.0,
+                 retry_after: int = 1, fail_rate: float = 0.0, seed: int | None = None):
+        self.config = {
+            "latency": latency,          # базовая задержка ответа, сек
+            "jitter": jitter,            # + равномерно от 0 до jitter, сек
+            "p429": p429,                # доля ответов 429 Too Many Requests
+            "retry_after": retry_after,  # retry_after в ответе 429, сек
+            "fail_rate": fail_rate,      # доля ответов 500
+        }
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        # чат (или ("callback", id)) -> [(predicate, future)]
+        self._waiters = collections.defaultdict(list)
+        self.calls = collections.Counter()
+        self.injected_429 = 0
+        self.injected_failures = 0
+        self.unsolicited = 0
+
+    # -------------------- ожидание сообщений --------------------
+
+    def wait_for(self, key, predicate=None) -> asyncio.Future:
+        """Future (perf_counter, текст), завершаемый следующим сообщением в чат key.
+
+        predicate(text) отбирает нужное сообщение; для answerCallbackQuery
+        key — ("callback", callback_query_id). Вызывать из loop'а сервера.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key].append((predicate, future))
+        return future
+
+    def _deliver(self, key, text: str):
+        waiters = self._waiters.get(key, ())
+        for predicate, future in waiters:
+            if not future.done() and (predicate is None or predicate(text)):
+                future.set_result((time.perf_counter(), text))
+                break
+        else:
+            self.unsolicited += 1
+        if waiters:
+            # завершённые и отменённые ожидания больше не нужны
+            waiters[:] = [w for w in waiters if not w[1].done()]
+            if not waiters:
+                del self._waiters[key]
+
+    # -------------------- HTTP --------------------
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        app.router.add_get("/_stats", self._stats)
+        app.router.add_post("/_config", self._config)
+        return app
+
+    async def _params(self, request: web.Request) -> dict:
+        params = dict(request.query)
+        if request.method == "POST":
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    def _fault(self):
+        cfg = self.config
+        if cfg["p429"] and self._random.random() < cfg["p429"]:
+            self.injected_429 += 1
+            retry_after = int(cfg["retry_after"])
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        if cfg["fail_rate"] and self._random.random() < cfg["fail_rate"]:
+            self.injected_failures += 1
+            return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500)
+        return None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        cfg = self.config
+        delay = cfg["latency"] + (self._random.uniform(0, cfg["jitter"]) if cfg["jitter"] else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        fault = self._fault()
+        if fault is not None:
+            return fault
+
+        if method in _MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id") or 0)
+            text = params.get("text", "")
+            self._deliver(chat_id, text)
+            return web.json_response({"ok": True, "result": {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text,
+            }})
+        if method == "answercallbackquery":
+            self._deliver(("callback", params.get("callback_query_id")), "")
+            return web.json_response({"ok": True, "result": True})
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake Santa", "username": "fake_santa_bot",
+            }})
+        if method == "getwebhookinfo":
+            return web.json_response({"ok": True, "result": {
+                "url": "", "has_custom_certificate": False, "pending_update_count": 0,
+            }})
+        # setWebhook, deleteWebhook и прочее
+        return web.json_response({"ok": True, "result": True})
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "injected_429": self.injected_429,
+            "injected_failures": self.injected_failures,
+            "unsolicited_messages": self.unsolicited,
+            "config": dict(self.config),
+        }
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def _config(self, request: web.Request) -> web.Response:
+        try:
+            changes = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": "JSON body expected"}, status=400)
+        unknown = set(changes) - set(self.config)
+        if unknown:
+            return web.json_response({"error": f"unknown settings: {sorted(unknown)}"}, status=400)
+        self.config.update(changes)
+        return web.json_response(self.config)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        """Запускает сервер в текущем event loop'е; остановка — await runner.cleanup()."""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="+ случайно до стольких мс")
+    parser.add_argument("--p429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, сек")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 500")
+
+
+def from_args(args) -> FakeBotAPI:
+    return FakeBotAPI(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        p429=args.p429,
+        retry_after=args.retry_after,
+        fail_rate=args.fail_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    print(f"Fake Bot API on http://{args.host}:{args.port} (TELEGRAM_API_SERVER for the bot)")
+    web.run_app(from_args(args).app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
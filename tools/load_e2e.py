@@ -0,0 +1,287 @@
+# tools/load_e2e.py
+# Сквозной нагрузочный тест без настоящего Telegram: синтетические пользователи
+# шлют апдейты в /webhook/<token>, бот отвечает в заглушку Bot API
+# (tools.fake_bot_api). Задержка операции — от POST апдейта до сообщения,
+# которое бот отправил в чат пользователя (для кнопок — до answerCallbackQuery).
+#
+# Сценарий:
+#   setup     администраторы: /start, /newgame, название игры -> код игры
+#   join      пользователи: /start join_<код>, /wish ...
+#   startgame администраторы: /startgame; отдельно — время до отчёта о рассылке
+#   play      пользователи: /mytargets, кнопка «Мои игры»
+# Для каждой операции — p50/p95/p99/max и пропускная способность по фазам.
+#
+# Запуск: python -m tools.load_e2e [--users 1000 --games 10 --concurrency 200]
+#         [--latency-ms 30 --p429 0.01 --fail-rate 0.001]
+# По умолчанию приложение (app.webhook_app с воркером) поднимается в этом же
+# процессе на werkzeug с временной SQLite-базой. С --url нагрузка идёт на уже
+# запущенный сервер; его TELEGRAM_API_SERVER должен указывать на
+# http://127.0.0.1:<--fake-port>, а BOT_TOKEN совпадать с --token.
+
+import argparse
+import asyncio
+import collections
+import itertools
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+from tools.fake_bot_api import add_fault_arguments, from_args
+
+CODE_RE = re.compile(r"<code>([^<]+)</code>")
+
+
+def _setup_env(args):
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load_e2e.db")
+    os.environ["BOT_TOKEN"] = args.token
+    os.environ.setdefault("BOT_USERNAME", "load_test_bot")
+    os.environ.setdefault("WEBHOOK_HOST", "localhost")
+    os.environ["WORKER_ROLE"] = "all"
+    os.environ["TELEGRAM_API_SERVER"] = f"http://127.0.0.1:{args.fake_port}"
+    if args.broadcast_rate:
+        os.environ["BROADCAST_RATE"] = str(args.broadcast_rate)
+
+
+def _start_app() -> str:
+    """Поднимает app.webhook_app на свободном порту в фоновом потоке; базовый URL."""
+    from werkzeug.serving import make_server
+
+    from app.webhook_app import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-e2e-http", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+# -------------------- апдейты --------------------
+
+_update_ids = itertools.count(int(time.time()) * 1000)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}", "username": f"load_user_{user_id}"}
+
+
+def message(user_id: int, text: str) -> dict:
+    update_id = next(_update_ids)
+    msg = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def callback(user_id: int, data: str) -> dict:
+    update_id = next(_update_ids)
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id),
+        "from": _user(user_id),
+        "chat_instance": "load",
+        "data": data,
+        "message": {
+            "message_id": 1, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "menu",
+        },
+    }}
+
+
+# -------------------- замеры --------------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()     # (операция, причина)
+        self.webhook = collections.Counter()    # ответ webhook'а
+        self.phases = []                        # (фаза, апдейтов, секунд)
+        self.updates = 0
+
+    def report(self):
+        print(f"{'operation':<22}{'ok':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name in sorted(set(self.latencies) | {name for name, _ in self.errors}):
+            values = sorted(self.latencies.get(name, ()))
+            errors = sum(count for (op, _), count in self.errors.items() if op == name)
+            pct = lambda q: 1000 * values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")  # noqa: E731
+            print(
+                f"{name:<22}{len(values):>7}{errors:>8}{pct(0.5):>10.1f}{pct(0.95):>10.1f}"
+                f"{pct(0.99):>10.1f}{1000 * values[-1] if values else float('nan'):>10.1f}"
+            )
+        print()
+        for phase, updates, seconds in self.phases:
+            print(f"phase {phase:<10} {updates:>7} updates in {seconds:7.2f}s  {updates / seconds:8.1f} upd/s")
+        total_seconds = sum(seconds for _, _, seconds in self.phases)
+        print(f"total {'':<10} {self.updates:>7} updates in {total_seconds:7.2f}s  "
+              f"{self.updates / total_seconds:8.1f} upd/s")
+        print("webhook responses:", dict(self.webhook))
+        if self.errors:
+            print("errors:", {f"{op}: {reason}": count for (op, reason), count in self.errors.items()})
+
+
+class Client:
+    """Шлёт апдейты в webhook и ждёт ответов в заглушке Bot API."""
+
+    def __init__(self, session: aiohttp.ClientSession, webhook_url: str, api, recorder: Recorder, timeout: float):
+        self.session = session
+        self.webhook_url = webhook_url
+        self.api = api
+        self.recorder = recorder
+        self.timeout = timeout
+
+    async def send(self, name: str, update: dict, key, predicate=None, extra=None):
+        """Операция name: апдейт и ожидание ответа; текст ответа или None при ошибке.
+
+        extra — уже зарегистрированные ожидания (например, отчёт о рассылке):
+        при отказе webhook'а они отменяются.
+        """
+        reply = self.api.wait_for(key, predicate)
+        started = time.perf_counter()
+        self.recorder.updates += 1
+        try:
+            async with self.session.post(self.webhook_url, json=update) as resp:
+                body = await resp.json(content_type=None)
+        except aiohttp.ClientError as e:
+            body = {"status": f"http error {type(e).__name__}"}
+        status = (body or {}).get("status", "unknown")
+        self.recorder.webhook[status] += 1
+
+        if status != "queued":
+            reply.cancel()
+            for future in extra or ():
+                future.cancel()
+            self.recorder.errors[(name, f"webhook {status}")] += 1
+            return None
+
+        try:
+            at, text = await asyncio.wait_for(reply, self.timeout)
+        except asyncio.TimeoutError:
+            self.recorder.errors[(name, "timeout")] += 1
+            return None
+        self.recorder.latencies[name].append(at - started)
+        return text
+
+    async def wait(self, name: str, future: asyncio.Future, started: float):
+        try:
+            at, _ = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.recorder.errors[(name, "timeout")] += 1
+        except asyncio.CancelledError:
+            return
+        else:
+            self.recorder.latencies[name].append(at - started)
+
+
+# -------------------- сценарий --------------------
+
+async def _phase(recorder: Recorder, name: str, coros, concurrency: int):
+    limit = asyncio.Semaphore(concurrency)
+    before = recorder.updates
+
+    async def limited(coro):
+        async with limit:
+            await coro
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(c) for c in coros))
+    recorder.phases.append((name, recorder.updates - before, time.perf_counter() - started))
+
+
+async def run_scenario(args, api, base_url: str) -> Recorder:
+    from app.messages import MESSAGES
+
+    report_marker = MESSAGES["delivery_report"].strip().splitlines()[0]
+    recorder = Recorder()
+    admins = [1_000_000 + i for i in range(args.games)]
+    users = [2_000_000 + i for i in range(args.users)]
+    codes = {}
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = Client(session, f"{base_url}/webhook/{args.token}", api, recorder, args.timeout)
+
+        async def setup(admin):
+            await client.send("start", message(admin, "/start"), admin)
+            await client.send("newgame", message(admin, "/newgame"), admin)
+            text = await client.send("newgame name", message(admin, f"Load game {admin}"), admin,
+                                     lambda t: "<code>" in t)
+            if text:
+                codes[admin] = CODE_RE.search(text).group(1)
+
+        async def join(i, user):
+            code = codes.get(admins[i % len(admins)])
+            if code is None:
+                recorder.errors[("start join", "no game")] += 1
+                return
+            await client.send("start join", message(user, f"/start join_{code}"), user)
+            await client.send("wish", message(user, f"/wish книга {user}"), user)
+
+        async def startgame(admin):
+            if admin not in codes:
+                return
+            delivered = api.wait_for(admin, lambda t: report_marker in t)
+            started = time.perf_counter()
+            if await client.send("startgame", message(admin, "/startgame"), admin, extra=[delivered]) is not None:
+                await client.wait("startgame broadcast", delivered, started)
+
+        async def play(user):
+            await client.send("mytargets", message(user, "/mytargets"), user)
+            update = callback(user, "menu_mygames")
+            await client.send("button mygames", update, ("callback", update["callback_query"]["id"]))
+
+        await _phase(recorder, "setup", [setup(a) for a in admins], args.concurrency)
+        await _phase(recorder, "join", [join(i, u) for i, u in enumerate(users)], args.concurrency)
+        await _phase(recorder, "startgame", [startgame(a) for a in admins], args.concurrency)
+        await _phase(recorder, "play", [play(u) for u in users], args.concurrency)
+    return recorder
+
+
+async def main_async(args):
+    api = from_args(args)
+    runner = await api.start("127.0.0.1", args.fake_port)
+    try:
+        base_url = args.url.rstrip("/") if args.url else await asyncio.to_thread(_start_app)
+        # воркер в фоне поднимает свой event loop
+        await asyncio.sleep(0.5)
+        print(f"users={args.users} games={args.games} concurrency={args.concurrency} "
+              f"bot_api latency={args.latency_ms}ms+{args.jitter_ms}ms p429={args.p429} fail_rate={args.fail_rate}")
+        recorder = await run_scenario(args, api, base_url)
+    finally:
+        await runner.cleanup()
+
+    print()
+    recorder.report()
+    print("bot api:", api.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременно действующих пользователей")
+    parser.add_argument("--timeout", type=float, default=15.0, help="ожидание ответа на операцию, сек")
+    parser.add_argument("--url", help="уже запущенный сервер вместо приложения в этом процессе")
+    parser.add_argument("--token", default="0:load-test")
+    parser.add_argument("--fake-port", type=int, default=18081)
+    parser.add_argument("--broadcast-rate", type=float, default=0,
+                        help="BROADCAST_RATE для приложения в этом процессе (0 — как в приложении)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    if args.users < 3 * args.games:
+        parser.error("need at least 3 users per game to start the draw")
+    if not args.url:
+        _setup_env(args)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# tools/load_ingress.py
+# Нагрузочный тест backpressure на /webhook: несколько потоков шлют апдейты
+# быстрее, чем медленный обработчик успевает их разбирать.
+# Показывает, что очередь не растёт выше UPDATE_QUEUE_MAX, при перегрузке
+# отбрасываются только малоценные апдейты, а команды доходят (или получают 503).
+#
+# Запуск: python -m tools.load_ingress [--seconds 10] [--drain-rate 300] [--max-depth 2000]
+# Нужны только переменные окружения по умолчанию: БД — временный SQLite-файл.
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+
+def _setup_env(args):
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load_ingress.db")
+    os.environ.setdefault("BOT_TOKEN", "0:load-test")
+    os.environ.setdefault("BOT_USERNAME", "load_test_bot")
+    os.environ.setdefault("WEBHOOK_HOST", "localhost")
+    os.environ["WORKER_ROLE"] = "web"
+    os.environ["UPDATE_QUEUE_MAX"] = str(args.max_depth)
+    os.environ["UPDATE_QUEUE_HIGH"] = str(args.max_depth * 8 // 10)
+    os.environ["UPDATE_QUEUE_LOW"] = str(args.max_depth // 2)
+
+
+def _update(update_id: int, user_id: int) -> dict:
+    frm = {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    kind = random.random()
+    if kind < 0.2:
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": frm, "chat_instance": "x", "data": "menu_status",
+            "message": {"message_id": 1, "date": 0, "chat": chat, "text": "menu"},
+        }}
+    text = "привет" if kind < 0.4 else random.choice(["/mytargets", "/join ABCD1234", "/startgame"])
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": chat, "from": frm, "text": text,
+    }}
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0, help="длительность всплеска")
+    parser.add_argument("--senders", type=int, default=4, help="потоков-отправителей")
+    parser.add_argument("--drain-rate", type=float, default=300.0, help="апдейтов/с у обработчика")
+    parser.add_argument("--max-depth", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+
+    _setup_env(args)
+    from app.dispatcher import UpdateDispatcher
+    from app.webhook_app import WEBHOOK_PATH, app, ingress, update_queue
+
+    logging.getLogger("santa").setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    # медленный обработчик: не больше drain_rate апдейтов в секунду
+    waits = []
+    processed = {"important": 0, "low": 0}
+    loop = asyncio.new_event_loop()
+
+    async def handler(update_data: dict):
+        await asyncio.sleep(1 / args.drain_rate)
+        waits.append(time.time() - update_data["sent_at"])
+        text = (update_data.get("message") or {}).get("text", "")
+        processed["important" if text.startswith("/") else "low"] += 1
+
+    def consumer():
+        asyncio.set_event_loop(loop)
+        update_queue.bind(loop)
+        loop.run_until_complete(UpdateDispatcher(max_in_flight=1).run(update_queue, handler))
+
+    threading.Thread(target=consumer, daemon=True).start()
+
+    counters = {"sent": 0, 200: 0, 503: 0, "important_sent": 0, "important_shed": 0}
+    lock = threading.Lock()
+    ids = iter(range(1, 10 ** 9))
+    deadline = time.monotonic() + args.seconds
+
+    def sender():
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            with lock:
+                update_id = next(ids)
+            update = _update(update_id, random.randint(1, args.users))
+            update["sent_at"] = time.time()
+            response = client.post(WEBHOOK_PATH, json=update)
+            important = (update.get("message") or {}).get("text", "").startswith("/")
+            with lock:
+                counters["sent"] += 1
+                counters[response.status_code] = counters.get(response.status_code, 0) + 1
+                counters["important_sent"] += important
+                if important and response.get_json().get("status") == "shed":
+                    counters["important_shed"] += 1
+
+    senders = [threading.Thread(target=sender) for _ in range(args.senders)]
+    started = time.monotonic()
+    for t in senders:
+        t.start()
+
+    max_depth = 0
+    while any(t.is_alive() for t in senders):
+        max_depth = max(max_depth, update_queue.qsize())
+        time.sleep(0.05)
+    elapsed = time.monotonic() - started
+
+    print(f"sent={counters['sent']} in {elapsed:.1f}s ({counters['sent'] / elapsed:,.0f} upd/s), "
+          f"drain_rate={args.drain_rate:.0f} upd/s")
+    print(f"http: 200={counters[200]} 503={counters[503]}")
+    print(f"ingress: {ingress.stats()}")
+    print(f"max observed depth={max_depth} (limit {args.max_depth})")
+    print(f"important updates shed={counters['important_shed']} of {counters['important_sent']}")
+
+    # ждём, пока обработчик разберёт очередь
+    while update_queue.qsize():
+        time.sleep(0.1)
+    time.sleep(0.5)
+    print(f"processed: {processed}")
+    print(f"queue wait: p50={_percentile(waits, 0.5):.2f}s p99={_percentile(waits, 0.99):.2f}s "
+          f"max={max(waits, default=0):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
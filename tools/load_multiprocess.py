@@ -0,0 +1,123 @@
+# tools/load_multiprocess.py
+# Локальный нагрузочный тест горизонтального масштабирования:
+# N процессов-"webhook" пишут апдейты в общую очередь, M процессов-обработчиков
+# делят её по shard_key (как CONSUMER_INDEX/CONSUMER_COUNT) и разбирают.
+# Обработчик имитирует работу апдейта: немного CPU (разбор, рендеринг) и ожидание I/O.
+# Проверяется, что апдейты одного пользователя обработаны строго по порядку.
+#
+# Запуск: python -m tools.load_multiprocess [--updates 20000] [--consumers 1 2 4] [--producers 2]
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+from app.dispatcher import UpdateDispatcher
+from app.update_queue import SQLiteQueueBackend, UpdateQueue
+
+
+def _update(update_id: int, user_id: int, seq: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": seq,
+            "from": {"id": user_id},
+            "chat": {"id": user_id, "type": "private"},
+            "text": "/mytargets",
+        },
+    }
+
+
+def _producer(path: str, index: int, producers: int, updates: int, users: int):
+    backend = SQLiteQueueBackend(path)
+    seq = {}
+    for update_id in range(index, updates, producers):
+        # пользователь целиком принадлежит одному producer'у — порядок задан им
+        user_id = 1000 + (update_id // producers) % (users // producers) * producers + index
+        seq[user_id] = seq.get(user_id, 0) + 1
+        backend.put(_update(update_id, user_id, seq[user_id]))
+
+
+def _consumer(path: str, index: int, consumers: int, total, violations, cpu_ms: float, io_ms: float, target: int):
+    async def main():
+        queue = UpdateQueue(SQLiteQueueBackend(path, shard=(index, consumers)))
+        queue.bind(asyncio.get_running_loop(), remote_producers=True)
+        dispatcher = UpdateDispatcher(max_in_flight=16)
+        last_seq = {}
+
+        async def handler(update_data: dict):
+            msg = update_data["message"]
+            user_id = msg["from"]["id"]
+            if msg["message_id"] <= last_seq.get(user_id, 0):
+                with violations.get_lock():
+                    violations.value += 1
+            last_seq[user_id] = msg["message_id"]
+
+            deadline = time.perf_counter() + cpu_ms / 1000
+            while time.perf_counter() < deadline:
+                pass
+            await asyncio.sleep(io_ms / 1000)
+
+            with total.get_lock():
+                total.value += 1
+
+        task = asyncio.ensure_future(dispatcher.run(queue, handler))
+        while total.value < target:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        await queue.flush()
+
+    asyncio.run(main())
+
+
+def _run(processes: list):
+    started = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--producers", type=int, default=2)
+    parser.add_argument("--consumers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--cpu-ms", type=float, default=0.5, help="CPU на апдейт, мс")
+    parser.add_argument("--io-ms", type=float, default=5.0, help="ожидание I/O на апдейт, мс")
+    args = parser.parse_args()
+
+    print(f"cpu_count={os.cpu_count()}")
+    for consumers in args.consumers:
+        path = os.path.join(tempfile.mkdtemp(), "load_queue.db")
+        SQLiteQueueBackend(path)
+
+        elapsed = _run([
+            mp.Process(target=_producer, args=(path, i, args.producers, args.updates, args.users))
+            for i in range(args.producers)
+        ])
+        ingest = args.updates / elapsed
+
+        total = mp.Value("i", 0)
+        violations = mp.Value("i", 0)
+        elapsed = _run([
+            mp.Process(target=_consumer, args=(
+                path, i, consumers, total, violations, args.cpu_ms, args.io_ms, args.updates
+            ))
+            for i in range(consumers)
+        ])
+
+        print(
+            f"producers={args.producers} ingest={ingest:8,.0f} upd/s | "
+            f"consumers={consumers} processed={total.value} "
+            f"throughput={total.value / elapsed:8,.0f} upd/s "
+            f"order_violations={violations.value}"
+        )
+
+
+if __name__ == "__main__":
+    main()
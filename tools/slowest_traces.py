@@ -0,0 +1,116 @@
+# tools/slowest_traces.py
+# Самые медленные трассы апдейтов из файла OTLP/JSON (TRACE_FILE, см. app/tracing.py):
+# длительность от начала webhook до конца последнего спана и дерево спанов
+# со смещением от начала трассы.
+#
+# Запуск: python -m tools.slowest_traces [traces.otlp.jsonl] [--top 10] [--handler cmd_players]
+
+import argparse
+import collections
+import json
+import os
+
+
+def _value(value: dict):
+    for kind in ("stringValue", "intValue", "doubleValue", "boolValue"):
+        if kind in value:
+            return value[kind]
+    return None
+
+
+def load_spans(path: str) -> dict:
+    """trace_id -> список спанов (dict с полями name, parent, start, end, attributes, error)."""
+    traces = collections.defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", ()):
+                for scope in resource.get("scopeSpans", ()):
+                    for s in scope.get("spans", ()):
+                        status = s.get("status") or {}
+                        traces[s["traceId"]].append({
+                            "id": s["spanId"],
+                            "parent": s.get("parentSpanId"),
+                            "name": s["name"],
+                            "start": int(s["startTimeUnixNano"]),
+                            "end": int(s["endTimeUnixNano"]),
+                            "attributes": {a["key"]: _value(a["value"]) for a in s.get("attributes", ())},
+                            "error": status.get("message") if status.get("code") == 2 else None,
+                        })
+    return traces
+
+
+def summarize(spans: list) -> dict:
+    start = min(s["start"] for s in spans)
+    end = max(s["end"] for s in spans)
+    attrs = {}
+    for s in spans:
+        if s["parent"] is None or s["name"] == "dispatch":
+            attrs.update(s["attributes"])
+    return {"start": start, "duration": (end - start) / 1e6, "attributes": attrs, "complete": any(
+        s["parent"] is None for s in spans
+    )}
+
+
+def print_tree(spans: list, start: int, max_children: int):
+    children = collections.defaultdict(list)
+    ids = {s["id"] for s in spans}
+    for s in spans:
+        # спаны, чей родитель не попал в файл, показываем на верхнем уровне
+        children[s["parent"] if s["parent"] in ids else None].append(s)
+
+    def walk(parent, depth):
+        items = sorted(children.get(parent, ()), key=lambda s: s["start"])
+        for i, s in enumerate(items):
+            if i == max_children:
+                print(f"{'  ' * depth}  ... {len(items) - max_children} more")
+                break
+            offset = (s["start"] - start) / 1e6
+            took = (s["end"] - s["start"]) / 1e6
+            extra = ""
+            if "db.statement" in s["attributes"]:
+                extra = " " + " ".join(str(s["attributes"]["db.statement"]).split())[:80]
+            if s["error"]:
+                extra += f"  !! {s['error']}"
+            print(f"  {offset:9.1f}ms {took:9.1f}ms  {'  ' * depth}{s['name']}{extra}")
+            walk(s["id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", nargs="?", default=os.environ.get("TRACE_FILE", "traces.otlp.jsonl"))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--handler", help="only traces handled by this aiogram handler")
+    parser.add_argument("--max-children", type=int, default=20, help="spans shown per parent")
+    args = parser.parse_args()
+
+    traces = load_spans(args.file)
+    summaries = {trace_id: summarize(spans) for trace_id, spans in traces.items()}
+    if args.handler:
+        summaries = {k: v for k, v in summaries.items() if v["attributes"].get("handler") == args.handler}
+
+    durations = sorted(v["duration"] for v in summaries.values())
+    if not durations:
+        print("no traces")
+        return
+    pct = lambda q: durations[min(len(durations) - 1, int(q * len(durations)))]  # noqa: E731
+    print(f"{len(durations)} traces: p50 {pct(0.5):.1f}ms  p95 {pct(0.95):.1f}ms  "
+          f"p99 {pct(0.99):.1f}ms  max {durations[-1]:.1f}ms")
+
+    slowest = sorted(summaries.items(), key=lambda item: item[1]["duration"], reverse=True)[:args.top]
+    for trace_id, summary in slowest:
+        attrs = summary["attributes"]
+        print()
+        print(
+            f"{summary['duration']:.1f}ms  trace {trace_id}  update_id={attrs.get('update_id')} "
+            f"{attrs.get('update.type') or ''} handler={attrs.get('handler') or '-'}"
+            f"{'' if summary['complete'] else '  (no webhook span)'}"
+        )
+        print_tree(traces[trace_id], summary["start"], args.max_children)
+
+
+if __name__ == "__main__":
+    main()